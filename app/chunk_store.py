@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import CHUNK_STORE_ENABLED, CHUNK_STORE_PATH
+from app.lexical_index import analyze
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields kept in the chunk store instead of the vector index. Everything else (chunk_index,
+# page numbers, token estimates, ...) is small and stays in the index, where it can be filtered on.
+TEXT_FIELD = "original_text"
+SUMMARY_FIELD = "contextualized_summary"
+CONTEXT_FIELD = "document_context"
+STORED_FIELDS = (TEXT_FIELD, SUMMARY_FIELD, CONTEXT_FIELD)
+# Not part of vector metadata: the chunk text run through the lexical analyzer at ingestion, returned
+# with the other fields so the re-ranker (app/reranker.py) does not tokenize candidates per query
+TERMS_FIELD = "lexical_terms"
+
+SQL_BATCH_SIZE = 500 # Stay well below SQLite's bound-parameter limit
+COMPRESSION_LEVEL = 6
+
+
+def _compress(text: Optional[str]) -> Optional[bytes]:
+    return None if text is None else zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def _decompress(blob: Optional[bytes]) -> Optional[str]:
+    return None if blob is None else zlib.decompress(blob).decode("utf-8")
+
+
+def split_metadata(metadata: dict) -> Tuple[dict, dict]:
+    """Splits vector metadata into (fields for the chunk store, slim fields for the vector index)."""
+    stored = {field: metadata[field] for field in STORED_FIELDS if field in metadata}
+    slim = {key: value for key, value in metadata.items() if key not in STORED_FIELDS}
+    return stored, slim
+
+
+class ChunkStore:
+    """
+    Local, compressed store of chunk text keyed by chunk (vector) ID, backed by SQLite.
+
+    Holds what is too large for vector metadata: each chunk's text, contextualized summary and
+    analyzed terms (zlib-compressed) and its document context. Document contexts are the same for every chunk of a
+    document, so they live in a separate table, stored once per distinct text and shared by
+    reference; contexts no chunk refers to any more are removed on delete.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id INTEGER PRIMARY KEY,
+                context_hash BLOB NOT NULL UNIQUE,
+                context BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                doc_id INTEGER REFERENCES documents(doc_id),
+                text BLOB,
+                summary BLOB,
+                terms BLOB
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks(doc_id);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "terms" not in columns: # Stores created before chunks were pre-tokenized
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN terms BLOB")
+        self._conn.commit()
+
+    def _document_id_locked(self, context: str, known: Dict[str, int]) -> int:
+        doc_id = known.get(context)
+        if doc_id is None:
+            context_hash = hashlib.sha256(context.encode("utf-8")).digest()
+            self._conn.execute("INSERT OR IGNORE INTO documents (context_hash, context) VALUES (?, ?)", (context_hash, _compress(context)))
+            doc_id = self._conn.execute("SELECT doc_id FROM documents WHERE context_hash = ?", (context_hash,)).fetchone()[0]
+            known[context] = doc_id
+        return doc_id
+
+    def put_many(self, chunks: Iterable[Tuple[str, dict]]):
+        """Stores [(chunk_id, {original_text, contextualized_summary, document_context}), ...], replacing existing chunks."""
+        with self._lock:
+            known: Dict[str, int] = {}
+            rows = []
+            for chunk_id, fields in chunks:
+                context = fields.get(CONTEXT_FIELD)
+                doc_id = self._document_id_locked(context, known) if context is not None else None
+                text = fields.get(TEXT_FIELD)
+                terms = " ".join(analyze(text)) if text else None
+                rows.append((chunk_id, doc_id, _compress(text), _compress(fields.get(SUMMARY_FIELD)), _compress(terms)))
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (id, doc_id, text, summary, terms) VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, dict]:
+        """Returns {chunk_id: stored fields} for the IDs that are in the store."""
+        found: Dict[str, dict] = {}
+        unique_ids = list(dict.fromkeys(chunk_ids))
+        with self._lock:
+            for start in range(0, len(unique_ids), SQL_BATCH_SIZE):
+                batch = unique_ids[start:start + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT chunks.id, chunks.text, chunks.summary, chunks.terms, documents.context FROM chunks "
+                    f"LEFT JOIN documents ON documents.doc_id = chunks.doc_id WHERE chunks.id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for chunk_id, text, summary, terms, context in rows:
+                    fields = {
+                        TEXT_FIELD: _decompress(text),
+                        SUMMARY_FIELD: _decompress(summary),
+                        CONTEXT_FIELD: _decompress(context),
+                        TERMS_FIELD: _decompress(terms),
+                    }
+                    found[chunk_id] = {field: value for field, value in fields.items() if value is not None}
+        self.hits += len(found)
+        self.misses += len(unique_ids) - len(found)
+        return found
+
+    def iter_texts(self, batch_size: int = SQL_BATCH_SIZE) -> Iterator[Tuple[str, str]]:
+        """Yields (chunk_id, original_text) for every stored chunk, reading in batches."""
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, text FROM chunks WHERE id > ? AND text IS NOT NULL ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for chunk_id, text in rows:
+                yield chunk_id, _decompress(text)
+            last_id = rows[-1][0]
+
+    def delete(self, chunk_ids: Optional[List[str]] = None, delete_all: bool = False):
+        """Removes chunks (or everything) and any document context no remaining chunk refers to."""
+        with self._lock:
+            if delete_all:
+                self._conn.execute("DELETE FROM chunks")
+            else:
+                ids = list(chunk_ids or [])
+                for start in range(0, len(ids), SQL_BATCH_SIZE):
+                    batch = ids[start:start + SQL_BATCH_SIZE]
+                    self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.execute("DELETE FROM documents WHERE doc_id NOT IN (SELECT doc_id FROM chunks WHERE doc_id IS NOT NULL)")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            chunks, chunk_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(text)) + SUM(COALESCE(LENGTH(summary), 0)) + SUM(COALESCE(LENGTH(terms), 0)), 0) FROM chunks"
+            ).fetchone()
+            documents, document_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(context)), 0) FROM documents").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "chunks": chunks,
+            "documents": documents,
+            "compressed_bytes": chunk_bytes + document_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Process-wide store ---
+_store: Optional[ChunkStore] = None
+_store_disabled = not CHUNK_STORE_ENABLED
+
+
+def get_chunk_store() -> Optional[ChunkStore]:
+    """Returns the shared chunk store, or None if it is disabled or could not be opened."""
+    global _store, _store_disabled
+    if _store is None and not _store_disabled:
+        try:
+            _store = ChunkStore()
+            logger.info(f"Chunk store opened at {_store.path} ({_store.stats()['chunks']} chunks).")
+        except Exception as e:
+            # Vectors are then written with their full metadata, as before the store existed
+            logger.warning(f"Could not open chunk store at {CHUNK_STORE_PATH}: {e}. Keeping chunk text in vector metadata.")
+            _store_disabled = True
+    return _store
+
+
+def close_chunk_store():
+    """Shutdown hook: closes the shared store's database connection."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
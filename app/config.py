@@ -14,20 +14,83 @@ from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+# Project paths
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
+
 # Telegram Configuration
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN_PLACEHOLDER")
 # You might want a more secure way to set your webhook token/path if you use one in main.py
 WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "YOUR_SECURE_PATH_TOKEN_PLACEHOLDER")
+# Webhook server (app/main.py): updates are acknowledged at once and handed to the update scheduler
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "") # Public base URL; if set, the webhook is registered with Telegram on startup
+
+# Update scheduler (app/update_scheduler.py), used in webhook and polling mode: chats are served
+# concurrently, updates of one chat in order. UPDATE_OVERFLOW_POLICY is "wait", "reject" or "drop_oldest".
+UPDATE_MAX_CONCURRENCY = int(os.getenv("UPDATE_MAX_CONCURRENCY", "8")) # Updates processed at once (across chats)
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000")) # Updates that may wait before the overflow policy applies
+UPDATE_OVERFLOW_POLICY = os.getenv("UPDATE_OVERFLOW_POLICY", "wait").lower()
+UPDATE_MAX_AGE = float(os.getenv("UPDATE_MAX_AGE", "0")) # Drop messages older than this many seconds (0 = never)
+UPDATE_DRAIN_TIMEOUT = float(os.getenv("UPDATE_DRAIN_TIMEOUT", "20")) # Seconds to finish queued updates on shutdown
+UPDATE_METRICS_LOG_INTERVAL = float(os.getenv("UPDATE_METRICS_LOG_INTERVAL", "300")) # Seconds between metrics log lines (0 = off)
 
 
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_PLACEHOLDER")
 GPT4_MODEL_NAME = os.getenv("GPT4_MODEL_NAME", "gpt-4.1-nano")
+GPT4_MAX_RESPONSE_TOKENS = int(os.getenv("GPT4_MAX_RESPONSE_TOKENS", "1500"))
+# Prompt + response token budget for answer generation; retrieved snippets that do not fit are left out
+GPT4_CONTEXT_WINDOW_TOKENS = int(os.getenv("GPT4_CONTEXT_WINDOW_TOKENS", "128000"))
+
+# Retrieval context for answers (see app/context_packer.py). Matches must reach RAG_MIN_SCORE and
+# RAG_RELATIVE_SCORE x the best score; the list is cut where neighbouring scores drop by more than RAG_MAX_SCORE_GAP.
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "10")) # Matches retrieved per query
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.60"))
+RAG_RELATIVE_SCORE = float(os.getenv("RAG_RELATIVE_SCORE", "0.75"))
+RAG_MAX_SCORE_GAP = float(os.getenv("RAG_MAX_SCORE_GAP", "0.10"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000")) # Tokens of retrieved context per prompt
+
+# Shared OpenAI HTTP client (see app/openai_client.py).
+# One keep-alive connection pool is reused by every embedding and chat call in the process.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60")) # Seconds an idle connection is kept open
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# Per-call timeouts (seconds) for the two kinds of requests we make
+OPENAI_EMBEDDING_TIMEOUT = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "30"))
+OPENAI_CHAT_TIMEOUT = float(os.getenv("OPENAI_CHAT_TIMEOUT", "60"))
+
+# Streamed answers (see app/streaming_reply.py): the first sentence is sent as soon as it is generated
+# and the message is edited as the rest arrives
+GPT4_STREAM_ANSWERS = os.getenv("GPT4_STREAM_ANSWERS", "true").lower() in ("1", "true", "yes")
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "1.0")) # Minimum seconds between edits of a message
+STREAM_FIRST_FLUSH_SECONDS = float(os.getenv("STREAM_FIRST_FLUSH_SECONDS", "1.5")) # Send partial text if no sentence has ended by then
+
+# Concurrent chunk contextualization during ingestion (adaptive AIMD limiter, see app/rate_limiter.py)
+CONTEXTUALIZE_INITIAL_CONCURRENCY = int(os.getenv("CONTEXTUALIZE_INITIAL_CONCURRENCY", "4"))
+CONTEXTUALIZE_MAX_CONCURRENCY = int(os.getenv("CONTEXTUALIZE_MAX_CONCURRENCY", "32"))
+CONTEXTUALIZE_MAX_RETRIES = int(os.getenv("CONTEXTUALIZE_MAX_RETRIES", "6"))
+
+# Vector store backend: "pinecone" (hosted) or "local" (in-process NumPy index, works offline)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_STORE_DIR = os.getenv("LOCAL_VECTOR_STORE_DIR", os.path.join(DATA_DIR, "vector_store"))
+# Approximate nearest-neighbour index for the local backend (see app/vector_backends/ivf_index.py).
+# "none" = always exact search, "ivf" = IVF with full vectors, "ivfpq" = IVF with product-quantized codes + exact re-ranking.
+LOCAL_ANN_INDEX = os.getenv("LOCAL_ANN_INDEX", "ivf").lower()
+LOCAL_ANN_MIN_VECTORS = int(os.getenv("LOCAL_ANN_MIN_VECTORS", "20000")) # Below this, exact search is fast enough
+LOCAL_ANN_NLIST = int(os.getenv("LOCAL_ANN_NLIST", "0")) # Number of IVF lists; 0 = 4 * sqrt(number of vectors)
+LOCAL_ANN_NPROBE = int(os.getenv("LOCAL_ANN_NPROBE", "16")) # Lists scanned per query (higher = better recall, slower)
+LOCAL_ANN_PQ_SUBVECTORS = int(os.getenv("LOCAL_ANN_PQ_SUBVECTORS", "64")) # Must divide EMBEDDING_DIMENSION
 
 # Pinecone Configuration
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "YOUR_PINECONE_API_KEY_PLACEHOLDER")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "YOUR_PINECONE_ENVIRONMENT_PLACEHOLDER") # e.g., "us-west1-gcp" or "us-east-1"
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "immigration-docs") # Example index name
+# The Pinecone client is synchronous; its calls run on a dedicated, bounded thread pool so they never block the event loop.
+PINECONE_IO_THREADS = int(os.getenv("PINECONE_IO_THREADS", "8"))
+PINECONE_UPSERT_CONCURRENCY = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4")) # Upsert batches in flight at once
+PINECONE_MAX_RETRIES = int(os.getenv("PINECONE_MAX_RETRIES", "3")) # Retries per failed batch / call
 
 # Embedding Model Configuration (now for OpenAI)
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-3-small")
@@ -36,6 +99,94 @@ EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-3-small
 # ada-002 (legacy) has 1536.
 EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
 
+# Batch embedding (see app/embedding_engine.py).
+# OpenAI accepts up to 2048 inputs and 300k tokens per embeddings request; we stay below both.
+# Token counts are exact (app/tokenizer.py), so the token limit only keeps a small safety margin.
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "512"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "290000"))
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191")) # Per-input limit of the embedding model
+EMBEDDING_MAX_CONCURRENT_REQUESTS = int(os.getenv("EMBEDDING_MAX_CONCURRENT_REQUESTS", "4"))
+
+# Offline token counting (see app/tokenizer.py). BPE ranks files (<encoding>.tiktoken) are bundled in
+# TOKENIZER_DATA_DIR; scripts/fetch_tokenizer_data.py adds missing ones when network access is available.
+TOKENIZER_DATA_DIR = os.getenv("TOKENIZER_DATA_DIR", os.path.join(PROJECT_ROOT, "app", "tokenizer_data"))
+TOKENIZER_MEMO_SIZE = int(os.getenv("TOKENIZER_MEMO_SIZE", "100000")) # Memoized (text -> token count) entries per encoding
+
+# Local chunk store (see app/chunk_store.py): when enabled, chunk text, summaries and document context live here,
+# keyed by vector ID, and only small filterable fields go into vector metadata. Opt-in: the bot can only answer
+# from chunks ingested this way where the file is deployed with it, which a serverless deployment does not have.
+CHUNK_STORE_ENABLED = os.getenv("CHUNK_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", os.path.join(DATA_DIR, "chunk_store.sqlite3"))
+
+# Hybrid retrieval (see app/lexical_index.py): a local BM25 index, updated as chunks are upserted, is searched
+# alongside the vector store and the two rankings are merged with reciprocal rank fusion.
+# RETRIEVAL_MODE is "hybrid" or "vector". Rebuild the index (from the chunk store or vector metadata) with scripts/build_lexical_index.py.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(DATA_DIR, "lexical_index.npz"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20")) # Results taken from each leg before fusion
+RRF_K = int(os.getenv("RRF_K", "60")) # Reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+# Floors on the lexical leg before fusion, the counterpart of RAG_MIN_SCORE for vector matches: a BM25 hit must
+# score at least HYBRID_LEXICAL_MIN_SCORE and HYBRID_LEXICAL_MIN_RELATIVE x the best hit, so chunks that only
+# share a common word with the query ("visa") do not enter the prompt. A BM25 score of 2 is about one match of a
+# term found in one chunk in eight; rarer terms (form numbers, visa classes, sections) clear it on their own.
+HYBRID_LEXICAL_MIN_SCORE = float(os.getenv("HYBRID_LEXICAL_MIN_SCORE", "2.0"))
+HYBRID_LEXICAL_MIN_RELATIVE = float(os.getenv("HYBRID_LEXICAL_MIN_RELATIVE", "0.5"))
+
+# Re-ranking of retrieved candidates before the prompt is built (see app/reranker.py): RERANKER is "lexical"
+# (CPU feature scorer over pre-tokenized chunks) or "none". At most RERANK_TOP_N candidates are kept, and only
+# those whose blended score (lexical features plus the first-stage score) is at least RERANK_MIN_RELATIVE_SCORE x the best.
+RERANKER = os.getenv("RERANKER", "lexical").lower()
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "5"))
+RERANK_MIN_RELATIVE_SCORE = float(os.getenv("RERANK_MIN_RELATIVE_SCORE", "0.5"))
+
+# Persistent embedding cache (see app/embedding_cache.py). Set EMBEDDING_CACHE_ENABLED=false to bypass it.
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024))) # 512 MB of float32 vectors
+
+# Per-document ingestion manifests used for incremental re-ingestion (see scripts/ingestion_manifest.py)
+INGESTION_MANIFEST_DIR = os.getenv("INGESTION_MANIFEST_DIR", os.path.join(DATA_DIR, "manifests"))
+# PDF text extraction (see app/services/pdf_service.py). Pages are split into ranges that run on a
+# process pool; documents with fewer than PDF_PARALLEL_MIN_PAGES pages are extracted serially.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_OPEN_DOCUMENTS_MAX = int(os.getenv("PDF_OPEN_DOCUMENTS_MAX", "8")) # Parsed PDFs kept open per PDFService (LRU)
+# Extracted page text is cached per PDF content hash and extractor version (see app/services/text_cache.py)
+PDF_TEXT_CACHE_ENABLED = os.getenv("PDF_TEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PROCESSED_TEXTS_DIR = os.getenv("PROCESSED_TEXTS_DIR", os.path.join(DATA_DIR, "processed_texts"))
+
+# Streaming (page-by-page) ingestion: chunks per contextualize/embed/upsert batch, and how many
+# batches may wait between two stages before the upstream stage pauses (bounds memory use).
+INGEST_STREAM_BATCH_SIZE = int(os.getenv("INGEST_STREAM_BATCH_SIZE", "32"))
+INGEST_STREAM_QUEUE_SIZE = int(os.getenv("INGEST_STREAM_QUEUE_SIZE", "4"))
+
+# Web crawling (see app/services/crawler.py). Politeness is enforced per host: at most
+# SCRAPER_PER_HOST_CONCURRENCY requests in flight and SCRAPER_PER_HOST_INTERVAL seconds between
+# request starts (or the robots.txt Crawl-delay, if longer); other hosts are never held up.
+SCRAPER_MAX_CONCURRENCY = int(os.getenv("SCRAPER_MAX_CONCURRENCY", "16")) # Requests in flight across all hosts
+SCRAPER_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPER_PER_HOST_CONCURRENCY", "2"))
+SCRAPER_PER_HOST_INTERVAL = float(os.getenv("SCRAPER_PER_HOST_INTERVAL", "0.5"))
+SCRAPER_TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", "10"))
+SCRAPER_MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", "3")) # Attempts per URL (transport errors, 429 and 5xx are retried)
+SCRAPER_RESPECT_ROBOTS = os.getenv("SCRAPER_RESPECT_ROBOTS", "true").lower() in ("1", "true", "yes")
+SCRAPER_USER_AGENT = os.getenv("SCRAPER_USER_AGENT", "") # Empty = rotate browser user agents (robots.txt "*" rules apply)
+# Lean parsing extracts only title, meta description, .field--name-body text and links with lxml,
+# and leaves the raw HTML and BeautifulSoup tree out of scrape results (for bulk crawls).
+SCRAPER_LEAN_PARSING = os.getenv("SCRAPER_LEAN_PARSING", "false").lower() in ("1", "true", "yes")
+# Conditional-request cache for scraped pages (see app/services/http_cache.py): bodies are stored
+# compressed with their ETag / Last-Modified and revalidated, so unchanged pages cost a 304.
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(DATA_DIR, "cache", "http_cache.sqlite3"))
+
+# Sitemap-driven site sync (see scripts/site_sync.py): sitemap (or sitemap index) URLs, comma-separated
+SITE_SYNC_SITEMAPS = [url.strip() for url in os.getenv("SITE_SYNC_SITEMAPS", "").split(",") if url.strip()]
+SITE_SYNC_STATE_PATH = os.getenv("SITE_SYNC_STATE_PATH", os.path.join(DATA_DIR, "site_sync_state.json"))
+SITE_SYNC_WORKERS = int(os.getenv("SITE_SYNC_WORKERS", "4")) # Pages fetched and ingested at once
+SITE_SYNC_CHECKPOINT_EVERY = int(os.getenv("SITE_SYNC_CHECKPOINT_EVERY", "20")) # Pages between state file saves
+SITE_SYNC_CHUNK_SIZE_UPPER = int(os.getenv("SITE_SYNC_CHUNK_SIZE_UPPER", "500")) # Tokens
+SITE_SYNC_CHUNK_SIZE_LOWER = int(os.getenv("SITE_SYNC_CHUNK_SIZE_LOWER", "100"))
+
 
 # Optional: For testing telegram_bot.py directly
 MY_CHAT_ID = os.getenv("MY_CHAT_ID") # Your personal Telegram chat ID for direct test messages
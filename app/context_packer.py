@@ -0,0 +1,175 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+from app.config import RAG_MIN_SCORE, RAG_RELATIVE_SCORE, RAG_MAX_SCORE_GAP
+from app.tokenizer import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_HEADER = "\n\n--- Relevant Information Extracted ---\n"
+# pack_context() arguments for scores that are not cosine similarities (fused or re-ranked), which
+# have already been cut by the stage that produced them
+NO_SCORE_CUTOFF = {"min_score": 0.0, "relative": 0.0, "max_gap": 0.0}
+
+
+@dataclass
+class Snippet:
+    """One retrieved chunk that may go into the prompt."""
+    id: str
+    score: float
+    text: str
+    summary: str
+    document: str
+    chunk_index: int = 0
+
+
+@dataclass
+class PackedContext:
+    """The context block for the prompt and what packing it saved."""
+    text: str = ""
+    snippets: List[Snippet] = field(default_factory=list)
+    documents: int = 0
+    tokens: int = 0
+    baseline_tokens: int = 0 # The same matches in the unpacked one-block-per-snippet format
+    candidates: int = 0      # Snippets left after deduplication and the score cutoff
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.baseline_tokens - self.tokens, 0)
+
+
+def score_cutoff(scores: Sequence[float], min_score: float = RAG_MIN_SCORE, relative: float = RAG_RELATIVE_SCORE, max_gap: float = RAG_MAX_SCORE_GAP) -> int:
+    """
+    How many of `scores` (sorted best first) are worth considering.
+
+    A score must reach the absolute floor `min_score` and `relative` times the best score, and the
+    list is cut at the first drop of more than `max_gap` between neighbours: a clear gap means the
+    matches below it answer something else. A max_gap or relative of 0 disables that test.
+    """
+    if not scores or scores[0] < min_score:
+        return 0
+    floor = max(min_score, scores[0] * relative)
+    kept = 1
+    for previous, score in zip(scores, scores[1:]):
+        if score < floor or (max_gap > 0 and previous - score > max_gap):
+            break
+        kept += 1
+    return kept
+
+
+def snippets_from_matches(matches) -> List[Snippet]:
+    """Vector store matches as Snippets, best first; matches without text are skipped and repeated texts kept once."""
+    snippets = []
+    seen_texts = set()
+    without_text = []
+    for match in sorted(matches, key=lambda match: getattr(match, "score", 0.0), reverse=True):
+        metadata = getattr(match, "metadata", None) or {}
+        text = metadata.get("original_text")
+        if not text:
+            without_text.append(getattr(match, "id", "N/A"))
+            continue
+        if text in seen_texts:
+            continue
+        seen_texts.add(text)
+        snippets.append(Snippet(
+            id=getattr(match, "id", ""),
+            score=match.score,
+            text=text,
+            summary=metadata.get("contextualized_summary") or "",
+            document=metadata.get("document_context") or "",
+            chunk_index=int(metadata.get("chunk_index") or 0),
+        ))
+    if without_text:
+        logger.warning(f"Skipped {len(without_text)} match(es) without 'original_text' in their metadata: {', '.join(without_text[:5])}")
+    return snippets
+
+
+def _document_part(number: int, document: str) -> str:
+    return f"\n--- Document {number} ---\nOverall Document Context: {document or 'N/A'}\n"
+
+
+def _snippet_part(snippet: Snippet) -> str:
+    part = f"Original Text Snippet: {snippet.text}\n"
+    if snippet.summary:
+        part += f"Contextual Summary (AI-generated for this snippet): {snippet.summary}\n"
+    return part
+
+
+def _unpacked_part(number: int, snippet: Snippet) -> str:
+    # The format used before packing: every snippet repeats its document context
+    return (
+        f"\n--- Document {number} ---\n"
+        f"Original Text Snippet: {snippet.text}\n"
+        f"Overall Document Context: {snippet.document or 'N/A'}\n"
+        f"Contextual Summary (AI-generated for this snippet): {snippet.summary or 'N/A'}\n"
+    )
+
+
+def _select(snippets: List[Snippet], budget: int, counter: TokenCounter) -> List[Snippet]:
+    """
+    Greedy knapsack by marginal value: the best match goes in first, then repeatedly the snippet
+    with the most score per marginal token. A snippet's marginal tokens include its document's
+    context only while no other snippet of that document is in, so a second passage from a document
+    already in the prompt is cheap.
+    """
+    # Document numbers in the header are at most two digits; their exact cost is recounted by the caller
+    document_costs = {document: counter.count(_document_part(10, document)) for document in {s.document for s in snippets}}
+    snippet_costs = [counter.count(_snippet_part(snippet)) for snippet in snippets]
+    chosen: List[int] = []
+    included_documents = set()
+    used = 0
+    remaining = set(range(len(snippets)))
+    while remaining:
+        best, best_value, best_cost = None, -1.0, 0
+        for i in sorted(remaining):
+            cost = snippet_costs[i] + (0 if snippets[i].document in included_documents else document_costs[snippets[i].document])
+            if used + cost > budget:
+                continue
+            # The top match is taken first regardless of its size; afterwards score per token decides
+            value = float("inf") if not chosen and i == 0 else snippets[i].score / max(cost, 1)
+            if value > best_value:
+                best, best_value, best_cost = i, value, cost
+        if best is None:
+            break
+        chosen.append(best)
+        included_documents.add(snippets[best].document)
+        used += best_cost
+        remaining.discard(best)
+    return [snippets[i] for i in chosen]
+
+
+def pack_context(matches, budget: int, counter: TokenCounter, min_score: float = RAG_MIN_SCORE, relative: float = RAG_RELATIVE_SCORE, max_gap: float = RAG_MAX_SCORE_GAP) -> PackedContext:
+    """
+    Builds the prompt's context block from vector store matches within `budget` tokens.
+
+    Matches are deduplicated, cut with score_cutoff() and chosen by _select(). The chosen snippets
+    are grouped by document so each document's context appears once: documents in order of their
+    best match, their snippets in reading order (chunk_index).
+    """
+    snippets = snippets_from_matches(matches)
+    # Baseline: every deduplicated match over the fixed floor, each with its own copy of the document context
+    above_floor = [snippet for snippet in snippets if snippet.score >= min_score]
+    baseline_tokens = counter.count(CONTEXT_HEADER) + sum(counter.count(_unpacked_part(i + 1, s)) for i, s in enumerate(above_floor)) if above_floor else 0
+    snippets = snippets[:score_cutoff([snippet.score for snippet in snippets], min_score, relative, max_gap)]
+    packed = PackedContext(baseline_tokens=baseline_tokens, candidates=len(snippets))
+    if not snippets:
+        return packed
+
+    chosen = _select(snippets, budget - counter.count(CONTEXT_HEADER), counter)
+    if not chosen:
+        logger.warning(f"Context budget of {budget} tokens is too small for any of {len(snippets)} snippets.")
+        return packed
+
+    groups: Dict[str, List[Snippet]] = {}
+    for snippet in chosen:
+        groups.setdefault(snippet.document, []).append(snippet)
+    parts = [CONTEXT_HEADER]
+    for number, (document, group) in enumerate(sorted(groups.items(), key=lambda item: -max(s.score for s in item[1])), start=1):
+        parts.append(_document_part(number, document))
+        parts.extend(_snippet_part(snippet) for snippet in sorted(group, key=lambda s: s.chunk_index))
+        packed.snippets.extend(group)
+    packed.text = "".join(parts)
+    packed.documents = len(groups)
+    packed.tokens = counter.count(packed.text)
+    return packed
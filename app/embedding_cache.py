@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+
+from app.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes text before embedding: Unicode NFC and collapsed whitespace.
+    (OpenAI recommends replacing newlines with spaces; this also makes cache keys stable
+    across trivial whitespace differences.)
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, dimension: int, normalized_text: str) -> bytes:
+    """Content address for an embedding: sha256 over (model, dimension, normalized text)."""
+    return hashlib.sha256(f"{model}\0{dimension}\0{normalized_text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache backed by SQLite.
+
+    Vectors are stored as float32 blobs (4 bytes per dimension). The total size of stored
+    vectors is bounded by `max_bytes`; when it is exceeded the least recently used entries
+    are evicted. Hit / miss / eviction counters are kept for the lifetime of the object.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                model TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, dimension: int, normalized_texts: List[str]) -> Dict[str, List[float]]:
+        """Returns {normalized_text: embedding} for the texts that are cached."""
+        keys = {cache_key(model, dimension, text): text for text in set(normalized_texts)}
+        found = {}
+        key_list = list(keys)
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    if len(vector) == dimension:
+                        found[keys[key]] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, cache_key(model, dimension, text)) for text in found]
+                )
+                self._conn.commit()
+        hits = sum(1 for text in normalized_texts if text in found)
+        self.hits += hits
+        self.misses += len(normalized_texts) - hits
+        return found
+
+    def put_many(self, model: str, dimension: int, embeddings: Dict[str, List[float]]):
+        """Stores {normalized_text: embedding} and evicts LRU entries if over the size bound."""
+        if not embeddings:
+            return
+        now = time.time()
+        rows = [
+            (cache_key(model, dimension, text), model, dimension, array("f", embedding).tobytes(), now)
+            for text, embedding in embeddings.items()
+        ]
+        with self._lock:
+            for key, *_ in rows:
+                existing = self._conn.execute("SELECT LENGTH(vector) FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if existing:
+                    self._total_bytes -= existing[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimension, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._total_bytes += sum(len(row[3]) for row in rows)
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not victims:
+                self._total_bytes = 0
+                return
+            freed = 0
+            evicted = []
+            for key, size in victims:
+                evicted.append((key,))
+                freed += size
+                if self._total_bytes - freed <= self.max_bytes:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            self._total_bytes -= freed
+            self.evictions += len(evicted)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Process-wide cache ---
+_cache: Optional[EmbeddingCache] = None
+_cache_disabled = not EMBEDDING_CACHE_ENABLED
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Returns the shared cache, or None if it is disabled or could not be opened."""
+    global _cache, _cache_disabled
+    if _cache is None and not _cache_disabled:
+        try:
+            _cache = EmbeddingCache()
+            logger.info(f"Embedding cache opened at {_cache.path} ({_cache.stats()['entries']} entries).")
+        except Exception as e:
+            # e.g. read-only filesystem on serverless deployments; embeddings still work uncached
+            logger.warning(f"Could not open embedding cache at {EMBEDDING_CACHE_PATH}: {e}. Continuing without it.")
+            _cache_disabled = True
+    return _cache
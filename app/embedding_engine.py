@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from app.config import (
+    EMBEDDING_BATCH_MAX_INPUTS,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_MAX_INPUT_TOKENS,
+    EMBEDDING_MAX_CONCURRENT_REQUESTS,
+    EMBEDDING_MODEL_NAME,
+)
+from app.tokenizer import TokenCounter, get_token_counter
+from app.vector_store import generate_embedding
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine:
+    """
+    Embeds many texts with as few API round trips as possible.
+
+    Texts are packed, in order, into requests bounded by both an input-count limit and a
+    total-token limit, using exact token counts for the embedding model (app/tokenizer.py)
+    so requests are filled up to the limit without being rejected. Several requests are kept in flight at once (bounded by
+    max_concurrency) and the results are mapped back to the original text order.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Awaitable[Optional[List[List[float]]]]] = generate_embedding,
+        max_inputs_per_request: int = EMBEDDING_BATCH_MAX_INPUTS,
+        max_tokens_per_request: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENT_REQUESTS,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ):
+        if max_inputs_per_request < 1 or max_tokens_per_request < 1 or max_concurrency < 1:
+            raise ValueError("Batch limits and concurrency must be positive.")
+        self.embed_fn = embed_fn
+        self.max_inputs_per_request = max_inputs_per_request
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_concurrency = max_concurrency
+        self.token_counter = token_counter or get_token_counter(EMBEDDING_MODEL_NAME)
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Greedily packs text indices into batches that respect both request limits.
+        A single text larger than the token limit is sent in a batch of its own.
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = min(self.token_counter(text), EMBEDDING_MAX_INPUT_TOKENS) # Longer texts are truncated in embed()
+            if current and (len(current) >= self.max_inputs_per_request or
+                            current_tokens + tokens > self.max_tokens_per_request):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _fit_input(self, index: int, text: str) -> str:
+        """Truncates a text above the model's per-input limit, which the API would otherwise reject."""
+        if not isinstance(self.token_counter, TokenCounter):
+            return text
+        tokens = self.token_counter(text)
+        if tokens <= EMBEDDING_MAX_INPUT_TOKENS:
+            return text
+        logger.warning(f"Text {index} has {tokens} tokens, above the model's per-input limit ({EMBEDDING_MAX_INPUT_TOKENS}); truncating it.")
+        return self.token_counter.truncate(text, EMBEDDING_MAX_INPUT_TOKENS)
+
+    async def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Returns one embedding per input text, in input order.
+        Positions whose request failed are None, so callers can skip them.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not texts:
+            return results
+
+        texts = [self._fit_input(i, text) for i, text in enumerate(texts)]
+        batches = self.pack_batches(texts)
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} request(s) (max {self.max_concurrency} in flight).")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_batch(batch_number: int, indices: List[int]):
+            async with semaphore:
+                embeddings = await self.embed_fn([texts[i] for i in indices])
+            if not embeddings or len(embeddings) != len(indices):
+                logger.error(f"Embedding request {batch_number + 1}/{len(batches)} failed ({len(indices)} texts).")
+                return
+            for i, embedding in zip(indices, embeddings):
+                results[i] = embedding
+            logger.debug(f"Embedding request {batch_number + 1}/{len(batches)} done ({len(indices)} texts).")
+
+        await asyncio.gather(*(run_batch(n, indices) for n, indices in enumerate(batches)))
+        return results
+
+
+async def embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
+    """Embeds texts with a default-configured EmbeddingEngine."""
+    return await EmbeddingEngine().embed(texts)
@@ -0,0 +1,301 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import LEXICAL_INDEX_ENABLED, LEXICAL_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_MIN_DELETED = 1000 # Postings are rewritten once this many (and at least 25% of) documents are deleted
+
+# Words and identifiers: letters/digits joined by "-", "." or "/" and followed by parenthesised
+# subsections stay one token, so "I-485", "H-1B", "EB-2", "DS-160" and "214.2(h)(15)(ii)" are kept whole.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*(?:\([a-z0-9]+\))*")
+SUBSECTION_PATTERN = re.compile(r"\([a-z0-9]+\)")
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have how i if in into is it its may me my "
+    "no not of on or our so such than that the their them then there these they this to was we were what "
+    "when where which who will with would you your".split()
+)
+
+
+def analyze(text: str) -> List[str]:
+    """
+    Lower-cased terms of `text` for the lexical index (documents and queries alike).
+
+    Identifiers are kept whole, plus two variants so differently written references still meet:
+    the identifier without its separators ("i-485" also gives "i485") and each shorter subsection
+    reference ("214.2(h)(15)" also gives "214.2" and "214.2(h)"). Plain words lose a plural "s"
+    and stopwords are dropped.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if token.isalpha():
+            if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            terms.append(token)
+            continue
+        terms.append(token)
+        subsections = SUBSECTION_PATTERN.findall(token)
+        base = token[:len(token) - sum(len(part) for part in subsections)] if subsections else token
+        for i in range(len(subsections)):
+            terms.append(base + "".join(subsections[:i]))
+        joined = re.sub(r"[-./]", "", base)
+        if joined != base:
+            terms.append(joined)
+    return terms
+
+
+class BM25Index:
+    """
+    In-memory inverted index scored with Okapi BM25, persisted to one .npz file.
+
+    Every term's postings are two compact typed arrays (uint32 document numbers, uint16 term
+    frequencies) that queries read through zero-copy NumPy views, so a query is a few vectorized
+    operations per query term. Documents are added and deleted incrementally (re-adding an ID
+    replaces it); deleted documents are masked until enough accumulate to rewrite the postings.
+    """
+
+    def __init__(self, path: Optional[str] = LEXICAL_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._terms: Dict[str, int] = {}
+        self._docs: List[array] = []  # Per term: document numbers ('I', uint32)
+        self._tfs: List[array] = []   # Per term: term frequencies ('H', uint16)
+        self._ids: List[Optional[str]] = [] # Document number -> chunk ID (None once deleted)
+        self._numbers: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._live = bytearray()
+        self._total_length = 0 # Over live documents
+        self._deleted = 0
+        self._dirty = False
+        self._query_arrays = None # (length normalization, live mask) for search(), rebuilt after changes
+        self._lock = threading.RLock()
+        if path and os.path.isfile(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    # --- Updates ---
+
+    def add(self, chunk_id: str, text: str):
+        with self._lock:
+            self._delete_locked(chunk_id)
+            terms = analyze(text)
+            number = len(self._ids)
+            self._ids.append(chunk_id)
+            self._numbers[chunk_id] = number
+            self._lengths.append(len(terms))
+            self._live.append(1)
+            self._total_length += len(terms)
+            for term, tf in Counter(terms).items():
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = self._terms[term] = len(self._docs)
+                    self._docs.append(array("I"))
+                    self._tfs.append(array("H"))
+                self._docs[term_id].append(number)
+                self._tfs[term_id].append(min(tf, 65535))
+            self._dirty = True
+            self._query_arrays = None
+
+    def add_many(self, chunks: Iterable[Tuple[str, str]]):
+        with self._lock:
+            for chunk_id, text in chunks:
+                self.add(chunk_id, text)
+
+    def _delete_locked(self, chunk_id: str) -> bool:
+        number = self._numbers.pop(chunk_id, None)
+        if number is None:
+            return False
+        self._ids[number] = None
+        self._live[number] = 0
+        self._total_length -= self._lengths[number]
+        self._deleted += 1
+        self._dirty = True
+        self._query_arrays = None
+        return True
+
+    def delete(self, chunk_ids: Iterable[str]) -> int:
+        with self._lock:
+            deleted = sum(self._delete_locked(chunk_id) for chunk_id in chunk_ids)
+            if self._deleted >= COMPACT_MIN_DELETED and self._deleted * 4 >= len(self._ids):
+                self._compact_locked()
+            return deleted
+
+    def clear(self):
+        with self._lock:
+            self._terms, self._docs, self._tfs = {}, [], []
+            self._ids, self._numbers = [], {}
+            self._lengths, self._live = array("I"), bytearray()
+            self._total_length = self._deleted = 0
+            self._dirty = True
+            self._query_arrays = None
+
+    def _compact_locked(self):
+        """Drops deleted documents from the postings and renumbers the rest."""
+        live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(live, dtype=np.int64) - 1
+        docs, tfs, terms = [], [], {}
+        for term, term_id in self._terms.items():
+            numbers = np.frombuffer(self._docs[term_id], dtype=np.uint32)
+            keep = live[numbers]
+            if not keep.any():
+                continue
+            terms[term] = len(docs)
+            docs.append(array("I", renumber[numbers[keep]].astype(np.uint32).tobytes()))
+            tfs.append(array("H", np.frombuffer(self._tfs[term_id], dtype=np.uint16)[keep].tobytes()))
+        self._terms, self._docs, self._tfs = terms, docs, tfs
+        self._ids = [chunk_id for chunk_id in self._ids if chunk_id is not None]
+        self._numbers = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._lengths = array("I", np.frombuffer(self._lengths, dtype=np.uint32)[live].tobytes())
+        self._live = bytearray(b"\x01" * len(self._ids))
+        self._deleted = 0
+        self._dirty = True
+        self._query_arrays = None
+
+    # --- Search ---
+
+    def _get_query_arrays(self):
+        if self._query_arrays is None:
+            average_length = max(self._total_length / max(len(self._numbers), 1), 1.0)
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            length_norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            live = np.frombuffer(self._live, dtype=np.uint8).astype(bool)
+            self._query_arrays = (length_norm, live)
+        return self._query_arrays
+
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """[(chunk_id, BM25 score), ...] of the best `top_k` documents containing any query term."""
+        with self._lock:
+            term_ids = [self._terms[term] for term in dict.fromkeys(analyze(query)) if term in self._terms]
+            live_count = len(self._numbers)
+            if not term_ids or not live_count:
+                return []
+            length_norm, live = self._get_query_arrays()
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term_id in term_ids:
+                numbers = np.frombuffer(self._docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._tfs[term_id], dtype=np.uint16).astype(np.float32)
+                df = int(np.count_nonzero(live[numbers]))
+                if not df:
+                    continue
+                idf = math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+                # A term occurs once per document in its postings, so plain fancy-index addition is safe
+                scores[numbers] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[numbers])
+            scores[~live] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > top_k:
+                candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._ids[number], float(scores[number])) for number in ranked]
+
+    def idf(self, terms: Iterable[str]) -> Dict[str, float]:
+        """BM25 IDF of each term (terms not in the index get the IDF of a term in one document)."""
+        with self._lock:
+            count = max(len(self._numbers), 1)
+            weights = {}
+            for term in terms:
+                term_id = self._terms.get(term)
+                # Postings may still include deleted documents until compaction; close enough for weighting
+                df = min(len(self._docs[term_id]), count) if term_id is not None else 1
+                weights[term] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            return weights
+
+    # --- Persistence ---
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            terms = json.loads(str(data["terms"]))
+            offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+            self._ids = json.loads(str(data["ids"]))
+            self._lengths = array("I", data["lengths"].astype(np.uint32).tobytes())
+        self._terms = {term: i for i, term in enumerate(terms)}
+        self._docs = [array("I", docs[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(terms))]
+        self._tfs = [array("H", tfs[offsets[i]:offsets[i + 1]].tobytes()) for i in range(len(terms))]
+        self._numbers = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._live = bytearray(b"\x01" * len(self._ids))
+        self._total_length = sum(self._lengths)
+        logger.info(f"Loaded lexical index from {self.path} ({len(self._ids)} chunks, {len(terms)} terms).")
+
+    def save(self):
+        """Writes the index atomically (compacting it first) if it changed since the last save."""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            if self._deleted:
+                self._compact_locked()
+            terms = list(self._terms)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self._docs[self._terms[term]]) for term in terms])
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    terms=np.array(json.dumps(terms)),
+                    ids=np.array(json.dumps(self._ids)),
+                    offsets=offsets,
+                    docs=np.concatenate([np.frombuffer(self._docs[self._terms[term]], dtype=np.uint32) for term in terms]) if terms else np.zeros(0, dtype=np.uint32),
+                    tfs=np.concatenate([np.frombuffer(self._tfs[self._terms[term]], dtype=np.uint16) for term in terms]) if terms else np.zeros(0, dtype=np.uint16),
+                    lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            logger.info(f"Saved lexical index to {self.path} ({len(self._ids)} chunks, {len(terms)} terms).")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            postings = sum(len(docs) for docs in self._docs)
+            return {
+                "chunks": len(self._numbers),
+                "terms": len(self._terms),
+                "postings": postings,
+                "postings_bytes": postings * 6, # uint32 document number + uint16 frequency
+                "deleted": self._deleted,
+            }
+
+
+# --- Process-wide index ---
+_index: Optional[BM25Index] = None
+_index_disabled = not LEXICAL_INDEX_ENABLED
+
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Returns the shared lexical index, or None if it is disabled or could not be loaded."""
+    global _index, _index_disabled
+    if _index is None and not _index_disabled:
+        try:
+            _index = BM25Index()
+        except Exception as e:
+            logger.warning(f"Could not load lexical index from {LEXICAL_INDEX_PATH}: {e}. Retrieval is vector-only; rebuild it with scripts/build_lexical_index.py.")
+            _index_disabled = True
+    return _index
+
+
+def save_lexical_index():
+    """Saves the shared index if it is loaded and changed (ingestion scripts call this at checkpoints)."""
+    if _index is not None:
+        _index.save()
+
+
+def close_lexical_index():
+    """Shutdown hook: saves the shared index if it changed."""
+    global _index
+    if _index is not None:
+        _index.save()
+        _index = None
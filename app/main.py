@@ -1,117 +1,141 @@
-from http.server import BaseHTTPRequestHandler
-import json
+"""
+ASGI webhook server for the Telegram bot.
+
+Telegram POSTs each update to /webhook/<WEBHOOK_SECRET_TOKEN>. The request is checked, the
+update is handed to the update scheduler (app/update_scheduler.py) and acknowledged straight
+away; the scheduler runs the bot's handlers (see app/telegram_bot.py) concurrently across chats
+and in order within each chat. Slow answers therefore never hold the HTTP request open, and
+Telegram has no reason to redeliver updates.
+
+This needs a long-running server process: an update is processed after its request has been
+answered. On serverless platforms such as Vercel (vercel.json) the instance may be frozen as soon
+as the response is sent, so queued updates can be delayed or never answered.
+
+Run with:
+    uvicorn app.main:app --host 0.0.0.0 --port 8000
+"""
+import hmac
+import logging
 import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from dotenv import load_dotenv
 
-load_dotenv()
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+from app.config import APP_HOST, APP_PORT, WEBHOOK_SECRET_TOKEN, WEBHOOK_URL, UPDATE_MAX_CONCURRENCY
+from app.telegram_bot import build_application, shutdown_clients
+from app.update_scheduler import UpdateScheduler
 
-# Initialize the application
-application = Application.builder().token(TELEGRAM_TOKEN).build()
+logger = logging.getLogger(__name__)
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "Welcome to the Immigration Assistant! Ask me any questions about U.S. immigration laws."
-    )
-<<<<<<< HEAD
+SECRET_TOKEN_PLACEHOLDER = "YOUR_SECURE_PATH_TOKEN_PLACEHOLDER"
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "I can help you with questions about U.S. immigration laws. Just ask your question!"
+if os.getenv("VERCEL"):
+    logger.warning(
+        "Running on Vercel: updates are processed after the webhook is acknowledged, which a serverless "
+        "function may not live to do. Deploy app/main.py to a long-running uvicorn host instead."
     )
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.message.text
-    # For now, just echo back the message
-    await update.message.reply_text(f"You asked: {query}\n\nThis is a placeholder response. The actual response generation will be implemented later.")
-
-# Add handlers
-application.add_handler(CommandHandler("start", start))
-application.add_handler(CommandHandler("help", help_command))
-application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-
-class Handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b"Immigration Bot is running")
-        
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        
-        try:
-            update = Update.de_json(json.loads(post_data), application.bot)
-            application.process_update(update)
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"OK")
-        except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(str(e).encode())
-=======
-
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "I can help you with questions about U.S. immigration laws. Just ask your question!"
-    )
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.message.text
-    # For now, just echo back the message
-    await update.message.reply_text(f"You asked: {query}\n\nThis is a placeholder response. The actual response generation will be implemented later.")
-
-# Add handlers
-application.add_handler(CommandHandler("start", start))
-application.add_handler(CommandHandler("help", help_command))
-application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-
-class Handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b"Immigration Bot is running")
-        
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        
-        try:
-            update = Update.de_json(json.loads(post_data), application.bot)
-            application.process_update(update)
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b"OK")
-        except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(str(e).encode())
+def _secret_configured() -> bool:
+    return bool(WEBHOOK_SECRET_TOKEN) and WEBHOOK_SECRET_TOKEN != SECRET_TOKEN_PLACEHOLDER
+
+
+def _token_matches(token: str) -> bool:
+    return hmac.compare_digest(token.encode("utf-8"), WEBHOOK_SECRET_TOKEN.encode("utf-8"))
+
+
+def _is_authorized(path_token: Optional[str], header_token: Optional[str]) -> bool:
+    """
+    The secret must arrive in the URL path, in Telegram's X-Telegram-Bot-Api-Secret-Token header
+    (sent when the webhook is registered with secret_token), or both; any token sent must match.
+    """
+    if not _secret_configured():
+        return False
+    tokens = [token for token in (path_token, header_token) if token is not None]
+    return bool(tokens) and all(_token_matches(token) for token in tokens)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not _secret_configured():
+        logger.error("WEBHOOK_SECRET_TOKEN is not set; all webhook requests will be rejected.")
+    application = build_application(polling=False)
+    await application.initialize()
+    await application.start()
+    if WEBHOOK_URL and _secret_configured():
+        webhook_url = f"{WEBHOOK_URL.rstrip('/')}/webhook/{WEBHOOK_SECRET_TOKEN}"
+        await application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=max(UPDATE_MAX_CONCURRENCY, 1),
+        )
+        logger.info(f"Registered webhook at {WEBHOOK_URL.rstrip('/')}/webhook/<secret>.")
+
+    scheduler = UpdateScheduler(application.process_update)
+    await scheduler.start()
+    app.state.application = application
+    app.state.scheduler = scheduler
+    logger.info(f"Webhook server ready; up to {scheduler.max_concurrency} updates processed at once.")
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await application.stop()
+        await application.shutdown()
+        # post_shutdown hooks only run under run_polling()/run_webhook(); release the clients here
+        await shutdown_clients(application)
+
+
+app = FastAPI(title="Immigration Assistant Bot", lifespan=lifespan)
+
+
+@app.get("/", response_class=PlainTextResponse)
+async def index():
+    return "Immigration Bot is running"
+
+
+@app.get("/healthz")
+async def healthz(request: Request):
+    return request.app.state.scheduler.metrics()
+
+
+async def _receive_update(request: Request, path_token: Optional[str], header_token: Optional[str]):
+    if not _is_authorized(path_token, header_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    application = request.app.state.application
+    try:
+        update = Update.de_json(data, application.bot)
+    except (KeyError, TypeError, ValueError):
+        update = None
+    if update is None:
+        raise HTTPException(status_code=400, detail="Not an update")
+    if not request.app.state.scheduler.submit_nowait(update):
+        # Telegram redelivers later; better than dropping the update
+        logger.warning(f"Update queue full; asking Telegram to retry update {update.update_id}.")
+        return JSONResponse({"ok": False}, status_code=503, headers={"Retry-After": "5"})
+    return {"ok": True}
+
+
+@app.post("/webhook/{token}")
+async def webhook(token: str, request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(default=None)):
+    return await _receive_update(request, token, x_telegram_bot_api_secret_token)
+
+
+@app.post("/webhook")
+async def webhook_header_only(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(default=None)):
+    return await _receive_update(request, None, x_telegram_bot_api_secret_token)
+
 
 if __name__ == "__main__":
-    import asyncio
-    from http.server import HTTPServer
-    
-    # Start the webhook server
-    server = HTTPServer(('0.0.0.0', 8000), Handler)
-    print("Starting webhook server on port 8000...")
-    
-    # Run the server in a separate thread
-    import threading
-    server_thread = threading.Thread(target=server.serve_forever)
-    server_thread.daemon = True
-    server_thread.start()
-    
-    # Run the bot
-    print("Starting bot...")
-    application.run_polling()
\ No newline at end of file
+    import uvicorn
+
+    uvicorn.run("app.main:app", host=APP_HOST, port=APP_PORT)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+import openai
+
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_CONNECT_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    OPENAI_CHAT_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIClientManager:
+    """
+    Owns a single openai.AsyncOpenAI client (and its keep-alive HTTP connection pool)
+    for the whole process, so embedding and chat calls reuse open connections instead
+    of paying for a new pool and TLS handshake on every call.
+
+    The underlying HTTP connections belong to the event loop that opened them. If the
+    client is requested from a different loop (e.g. a script calling asyncio.run() twice),
+    a fresh client is created for the new loop.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = OPENAI_KEEPALIVE_EXPIRY,
+        connect_timeout: float = OPENAI_CONNECT_TIMEOUT,
+        default_timeout: float = OPENAI_CHAT_TIMEOUT,
+        max_retries: int = OPENAI_MAX_RETRIES,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+
+        self._client: Optional[openai.AsyncOpenAI] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _build_client(self) -> openai.AsyncOpenAI:
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=openai.Timeout(self.default_timeout, connect=self.connect_timeout),
+        )
+        logger.info(
+            f"Creating shared OpenAI client (max_connections={self.max_connections}, "
+            f"max_keepalive={self.max_keepalive_connections}, keepalive_expiry={self.keepalive_expiry}s)."
+        )
+        return openai.AsyncOpenAI(
+            api_key=self.api_key or openai.api_key or OPENAI_API_KEY,
+            base_url=self.base_url,
+            http_client=http_client,
+            max_retries=self.max_retries,
+        )
+
+    def get_client(self) -> openai.AsyncOpenAI:
+        """
+        Returns the shared client, creating it on first use.
+        Must be called from inside a running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            # The old pool's connections are bound to a loop we can no longer use.
+            logger.debug("Event loop changed; discarding shared OpenAI client bound to the previous loop.")
+            self._client = None
+        if self._client is None:
+            self._client = self._build_client()
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        """Closes the shared client and its connection pool. Safe to call more than once."""
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None:
+            try:
+                await client.close()
+                logger.info("Shared OpenAI client closed.")
+            except Exception as e:
+                logger.warning(f"Error while closing shared OpenAI client: {e}")
+
+
+# --- Process-wide default manager ---
+_default_manager = OpenAIClientManager()
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Returns the process-wide pooled AsyncOpenAI client."""
+    return _default_manager.get_client()
+
+
+async def close_openai_client():
+    """Shutdown hook: closes the process-wide client's connection pool."""
+    await _default_manager.aclose()
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD (additive-increase / multiplicative-decrease) concurrency limiter.
+
+    Every successful call raises the limit by roughly `increase_step` per "window" of
+    `limit` calls; a rate-limit response cuts it by `decrease_factor` (at most once per
+    `decrease_cooldown` seconds, so one burst of 429s counts as a single signal) and, when
+    the server sent a Retry-After, pauses new calls until that moment. Throughput therefore
+    settles just below whatever rate the upstream account allows.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+        name: str = "limiter",
+    ):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit.")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1.")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.name = name
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self):
+        async with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    # Drop the lock while sleeping so releases can still get through.
+                    self._condition.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await self._condition.acquire()
+                    continue
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def on_success(self):
+        previous = self.limit
+        self._limit = min(float(self.max_limit), self._limit + self.increase_step / max(self._limit, 1.0))
+        if self.limit != previous:
+            logger.debug(f"[{self.name}] Concurrency limit raised to {self.limit}.")
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        logger.warning(
+            f"[{self.name}] Rate limited; concurrency limit cut to {self.limit}"
+            + (f", pausing {retry_after:.2f}s." if retry_after else ".")
+        )
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Reads Retry-After / retry-after-ms from an HTTP error's response headers, if present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        # Retry-After may also be an HTTP date; fall back to our own backoff in that case.
+        return None
+    return None
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    return isinstance(exc, openai.RateLimitError) or getattr(exc, "status_code", None) == 429
+
+
+def is_transient_openai_error(exc: BaseException) -> bool:
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError))
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def call_with_retries(
+    limiter: AdaptiveConcurrencyLimiter,
+    fn: Callable[[], Awaitable[Any]],
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    is_retryable: Callable[[BaseException], bool] = is_transient_openai_error,
+) -> Any:
+    """
+    Runs `fn` inside a limiter slot, feeding successes and rate limits back to the limiter.
+    Rate-limit errors and errors accepted by `is_retryable` are retried with jittered
+    exponential backoff (or the server's Retry-After, whichever is longer); the last
+    error is re-raised once `max_retries` is exhausted.
+    """
+    attempt = 0
+    while True:
+        try:
+            async with limiter.slot():
+                result = await fn()
+            limiter.on_success()
+            return result
+        except Exception as e:
+            rate_limited = is_rate_limit_error(e)
+            if not rate_limited and not is_retryable(e):
+                raise
+            if attempt >= max_retries:
+                logger.error(f"[{limiter.name}] Giving up after {attempt + 1} attempts: {e}")
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if rate_limited:
+                retry_after = retry_after_seconds(e)
+                limiter.on_rate_limited(retry_after)
+                if retry_after:
+                    delay = max(delay, retry_after)
+            logger.info(f"[{limiter.name}] Attempt {attempt + 1} failed ({type(e).__name__}); retrying in {delay:.2f}s.")
+            attempt += 1
+            await asyncio.sleep(delay)
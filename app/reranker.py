@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from app.config import RERANKER, RERANK_TOP_N, RERANK_MIN_RELATIVE_SCORE
+from app.chunk_store import TERMS_FIELD
+from app.lexical_index import analyze, get_lexical_index
+from app.vector_backends.base import VectorMatch
+
+logger = logging.getLogger(__name__)
+
+TERMS_MEMO_SIZE = 4096 # Chunks whose analyzed terms are kept in memory (IDs are content hashes, so entries never go stale)
+
+
+class Reranker(ABC):
+    """
+    Re-orders retrieved candidates and keeps the best few for the prompt.
+
+    rerank() returns new VectorMatch objects best first, with `score` set to the re-ranker's score
+    and the first-stage score kept as `retrieval_score` in their metadata.
+    """
+
+    name = "base"
+
+    def __init__(self, top_n: int = RERANK_TOP_N, min_relative_score: float = RERANK_MIN_RELATIVE_SCORE):
+        self.top_n = top_n
+        self.min_relative_score = min_relative_score
+
+    @abstractmethod
+    def score(self, query: str, matches: List[VectorMatch]) -> List[float]:
+        """One score per match (higher is better); runs on the CPU within a few milliseconds."""
+
+    def rerank(self, query: str, matches: List[VectorMatch]) -> List[VectorMatch]:
+        if not matches:
+            return []
+        start = time.perf_counter()
+        scores = self.score(query, matches)
+        ranked = sorted(zip(scores, range(len(matches))), key=lambda item: (-item[0], item[1]))
+        best = ranked[0][0]
+        kept = [
+            VectorMatch(id=matches[i].id, score=score, metadata={**matches[i].metadata, "retrieval_score": matches[i].score})
+            for score, i in ranked[:self.top_n]
+            if score >= best * self.min_relative_score
+        ]
+        moved = sum(1 for position, (_, i) in enumerate(ranked[:len(kept)]) if i != position)
+        logger.info(
+            f"Re-ranked {len(matches)} candidates with '{self.name}' in {(time.perf_counter() - start) * 1000:.2f} ms; "
+            f"kept {len(kept)} ({moved} moved from their retrieval position)."
+        )
+        return kept
+
+
+class LexicalOverlapReranker(Reranker):
+    """
+    Feature-based scorer over the lexical analyzer's terms (app/lexical_index.py):
+
+    - coverage: share of the query's terms found in the chunk, weighted by IDF from the lexical index;
+    - identifiers: share of the query's identifiers (form numbers, visa classes, sections) found;
+    - phrases: share of the query's adjacent term pairs found as pairs in the chunk;
+    - retrieval: the first-stage score (cosine or fused), relative to the best candidate's.
+
+    Retrieval carries half the weight, so the blended score (which the relative cutoff applies to)
+    keeps the first-stage best at 0.5 or more: a strong semantic match with no words in common with
+    the query is demoted by lexical evidence but not dropped for lacking it.
+
+    Chunk terms come pre-tokenized from the chunk store (app/chunk_store.py); chunks without them
+    are analyzed once and memoized by ID.
+    """
+
+    name = "lexical"
+    WEIGHTS = {"coverage": 0.25, "identifiers": 0.15, "phrases": 0.1, "retrieval": 0.5}
+
+    def __init__(self, top_n: int = RERANK_TOP_N, min_relative_score: float = RERANK_MIN_RELATIVE_SCORE, memo_size: int = TERMS_MEMO_SIZE):
+        super().__init__(top_n, min_relative_score)
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, Tuple[FrozenSet[str], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _chunk_terms(self, match: VectorMatch) -> Tuple[FrozenSet[str], str]:
+        """The chunk's term set, and its terms joined by spaces (padded) for phrase lookups."""
+        with self._lock:
+            cached = self._memo.get(match.id)
+            if cached is not None:
+                self._memo.move_to_end(match.id)
+                return cached
+        joined = match.metadata.get(TERMS_FIELD)
+        if joined is None:
+            joined = " ".join(analyze(match.metadata.get("original_text") or ""))
+        entry = (frozenset(joined.split()), f" {joined} ")
+        with self._lock:
+            self._memo[match.id] = entry
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return entry
+
+    def score(self, query: str, matches: List[VectorMatch]) -> List[float]:
+        best_retrieval = max(match.score for match in matches)
+        retrieval = [match.score / best_retrieval if best_retrieval > 0 else 1.0 for match in matches]
+        query_terms = analyze(query)
+        unique_terms = list(dict.fromkeys(query_terms))
+        if not unique_terms:
+            return [self.WEIGHTS["retrieval"] * share for share in retrieval]
+        lexical_index = get_lexical_index()
+        idf: Dict[str, float] = lexical_index.idf(unique_terms) if lexical_index is not None and len(lexical_index) else {term: 1.0 for term in unique_terms}
+        total_idf = sum(idf.values()) or 1.0
+        identifiers = [term for term in unique_terms if any(character.isdigit() for character in term)]
+        # Adjacent query terms, matched as a substring of the chunk's joined terms
+        phrases = {f" {first} {second} " for first, second in zip(query_terms, query_terms[1:])}
+
+        scores = []
+        for match, retrieval_share in zip(matches, retrieval):
+            terms, joined = self._chunk_terms(match)
+            coverage = sum(idf[term] for term in unique_terms if term in terms) / total_idf
+            # Without identifiers in the query the feature carries no signal, so it mirrors coverage
+            identifier_share = sum(term in terms for term in identifiers) / len(identifiers) if identifiers else coverage
+            phrase_share = sum(phrase in joined for phrase in phrases) / len(phrases) if phrases else coverage
+            scores.append(
+                self.WEIGHTS["coverage"] * coverage
+                + self.WEIGHTS["identifiers"] * identifier_share
+                + self.WEIGHTS["phrases"] * phrase_share
+                + self.WEIGHTS["retrieval"] * retrieval_share
+            )
+        return scores
+
+
+def create_reranker(name: str) -> Optional[Reranker]:
+    """Instantiates a re-ranker by name; "none" disables re-ranking."""
+    if name == "none":
+        return None
+    if name == "lexical":
+        return LexicalOverlapReranker()
+    raise ValueError(f"Unknown re-ranker: '{name}'. Expected 'lexical' or 'none'.")
+
+
+_reranker: Optional[Reranker] = None
+_reranker_created = False
+
+
+def get_reranker() -> Optional[Reranker]:
+    """Returns the process-wide re-ranker selected by RERANKER, or None if re-ranking is off."""
+    global _reranker, _reranker_created
+    if not _reranker_created:
+        _reranker = create_reranker(RERANKER)
+        _reranker_created = True
+    return _reranker
+
+
+def set_reranker(reranker: Optional[Reranker]):
+    """Overrides the process-wide re-ranker (e.g. with a cross-encoder implementing Reranker.score)."""
+    global _reranker, _reranker_created
+    _reranker = reranker
+    _reranker_created = True
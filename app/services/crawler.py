@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from app.config import (
+    SCRAPER_MAX_CONCURRENCY,
+    SCRAPER_PER_HOST_CONCURRENCY,
+    SCRAPER_PER_HOST_INTERVAL,
+    SCRAPER_TIMEOUT,
+    SCRAPER_MAX_RETRIES,
+    SCRAPER_RESPECT_ROBOTS,
+    SCRAPER_USER_AGENT,
+)
+from app.rate_limiter import backoff_delay, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
+]
+DEFAULT_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CrawlError(Exception):
+    """A URL could not be fetched (after retries, where the failure was transient)."""
+
+    def __init__(self, message: str, url: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+
+
+class RobotsDisallowed(CrawlError):
+    """robots.txt forbids fetching the URL."""
+
+
+@dataclass
+class FetchResult:
+    url: str                 # URL as requested
+    final_url: str           # URL after redirects
+    status_code: int
+    headers: Dict[str, str]
+    text: str
+    elapsed: float           # Seconds spent on the successful attempt
+    attempts: int = 1
+
+
+@dataclass
+class CrawlResult:
+    """One URL visited by AsyncCrawler.crawl(): either `result` or `error` is set."""
+    url: str
+    depth: int
+    result: Optional[FetchResult] = None
+    error: Optional[CrawlError] = None
+    links: List[str] = field(default_factory=list)
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> str:
+    """Absolute URL without its #fragment, so the same page is only visited once."""
+    if base:
+        url = urljoin(base, url)
+    return urldefrag(url)[0]
+
+
+class _HostState:
+    """Politeness bookkeeping for one host (scheme + netloc)."""
+
+    def __init__(self, concurrency: int, interval: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = interval
+        self.next_start = 0.0  # Monotonic time before which no new request may start
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_loaded = False
+        self.robots_lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        """Reserves the next start slot for this host and sleeps until it arrives."""
+        now = time.monotonic()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def back_off(self, delay: float):
+        """Pushes every later request to this host back by at least `delay` seconds."""
+        self.next_start = max(self.next_start, time.monotonic() + delay)
+
+
+class AsyncCrawler:
+    """
+    Asynchronous HTTP fetcher and crawler with per-host politeness.
+
+    One pooled keep-alive httpx.AsyncClient serves every request. Each host gets its own
+    concurrency limit and minimum interval between request starts (raised to the robots.txt
+    Crawl-delay / Request-rate when those are stricter); retries back off only the host that
+    failed, with jittered exponential delays or the server's Retry-After. `crawl()` runs a
+    frontier queue over a pool of workers, following links up to `max_depth`.
+
+    The client is bound to the event loop it was first used on.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = SCRAPER_MAX_CONCURRENCY,
+        per_host_concurrency: int = SCRAPER_PER_HOST_CONCURRENCY,
+        per_host_interval: float = SCRAPER_PER_HOST_INTERVAL,
+        timeout: float = SCRAPER_TIMEOUT,
+        max_retries: int = SCRAPER_MAX_RETRIES,
+        respect_robots: bool = SCRAPER_RESPECT_ROBOTS,
+        user_agent: Optional[str] = SCRAPER_USER_AGENT or None,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        if max_concurrency < 1 or per_host_concurrency < 1 or max_retries < 1:
+            raise ValueError("Concurrency limits and max_retries must be positive.")
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self._client = client
+        self._owns_client = client is None
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._hosts: Dict[str, _HostState] = {}
+        self.requests_made = 0
+        self.retries = 0
+
+    # --- Setup / teardown ---
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                follow_redirects=True,
+                headers=DEFAULT_HEADERS,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+        self._client = None
+
+    async def __aenter__(self) -> "AsyncCrawler":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # --- Hosts and robots.txt ---
+
+    def _user_agent(self) -> str:
+        return self.user_agent or random.choice(USER_AGENTS)
+
+    def _host(self, url: str) -> Tuple[str, _HostState]:
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        state = self._hosts.get(key)
+        if state is None:
+            state = _HostState(self.per_host_concurrency, self.per_host_interval)
+            self._hosts[key] = state
+        return key, state
+
+    async def _load_robots(self, host: str, state: _HostState):
+        async with state.robots_lock:
+            if state.robots_loaded:
+                return
+            parser = RobotFileParser(f"{host}/robots.txt")
+            try:
+                await state.wait_turn()
+                response = await self._get_client().get(f"{host}/robots.txt", headers={"User-Agent": self._user_agent()})
+                if response.status_code >= 400:
+                    # No robots.txt (or it is unreadable): everything is allowed
+                    parser.allow_all = True
+                else:
+                    parser.parse(response.text.splitlines())
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not fetch {host}/robots.txt ({type(e).__name__}); assuming everything is allowed.")
+                parser.allow_all = True
+            state.robots = parser
+            state.robots_loaded = True
+
+            agent = self.user_agent or "*"
+            delay = parser.crawl_delay(agent)
+            rate = parser.request_rate(agent)
+            interval = max(
+                self.per_host_interval,
+                float(delay) if delay else 0.0,
+                rate.seconds / rate.requests if rate and rate.requests else 0.0,
+            )
+            if interval > state.interval:
+                logger.info(f"{host}: robots.txt asks for {interval:.2f}s between requests.")
+                state.interval = interval
+
+    async def allowed(self, url: str) -> bool:
+        """Whether robots.txt lets us fetch `url` (always True when robots are not respected)."""
+        if not self.respect_robots:
+            return True
+        host, state = self._host(url)
+        if not state.robots_loaded:
+            await self._load_robots(host, state)
+        return state.robots.can_fetch(self.user_agent or "*", url)
+
+    # --- Fetching ---
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """
+        GETs `url` politely. Transport errors, 429 and 5xx responses are retried up to
+        `max_retries` attempts in total; other 4xx responses fail at once. Raises CrawlError.
+        """
+        if not await self.allowed(url):
+            raise RobotsDisallowed(f"robots.txt disallows {url}", url)
+        host, state = self._host(url)
+        request_headers = {"User-Agent": self._user_agent()}
+        if headers:
+            request_headers.update(headers)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            async with state.semaphore:
+                await state.wait_turn()
+                async with self._global:
+                    start = time.monotonic()
+                    self.requests_made += 1
+                    try:
+                        response = await self._get_client().get(url, headers=request_headers)
+                        error: Optional[Exception] = None
+                    except httpx.HTTPError as e:
+                        response, error = None, e
+                    elapsed = time.monotonic() - start
+
+            if response is not None and response.status_code < 400:
+                return FetchResult(url, str(response.url), response.status_code, dict(response.headers), response.text, elapsed, attempt)
+
+            status = response.status_code if response is not None else None
+            reason = f"HTTP {status}" if response is not None else f"{type(error).__name__}: {error}"
+            if status is not None and status not in RETRYABLE_STATUS_CODES:
+                raise CrawlError(f"Failed to scrape {url}: {reason}", url, status)
+            if attempt >= self.max_retries:
+                raise CrawlError(f"Failed to scrape {url} after {attempt} attempts: {reason}", url, status)
+
+            delay = backoff_delay(attempt - 1, base_delay=1.0, max_delay=60.0)
+            if response is not None:
+                retry_after = retry_after_seconds(httpx.HTTPStatusError(reason, request=response.request, response=response))
+                if retry_after:
+                    delay = max(delay, retry_after)
+            # Only this host waits; requests to other hosts carry on
+            state.back_off(delay)
+            self.retries += 1
+            logger.warning(f"Attempt {attempt} for {url} failed ({reason}); retrying in {delay:.2f}s.")
+
+    # --- Crawling ---
+
+    async def crawl(
+        self,
+        seeds: Iterable[str],
+        extract_links: Optional[Callable[[FetchResult], Iterable[str]]] = None,
+        max_depth: int = 0,
+        max_pages: Optional[int] = None,
+        allowed_hosts: Optional[Set[str]] = None,
+        link_filter: Optional[Callable[[str], bool]] = None,
+        workers: Optional[int] = None,
+        request_headers: Optional[Callable[[str], Optional[Dict[str, str]]]] = None,
+    ) -> AsyncIterator[CrawlResult]:
+        """
+        Visits `seeds` and, up to `max_depth` link hops away, the pages they link to, yielding a
+        CrawlResult per URL as soon as it is done (completion order, not seed order).
+
+        `extract_links(result)` returns the (possibly relative) links of a fetched page; links
+        are only followed to `allowed_hosts` (default: the seeds' hosts) and when `link_filter`
+        accepts them. Each URL is visited at most once; `max_pages` caps the number of visits.
+        `request_headers(url)` may supply extra headers per request (e.g. cache validators).
+        """
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        seen: Set[str] = set()
+        pending = 0
+        done = object()
+
+        def enqueue(url: str, depth: int) -> bool:
+            nonlocal pending
+            if url in seen or (max_pages is not None and len(seen) >= max_pages):
+                return False
+            seen.add(url)
+            pending += 1
+            frontier.put_nowait((url, depth))
+            return True
+
+        seed_urls = [normalize_url(url) for url in seeds]
+        if allowed_hosts is None:
+            allowed_hosts = {urlparse(url).netloc for url in seed_urls}
+        for url in seed_urls:
+            enqueue(url, 0)
+        if not pending:
+            return
+
+        async def worker():
+            nonlocal pending
+            while True:
+                url, depth = await frontier.get()
+                item = CrawlResult(url, depth)
+                try:
+                    item.result = await self.fetch(url, request_headers(url) if request_headers else None)
+                    if extract_links is not None and depth < max_depth:
+                        base = item.result.final_url
+                        for link in extract_links(item.result):
+                            link = normalize_url(link, base)
+                            if urlparse(link).scheme not in ("http", "https") or urlparse(link).netloc not in allowed_hosts:
+                                continue
+                            if link_filter is not None and not link_filter(link):
+                                continue
+                            item.links.append(link)
+                            enqueue(link, depth + 1)
+                except CrawlError as e:
+                    item.error = e
+                except Exception as e:
+                    logger.error(f"Unexpected error while crawling {url}: {e}", exc_info=True)
+                    item.error = CrawlError(f"Failed to scrape {url}: {e}", url)
+                results.put_nowait(item)
+                pending -= 1
+                if pending == 0:
+                    results.put_nowait(done)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers or self.max_concurrency)]
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
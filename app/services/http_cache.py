@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.config import HTTP_CACHE_ENABLED, HTTP_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def body_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    status_code: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: Dict[str, str]
+    body_hash: str
+    parsed: Dict[str, Any] = field(default_factory=dict) # JSON-serializable fields extracted from the body
+    fetched_at: float = 0.0      # Last time the body was downloaded
+    validated_at: float = 0.0    # Last time the server confirmed (200 or 304) it is current
+    changed_at: float = 0.0      # Last time the body was different from the previous crawl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Request headers that let the server answer 304 Not Modified if the page is unchanged."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Persistent HTTP cache for scraped pages, keyed by URL and backed by SQLite.
+
+    Each entry keeps the zlib-compressed body, its sha256, the validators (ETag, Last-Modified)
+    and the parse of the body, so a page the server reports as unchanged (304, or a 200 with an
+    identical body) can be answered without downloading or re-parsing it.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        self.path = path
+        self.hits = 0           # Revalidated as unchanged (304 or identical body)
+        self.misses = 0         # No entry yet
+        self.changes = 0        # Entry existed but the page had changed
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                body_hash TEXT NOT NULL,
+                parsed TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                validated_at REAL NOT NULL,
+                changed_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """The entry for `url` without its body, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, etag, last_modified, headers, body_hash, parsed, fetched_at, validated_at, changed_at "
+                "FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        status_code, etag, last_modified, headers, digest, parsed, fetched_at, validated_at, changed_at = row
+        return CachedPage(url, status_code, etag, last_modified, json.loads(headers), digest, json.loads(parsed), fetched_at, validated_at, changed_at)
+
+    def get_body(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put(self, url: str, status_code: int, headers: Dict[str, str], body: str, parsed: Dict[str, Any]) -> CachedPage:
+        """Stores a new or changed page and its parse."""
+        now = time.time()
+        lowered = {key.lower(): value for key, value in headers.items()}
+        page = CachedPage(
+            url, status_code, lowered.get("etag"), lowered.get("last-modified"), dict(headers), body_hash(body), parsed,
+            fetched_at=now, validated_at=now, changed_at=now,
+        )
+        with self._lock:
+            existed = self._conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+            if existed:
+                self.changes += 1
+            else:
+                self.misses += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, status_code, etag, last_modified, headers, body, body_hash, parsed, fetched_at, validated_at, changed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status_code, page.etag, page.last_modified, json.dumps(page.headers), zlib.compress(body.encode("utf-8"), 6),
+                 page.body_hash, json.dumps(parsed), page.fetched_at, page.validated_at, page.changed_at)
+            )
+            self._conn.commit()
+        return page
+
+    def mark_unchanged(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """Records that the cached page is still current (refreshing any validators the server sent)."""
+        lowered = {key.lower(): value for key, value in (headers or {}).items()}
+        with self._lock:
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE pages SET validated_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), lowered.get("etag"), lowered.get("last-modified"), url)
+            )
+            self._conn.commit()
+
+    def delete(self, url: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, stored_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM pages").fetchone()
+        lookups = self.hits + self.misses + self.changes
+        return {
+            "entries": entries,
+            "bytes": stored_bytes,
+            "unchanged": self.hits,
+            "new": self.misses,
+            "changed": self.changes,
+            "unchanged_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Process-wide cache ---
+_cache: Optional[HttpCache] = None
+_cache_disabled = not HTTP_CACHE_ENABLED
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Returns the shared HTTP cache, or None if it is disabled or could not be opened."""
+    global _cache, _cache_disabled
+    if _cache is None and not _cache_disabled:
+        try:
+            _cache = HttpCache()
+        except Exception as e:
+            logger.warning(f"Could not open HTTP cache at {HTTP_CACHE_PATH}: {e}. Continuing without it.")
+            _cache_disabled = True
+    return _cache
@@ -1,14 +1,322 @@
 import PyPDF2
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import logging
 from pathlib import Path
 import io
+import math
+import mmap
+import threading
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.config import PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_OPEN_DOCUMENTS_MAX
+from app.services.text_cache import ExtractedTextCache, get_text_cache
+
+
+def _extract_page_range(source: Union[str, bytes], page_numbers: List[int]) -> List[str]:
+    """
+    Process-pool worker: opens the PDF independently and extracts the given (0-based) pages.
+    `source` is a file path or the raw PDF bytes.
+    """
+    stream = io.BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+    with stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        return [pdf_reader.pages[page_num].extract_text() for page_num in page_numbers]
+
+
+class PDFDocument:
+    """
+    A PDF opened once and reused: the file is memory-mapped (no copy through Python buffers),
+    the cross-reference table is parsed a single time, and page text is extracted lazily on
+    first access and kept in `page_texts`.
+
+    Get handles from PDFService.open_document(), which shares them through a bounded LRU and
+    reopens a handle when the file changes on disk. Readers acquire() a handle and release() it
+    when done; a handle dropped from the LRU while in use is retired and closed by its last user.
+    """
+
+    def __init__(self, pdf_path: Union[str, Path]):
+        self.path = Path(pdf_path)
+        stat = self.path.stat()
+        self.file_size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self._file = open(self.path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.reader = PyPDF2.PdfReader(self._mmap)
+            self.num_pages = len(self.reader.pages)
+        except Exception:
+            self._file.close()
+            raise
+        self.page_texts: Dict[int, str] = {}
+        self.text_cache_key: Optional[str] = None
+        self.lock = threading.RLock() # PyPDF2 readers are not thread-safe
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+    @property
+    def metadata(self):
+        return self.reader.metadata
+
+    @property
+    def is_encrypted(self) -> bool:
+        return self.reader.is_encrypted
+
+    def is_stale(self) -> bool:
+        """True if the file was modified or removed since it was opened."""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return True
+        return (stat.st_size, stat.st_mtime_ns) != (self.file_size, self.mtime_ns)
+
+    @property
+    def closed(self) -> bool:
+        return self.reader is None
+
+    def acquire(self):
+        with self._users_lock:
+            if self._retired:
+                raise RuntimeError(f"PDF handle for {self.path} has been retired")
+            self._users += 1
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Closes the handle now if nobody is reading through it, otherwise when the last reader releases it."""
+        with self._users_lock:
+            self._retired = True
+            close = self._users == 0
+        if close:
+            self.close()
+
+    def close(self):
+        # Waits for a page extraction in progress on another thread
+        with self.lock:
+            if self.reader is None:
+                return
+            self.reader = None
+            self._mmap.close()
+            self._file.close()
+
 
 class PDFService:
-    def __init__(self):
-        """Initialize the PDF service with logging configuration."""
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        parallel_min_pages: Optional[int] = None,
+        text_cache: Optional[ExtractedTextCache] = None,
+        use_text_cache: bool = True,
+        max_open_documents: int = PDF_OPEN_DOCUMENTS_MAX
+    ):
+        """
+        Initialize the PDF service with logging configuration.
+        
+        Args:
+            workers (Optional[int]): Processes used for text extraction (default PDF_EXTRACT_WORKERS). 1 disables parallel mode.
+            parallel_min_pages (Optional[int]): Documents with fewer pages are extracted serially (default PDF_PARALLEL_MIN_PAGES)
+            text_cache (Optional[ExtractedTextCache]): Cache of extracted page text (default: the shared cache in PROCESSED_TEXTS_DIR)
+            use_text_cache (bool): Set to False to always parse the PDF
+            max_open_documents (int): Parsed documents kept open for reuse (least recently used are closed first)
+        """
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        self.workers = max(1, workers if workers is not None else PDF_EXTRACT_WORKERS)
+        self.parallel_min_pages = parallel_min_pages if parallel_min_pages is not None else PDF_PARALLEL_MIN_PAGES
+        self.text_cache = (text_cache or get_text_cache()) if use_text_cache else None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.max_open_documents = max(1, max_open_documents)
+        self._documents: "OrderedDict[str, PDFDocument]" = OrderedDict()
+        self._documents_lock = threading.Lock()
+
+    # --- Document handles ---
+
+    def open_document(self, pdf_path: Union[str, Path], acquire: bool = False) -> PDFDocument:
+        """
+        Returns a parsed handle for the PDF, reusing an open one when the file is unchanged.
+        Handles beyond `max_open_documents` are retired, least recently used first: closed at
+        once if unused, otherwise once their last reader releases them.
+        
+        Args:
+            pdf_path (Union[str, Path]): Path to the PDF file
+            acquire (bool): Acquire the handle for the caller, who must release() it (see borrow_document())
+            
+        Returns:
+            PDFDocument: Handle with the parsed reader and any page text extracted so far
+        """
+        pdf_path = Path(pdf_path)
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+        handle_key = str(pdf_path.resolve())
+        with self._documents_lock:
+            document = self._documents.pop(handle_key, None)
+            if document is not None and document.is_stale():
+                document.retire()
+                document = None
+            if document is None:
+                document = PDFDocument(pdf_path)
+                document.text_cache_key = self._cache_key(pdf_path)
+            if acquire:
+                document.acquire()
+            self._documents[handle_key] = document
+            while len(self._documents) > self.max_open_documents:
+                _, evicted = self._documents.popitem(last=False)
+                evicted.retire()
+        return document
+
+    @contextmanager
+    def borrow_document(self, pdf_path: Union[str, Path]) -> Iterator[PDFDocument]:
+        """open_document() for the duration of a `with` block: the handle stays open until the block ends."""
+        document = self.open_document(pdf_path, acquire=True)
+        try:
+            yield document
+        finally:
+            document.release()
+
+    def close_documents(self):
+        """Retires every open document handle (handles in use close when released)."""
+        with self._documents_lock:
+            for document in self._documents.values():
+                document.retire()
+            self._documents.clear()
+
+    def _document_texts(self, document: PDFDocument, page_numbers: List[int], retain: bool = True) -> Iterator[str]:
+        """
+        Yields the text of `page_numbers` in order. Pages already held by the handle are reused;
+        the rest come from the extracted-text cache or are extracted (in parallel when large).
+        With retain=False newly extracted pages are not kept on the handle (for streaming).
+        """
+        missing = list(dict.fromkeys(p for p in page_numbers if p not in document.page_texts))
+        fetched = iter(())
+        if missing:
+            if self._cached_page_count(document.text_cache_key) == document.num_pages:
+                fetched = zip(missing, self.text_cache.read_pages(document.text_cache_key, missing))
+            else:
+                fetched = zip(missing, self._iter_page_texts(str(document.path), document.reader, missing, lock=document.lock))
+        repeated = {p for p, uses in Counter(page_numbers).items() if uses > 1} if not retain else set()
+        local: Dict[int, str] = {}
+        for page_num in page_numbers:
+            text = document.page_texts.get(page_num, local.get(page_num))
+            if text is None:
+                _, text = next(fetched)
+                if retain:
+                    document.page_texts[page_num] = text
+                elif page_num in repeated:
+                    local[page_num] = text
+            yield text
+
+    def _store_document_texts(self, document: PDFDocument):
+        """Writes a handle's pages to the extracted-text cache once all of them are known."""
+        key = document.text_cache_key
+        if not key or len(document.page_texts) != document.num_pages or self._cached_page_count(key) == document.num_pages:
+            return
+        try:
+            self.text_cache.write(key, [document.page_texts[p] for p in range(document.num_pages)])
+        except OSError as e:
+            self.logger.warning(f"Could not write extracted text to the cache: {e}")
+
+    # --- Text extraction (serial or on a process pool) ---
+
+    def _use_parallel(self, page_count: int) -> bool:
+        return self.workers > 1 and page_count >= self.parallel_min_pages
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def close(self):
+        """Shuts down the extraction process pool, if one was started, and closes open documents."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self.close_documents()
+
+    def _page_ranges(self, page_numbers: List[int]) -> List[List[int]]:
+        # Several ranges per worker so that uneven pages (scans, dense tables) balance out
+        size = max(1, math.ceil(len(page_numbers) / (self.workers * 4)))
+        return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+    def _iter_page_texts(
+        self,
+        source: Union[str, bytes],
+        pdf_reader: PyPDF2.PdfReader,
+        page_numbers: List[int],
+        lock: Optional[threading.RLock] = None
+    ) -> Iterator[str]:
+        """
+        Yields the text of `page_numbers` in order. Large documents are split into page ranges
+        extracted on the process pool (each worker opens the PDF itself); at most two ranges per
+        worker are in flight, so results are streamed rather than collected. Falls back to
+        serial extraction with `pdf_reader` (under `lock`, if given) for small documents or if
+        the pool is unavailable.
+        """
+        lock = lock or nullcontext()
+        if not self._use_parallel(len(page_numbers)):
+            for page_num in page_numbers:
+                with lock:
+                    text = pdf_reader.pages[page_num].extract_text()
+                yield text
+            return
+
+        ranges = deque(self._page_ranges(page_numbers))
+        done = 0
+        try:
+            executor = self._get_executor()
+            in_flight = deque()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < self.workers * 2:
+                    in_flight.append(executor.submit(_extract_page_range, source, ranges.popleft()))
+                texts = in_flight.popleft().result()
+                done += len(texts)
+                yield from texts
+        except (BrokenProcessPool, OSError) as e:
+            self.logger.warning(f"Parallel PDF extraction failed ({e}); continuing serially.")
+            self._executor = None
+            for page_num in page_numbers[done:]:
+                with lock:
+                    text = pdf_reader.pages[page_num].extract_text()
+                yield text
+
+    def _extract_texts(self, source: Union[str, bytes], pdf_reader: PyPDF2.PdfReader, page_numbers: List[int]) -> List[str]:
+        return list(self._iter_page_texts(source, pdf_reader, page_numbers))
+
+    # --- Extracted-text cache ---
+
+    def _cache_key(self, source: Union[Path, bytes]) -> Optional[str]:
+        if self.text_cache is None:
+            return None
+        try:
+            if isinstance(source, bytes):
+                return self.text_cache.key_for_bytes(source)
+            return self.text_cache.key_for_file(source)
+        except OSError as e:
+            self.logger.warning(f"Could not hash {source if not isinstance(source, bytes) else 'PDF bytes'} for the text cache: {e}")
+            return None
+
+    def _cached_page_count(self, key: Optional[str]) -> Optional[int]:
+        return self.text_cache.page_count(key) if key else None
+
+    def _all_page_texts(self, source: Union[str, bytes], pdf_reader: PyPDF2.PdfReader, key: Optional[str]) -> List[str]:
+        """Text of every page: from the cache when this exact file was extracted before, otherwise parsed and cached."""
+        total_pages = len(pdf_reader.pages)
+        if self._cached_page_count(key) == total_pages:
+            return list(self.text_cache.read_pages(key, range(total_pages)))
+        texts = self._extract_texts(source, pdf_reader, list(range(total_pages)))
+        if key:
+            try:
+                self.text_cache.write(key, texts)
+            except OSError as e:
+                self.logger.warning(f"Could not write extracted text to the cache: {e}")
+        return texts
 
     def read_pdf(self, pdf_path: Union[str, Path]) -> Dict:
         """
@@ -25,22 +333,16 @@ class PDFService:
             if not pdf_path.exists():
                 raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-            with open(pdf_path, 'rb') as file:
-                # Create PDF reader object
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Extract metadata
-                metadata = pdf_reader.metadata
-                
-                # Extract text from all pages
-                text_content = []
-                for page in pdf_reader.pages:
-                    text_content.append(page.extract_text())
-                
+            # Parsed once and shared with the other calls on this file
+            with self.borrow_document(pdf_path) as document:
+                # Extract text from all pages (or reuse it from the handle / extracted-text cache)
+                text_content = list(self._document_texts(document, list(range(document.num_pages))))
+                self._store_document_texts(document)
+
                 return {
-                    'metadata': metadata,
+                    'metadata': document.metadata,
                     'text_content': text_content,
-                    'num_pages': len(pdf_reader.pages),
+                    'num_pages': document.num_pages,
                     'file_name': pdf_path.name
                 }
                 
@@ -48,6 +350,35 @@ class PDFService:
             self.logger.error(f"Error reading PDF {pdf_path}: {str(e)}")
             raise
 
+    def iter_pages(self, pdf_path: Union[str, Path]) -> Iterator[Tuple[int, str]]:
+        """
+        Yield the text of a PDF one page at a time, without collecting the whole document.
+        
+        Args:
+            pdf_path (Union[str, Path]): Path to the PDF file
+            
+        Yields:
+            Tuple[int, str]: (1-based page number, page text)
+        """
+        pdf_path = Path(pdf_path)
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+        try:
+            with self.borrow_document(pdf_path) as document:
+                key = document.text_cache_key
+                page_numbers = list(range(document.num_pages))
+                # Pages are cached as they stream by; the entry is only committed if every page was read
+                write_cache = key is not None and self._cached_page_count(key) != document.num_pages
+                with (self.text_cache.writer(key, document.num_pages) if write_cache else nullcontext()) as cache_writer:
+                    for page_num, text in zip(page_numbers, self._document_texts(document, page_numbers, retain=False)):
+                        if cache_writer:
+                            cache_writer.add(text)
+                        yield page_num + 1, text or ""
+        except Exception as e:
+            self.logger.error(f"Error streaming pages of PDF {pdf_path}: {str(e)}")
+            raise
+
     def read_pdf_from_bytes(self, pdf_bytes: bytes) -> Dict:
         """
         Read a PDF from bytes (useful for PDFs received via API or network).
@@ -65,10 +396,8 @@ class PDFService:
             # Extract metadata
             metadata = pdf_reader.metadata
             
-            # Extract text from all pages
-            text_content = []
-            for page in pdf_reader.pages:
-                text_content.append(page.extract_text())
+            # Extract text from all pages (or read it from the extracted-text cache)
+            text_content = self._all_page_texts(pdf_bytes, pdf_reader, self._cache_key(pdf_bytes))
             
             return {
                 'metadata': metadata,
@@ -92,33 +421,26 @@ class PDFService:
             Dict[int, str]: Dictionary mapping page numbers to their text content
         """
         try:
-            pdf_path = Path(pdf_path)
-            if not pdf_path.exists():
-                raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+            with self.borrow_document(pdf_path) as document:
+                page_numbers = self._validate_page_numbers(page_numbers, document.num_pages)
 
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                
-                # Validate page numbers
-                if page_numbers is not None:
-                    if not all(0 <= page < total_pages for page in page_numbers):
-                        raise ValueError(f"Page numbers must be between 0 and {total_pages - 1}")
-                else:
-                    page_numbers = range(total_pages)
-                
-                # Extract text from specified pages
-                page_texts = {}
-                for page_num in page_numbers:
-                    page = pdf_reader.pages[page_num]
-                    page_texts[page_num] = page.extract_text()
-                
+                # Extract text from specified pages (pages seen before come from the handle / extracted-text cache)
+                page_texts = dict(zip(page_numbers, self._document_texts(document, page_numbers)))
+                self._store_document_texts(document)
                 return page_texts
                 
         except Exception as e:
             self.logger.error(f"Error extracting text from PDF {pdf_path}: {str(e)}")
             raise
 
+    @staticmethod
+    def _validate_page_numbers(page_numbers: Optional[List[int]], total_pages: int) -> List[int]:
+        if page_numbers is None:
+            return list(range(total_pages))
+        if not all(0 <= page < total_pages for page in page_numbers):
+            raise ValueError(f"Page numbers must be between 0 and {total_pages - 1}")
+        return list(page_numbers)
+
     def get_pdf_metadata(self, pdf_path: Union[str, Path]) -> Dict:
         """
         Extract metadata from a PDF file.
@@ -134,20 +456,19 @@ class PDFService:
             if not pdf_path.exists():
                 raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                metadata = pdf_reader.metadata
-                
-                # Convert metadata to a more accessible format
-                return {
-                    'title': metadata.get('/Title', ''),
-                    'author': metadata.get('/Author', ''),
-                    'subject': metadata.get('/Subject', ''),
-                    'creator': metadata.get('/Creator', ''),
-                    'producer': metadata.get('/Producer', ''),
-                    'creation_date': metadata.get('/CreationDate', ''),
-                    'modification_date': metadata.get('/ModDate', '')
-                }
+            with self.borrow_document(pdf_path) as document:
+                metadata = document.metadata or {}
+            
+            # Convert metadata to a more accessible format
+            return {
+                'title': metadata.get('/Title', ''),
+                'author': metadata.get('/Author', ''),
+                'subject': metadata.get('/Subject', ''),
+                'creator': metadata.get('/Creator', ''),
+                'producer': metadata.get('/Producer', ''),
+                'creation_date': metadata.get('/CreationDate', ''),
+                'modification_date': metadata.get('/ModDate', '')
+            }
                 
         except Exception as e:
             self.logger.error(f"Error extracting metadata from PDF {pdf_path}: {str(e)}")
@@ -168,14 +489,12 @@ class PDFService:
             if not pdf_path.exists():
                 raise FileNotFoundError(f"PDF file not found: {pdf_path}")
 
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
+            with self.borrow_document(pdf_path) as document:
                 return {
                     'file_name': pdf_path.name,
-                    'file_size': pdf_path.stat().st_size,
-                    'num_pages': len(pdf_reader.pages),
-                    'is_encrypted': pdf_reader.is_encrypted,
+                    'file_size': document.file_size,
+                    'num_pages': document.num_pages,
+                    'is_encrypted': document.is_encrypted,
                     'file_path': str(pdf_path.absolute())
                 }
                 
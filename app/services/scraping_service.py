@@ -1,28 +1,141 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import asyncio
 import random
-from typing import Optional, Dict, Any
-from urllib.parse import urlparse
+import re
+import threading
+from bs4 import BeautifulSoup
+from lxml import etree
+import lxml.html
+from typing import Optional, Dict, Any, AsyncIterator, Callable, Iterable, List
+from urllib.parse import urljoin, urlparse
 import logging
 
+from app.config import (
+    SCRAPER_MAX_CONCURRENCY,
+    SCRAPER_PER_HOST_CONCURRENCY,
+    SCRAPER_PER_HOST_INTERVAL,
+    SCRAPER_LEAN_PARSING,
+    SCRAPER_RESPECT_ROBOTS,
+)
+from app.services.crawler import USER_AGENTS, AsyncCrawler, FetchResult
+from app.services.http_cache import CachedPage, HttpCache, body_hash, get_http_cache
+
+# The main content block of the pages we scrape (Drupal body field), as the lxml equivalent of ".field--name-body"
+MAIN_CONTENT_XPATH = '//*[contains(concat(" ", normalize-space(@class), " "), " field--name-body ")]'
+# Elements whose text BeautifulSoup's get_text() leaves out
+NON_TEXT_ELEMENTS = ("script", "style", "template")
+# Elements that start a new paragraph in extract_main_text()
+BLOCK_ELEMENTS = (
+    "p", "div", "section", "article", "aside", "header", "footer", "blockquote", "pre", "address",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd", "table", "tr", "figure", "figcaption",
+)
+
+
+def _parse_document(html: str):
+    """lxml tree of an HTML page, or None if there is nothing to parse."""
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def extract_page_fields(html: str) -> Dict[str, Any]:
+    """
+    Title, meta description, .field--name-body text and link hrefs of a page, read with lxml.
+
+    Returns the same values as the BeautifulSoup-based full parse, at a fraction of its CPU and
+    memory cost: lxml builds the tree in C, and only the elements above are ever turned into
+    Python objects.
+    """
+    fields = {'title': None, 'description': None, 'main_content': None, 'links': []}
+    document = _parse_document(html)
+    if document is None:
+        return fields
+
+    title = document.find(".//title")
+    if title is not None:
+        fields['title'] = title.text
+    description = document.find(".//meta[@name='description']")
+    if description is not None:
+        fields['description'] = description.get("content")
+    main_content = document.xpath(MAIN_CONTENT_XPATH)
+    if main_content:
+        element = main_content[0]
+        etree.strip_elements(element, etree.Comment, *NON_TEXT_ELEMENTS, with_tail=False)
+        fields['main_content'] = "".join(text.strip() for text in element.itertext())
+    fields['links'] = [str(href) for href in document.xpath("//a/@href")]
+    return fields
+
+
+def extract_main_text(html: str) -> Optional[str]:
+    """
+    Text of a page's .field--name-body block for ingestion: one paragraph per block element,
+    separated by blank lines, whitespace inside paragraphs collapsed. None if the block is missing.
+
+    Unlike 'main_content' (BeautifulSoup's get_text(strip=True), which runs paragraphs and
+    inline elements together), this keeps the structure the chunker splits on.
+    """
+    document = _parse_document(html)
+    main_content = document.xpath(MAIN_CONTENT_XPATH) if document is not None else []
+    if not main_content:
+        return None
+    element = main_content[0]
+    etree.strip_elements(element, etree.Comment, *NON_TEXT_ELEMENTS, with_tail=False)
+    for block in element.iter(*BLOCK_ELEMENTS):
+        block.text = "\n\n" + (block.text or "")
+        block.tail = "\n\n" + (block.tail or "")
+    for line_break in element.iter("br"):
+        line_break.tail = "\n" + (line_break.tail or "")
+    paragraphs = (" ".join(paragraph.split()) for paragraph in re.split(r"\n\s*\n", "".join(element.itertext())))
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
 class ScrapingService:
-    def __init__(self, timeout: int = 10, max_retries: int = 3):
+    def __init__(
+        self,
+        timeout: int = 10,
+        max_retries: int = 3,
+        max_concurrency: int = SCRAPER_MAX_CONCURRENCY,
+        per_host_concurrency: int = SCRAPER_PER_HOST_CONCURRENCY,
+        per_host_interval: float = SCRAPER_PER_HOST_INTERVAL,
+        respect_robots: bool = SCRAPER_RESPECT_ROBOTS,
+        http_cache: Optional[HttpCache] = None,
+        use_http_cache: bool = True,
+        lean: bool = SCRAPER_LEAN_PARSING,
+    ):
         """
         Initialize the scraping service with configurable timeout and retry settings.
-        
+
         Args:
             timeout (int): Request timeout in seconds
             max_retries (int): Maximum number of retry attempts
+            max_concurrency (int): Requests in flight across all hosts (async crawling)
+            per_host_concurrency (int): Requests in flight per host
+            per_host_interval (float): Minimum seconds between request starts to one host
+            respect_robots (bool): Honour robots.txt rules and Crawl-delay
+            http_cache (Optional[HttpCache]): Conditional-request cache (default: the shared one)
+            use_http_cache (bool): Set to False to always download and parse pages in full
+            lean (bool): Default parsing mode; lean results have no raw HTML or soup (see scrape_page)
         """
         self.timeout = timeout
         self.max_retries = max_retries
-        self.user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
-        ]
-        
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.respect_robots = respect_robots
+        self.user_agents = USER_AGENTS
+        self.http_cache = (http_cache or get_http_cache()) if use_http_cache else None
+        self.lean = lean
+
+        # One crawler (and keep-alive connection pool) per event loop
+        self._crawlers: Dict[asyncio.AbstractEventLoop, AsyncCrawler] = {}
+        # Event loop thread that runs the synchronous wrappers, so their connections are reused
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_thread: Optional[threading.Thread] = None
+        self._sync_lock = threading.Lock()
+
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -39,111 +152,244 @@ class ScrapingService:
         except Exception:
             return False
 
-    def scrape_page(self, url: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # --- Async engine ---
+
+    def _get_crawler(self) -> AsyncCrawler:
+        """The crawler for the running event loop (a new one if the loop has changed)."""
+        loop = asyncio.get_running_loop()
+        crawler = self._crawlers.get(loop)
+        if crawler is None:
+            # Crawlers of loops that have since been closed can no longer be used
+            for old_loop in [old_loop for old_loop in self._crawlers if old_loop.is_closed()]:
+                del self._crawlers[old_loop]
+            crawler = AsyncCrawler(
+                max_concurrency=self.max_concurrency,
+                per_host_concurrency=self.per_host_concurrency,
+                per_host_interval=self.per_host_interval,
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+                respect_robots=self.respect_robots,
+            )
+            self._crawlers[loop] = crawler
+        return crawler
+
+    def _parse(self, fetched: FetchResult, lean: bool = False, include_html: bool = False) -> Dict[str, Any]:
+        """Builds the scrape_page() result dict from a freshly downloaded page."""
+        if lean:
+            result = {
+                'url': fetched.url,
+                'status_code': fetched.status_code,
+                'content': fetched.text if include_html else None,
+                'parsed_html': None,
+                'headers': fetched.headers,
+                'changed': fetched.status_code != 304,
+                'from_cache': False,
+            }
+            result.update(extract_page_fields(fetched.text))
+            return result
+
+        # Parse the HTML content
+        soup = BeautifulSoup(fetched.text, 'html.parser')
+
+        # Extract basic metadata
+        title = soup.title.string if soup.title else None
+        meta_description = soup.find('meta', attrs={'name': 'description'})
+        description = meta_description['content'] if meta_description else None
+        main_content = soup.select_one(".field--name-body")
+        main_content_text = main_content.get_text(strip=True) if main_content else None
+
+        return {
+            'url': fetched.url,
+            'status_code': fetched.status_code,
+            'title': str(title) if title is not None else None,
+            'description': description,
+            'content': fetched.text,
+            'parsed_html': soup,
+            'headers': fetched.headers,
+            'main_content': main_content_text,
+            'links': [link['href'] for link in soup.find_all('a', href=True)],
+            'changed': fetched.status_code != 304,
+            'from_cache': False,
+        }
+
+    # Result fields kept in the HTTP cache (everything except the body, soup and headers)
+    CACHED_FIELDS = ('title', 'description', 'main_content', 'links')
+
+    def _cached_result(self, entry: CachedPage, fetched: FetchResult, lean: bool, include_html: bool) -> Dict[str, Any]:
+        """
+        scrape_page() result for a page that has not changed: the stored fields, not re-extracted.
+        In full mode the cached body is still parsed into 'parsed_html', as for a fresh page.
+        """
+        content = self.http_cache.get_body(entry.url) if include_html or not lean else None
+        result = {
+            'url': fetched.url,
+            'status_code': entry.status_code,
+            'content': content,
+            'parsed_html': None if lean else BeautifulSoup(content or '', 'html.parser'),
+            'headers': {**entry.headers, **fetched.headers},
+            'changed': False,
+            'from_cache': True,
+        }
+        result.update(entry.parsed)
+        return result
+
+    def _handle_response(
+        self, fetched: FetchResult, entry: Optional[CachedPage], lean: bool = False, include_html: bool = False
+    ) -> Dict[str, Any]:
+        """Turns a response into a result, answering from the cache when the page is unchanged."""
+        if entry is not None and (fetched.status_code == 304 or body_hash(fetched.text) == entry.body_hash):
+            self.http_cache.mark_unchanged(entry.url, fetched.headers)
+            return self._cached_result(entry, fetched, lean, include_html)
+        result = self._parse(fetched, lean, include_html)
+        if self.http_cache is not None and fetched.status_code == 200:
+            self.http_cache.put(fetched.url, fetched.status_code, fetched.headers, fetched.text,
+                                {name: result[name] for name in self.CACHED_FIELDS})
+        return result
+
+    def _cache_entry(self, url: str) -> Optional[CachedPage]:
+        return self.http_cache.get(url) if self.http_cache is not None else None
+
+    async def scrape_page_async(
+        self, url: str, headers: Optional[Dict[str, str]] = None, lean: Optional[bool] = None, include_html: bool = False
+    ) -> Dict[str, Any]:
+        """Async version of scrape_page(); many calls may run concurrently."""
+        if not self._is_valid_url(url):
+            raise ValueError("Invalid URL provided")
+        entry = self._cache_entry(url)
+        request_headers = entry.conditional_headers() if entry is not None else {}
+        request_headers.update(headers or {})
+        fetched = await self._get_crawler().fetch(url, request_headers)
+        return self._handle_response(fetched, entry, self.lean if lean is None else lean, include_html)
+
+    async def crawl(
+        self,
+        seeds: Iterable[str],
+        max_depth: int = 0,
+        max_pages: Optional[int] = None,
+        link_filter: Optional[Callable[[str], bool]] = None,
+        lean: Optional[bool] = None,
+        include_html: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Scrapes `seeds` concurrently (and, with max_depth > 0, the same-site pages they link to),
+        yielding one scrape_page()-style dict per URL as it completes. Failed URLs yield
+        {'url', 'status_code', 'error'} instead, so one bad page does not stop the crawl.
+        Pages whose 'changed' flag is False were answered from the HTTP cache.
+        `lean` and `include_html` are as in scrape_page().
+        """
+        lean = self.lean if lean is None else lean
+        entries: Dict[str, Optional[CachedPage]] = {}
+        parsed: Dict[str, Dict[str, Any]] = {}
+
+        def validators(url: str) -> Dict[str, str]:
+            entries[url] = self._cache_entry(url)
+            return entries[url].conditional_headers() if entries[url] is not None else {}
+
+        def links_of(fetched: FetchResult) -> List[str]:
+            parsed[fetched.url] = self._handle_response(fetched, entries.pop(fetched.url, None), lean, include_html)
+            return parsed[fetched.url]['links']
+
+        valid_seeds = []
+        for url in seeds:
+            if self._is_valid_url(url):
+                valid_seeds.append(url)
+            else:
+                self.logger.warning(f"Skipping invalid URL: {url}")
+        crawl = self._get_crawler().crawl(
+            valid_seeds, links_of, max_depth=max_depth, max_pages=max_pages, link_filter=link_filter, request_headers=validators
+        )
+        async for item in crawl:
+            if item.error is not None:
+                entries.pop(item.url, None)
+                self.logger.warning(str(item.error))
+                yield {'url': item.url, 'status_code': item.error.status_code, 'error': str(item.error)}
+                continue
+            yield parsed.pop(item.url, None) or self._handle_response(item.result, entries.pop(item.url, None), lean, include_html)
+
+    async def aclose(self):
+        """Closes the connection pool of the running event loop's crawler."""
+        crawler = self._crawlers.pop(asyncio.get_running_loop(), None)
+        if crawler is not None:
+            await crawler.close()
+
+    # --- Synchronous wrappers ---
+
+    def _run_sync(self, coro):
+        with self._sync_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                self._sync_thread = threading.Thread(target=self._sync_loop.run_forever, name="scraping-service", daemon=True)
+                self._sync_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._sync_loop).result()
+
+    def close(self):
+        """Closes the connection pool used by the synchronous methods."""
+        with self._sync_lock:
+            if self._sync_loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self.aclose(), self._sync_loop).result()
+            self._sync_loop.call_soon_threadsafe(self._sync_loop.stop)
+            self._sync_thread.join()
+            self._sync_loop.close()
+            self._sync_loop, self._sync_thread = None, None
+
+    def scrape_page(
+        self, url: str, headers: Optional[Dict[str, str]] = None, lean: Optional[bool] = None, include_html: bool = False
+    ) -> Dict[str, Any]:
         """
         Scrape a web page and return its content and metadata.
-        
+
         Args:
             url (str): The URL to scrape
             headers (Optional[Dict[str, str]]): Additional headers to include in the request
-            
+            lean (Optional[bool]): Extract only title, description, main content and links with lxml;
+                'content' and 'parsed_html' are then None (default: the service's mode)
+            include_html (bool): In lean mode, keep the raw HTML in 'content' anyway
+
         Returns:
             Dict[str, Any]: Dictionary containing the scraped data and metadata
         """
-        if not self._is_valid_url(url):
-            raise ValueError("Invalid URL provided")
-
-        # Prepare headers
-        default_headers = {
-            'User-Agent': self._get_random_user_agent(),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-        }
-        
-        if headers:
-            default_headers.update(headers)
-
-        # Implement retry logic
-        for attempt in range(self.max_retries):
-            try:
-                response = requests.get(
-                    url,
-                    headers=default_headers,
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-                
-                # Parse the HTML content
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Extract basic metadata
-                title = soup.title.string if soup.title else None
-                meta_description = soup.find('meta', attrs={'name': 'description'})
-                description = meta_description['content'] if meta_description else None
-                main_content = soup.select_one(".field--name-body")
-                main_content_text = main_content.get_text(strip=True) if main_content else None
-                # Add a small delay to be respectful to the server
-                time.sleep(random.uniform(1, 3))
-                
-                return {
-                    'url': url,
-                    'status_code': response.status_code,
-                    'title': title,
-                    'description': description,
-                    'content': response.text,
-                    'parsed_html': soup,
-                    'headers': dict(response.headers),
-                    'main_content': main_content_text
-                }
-                
-            except requests.RequestException as e:
-                self.logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt == self.max_retries - 1:
-                    raise Exception(f"Failed to scrape {url} after {self.max_retries} attempts: {str(e)}")
-                time.sleep(2 ** attempt)  # Exponential backoff
+        return self._run_sync(self.scrape_page_async(url, headers, lean, include_html))
 
     def extract_links(self, url: str) -> list:
         """
         Extract all links from a webpage.
-        
+
         Args:
             url (str): The URL to scrape for links
-            
+
         Returns:
             list: List of extracted links
         """
-        result = self.scrape_page(url)
-        soup = result['parsed_html']
-        
+        result = self.scrape_page(url, lean=True)
+
         links = []
-        for link in soup.find_all('a', href=True):
-            href = link['href']
+        for href in result['links']:
             # Convert relative URLs to absolute URLs
             if not href.startswith(('http://', 'https://')):
-                href = requests.compat.urljoin(url, href)
+                href = urljoin(url, href)
             links.append(href)
-            
+
         return links
 
     def extract_text(self, url: str, selector: Optional[str] = None) -> str:
         """
         Extract text content from a webpage, optionally filtered by a CSS selector.
-        
+
         Args:
             url (str): The URL to scrape
             selector (Optional[str]): CSS selector to filter content
-            
+
         Returns:
             str: Extracted text content
         """
-        result = self.scrape_page(url)
+        result = self.scrape_page(url, lean=False)
         soup = result['parsed_html']
-        
+
         if selector:
             elements = soup.select(selector)
             text = ' '.join([elem.get_text(strip=True) for elem in elements])
         else:
             text = soup.get_text(strip=True)
-            
+
         return text
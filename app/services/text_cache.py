@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import PyPDF2
+
+from app.config import PDF_TEXT_CACHE_ENABLED, PROCESSED_TEXTS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Bump the suffix whenever PDFService changes how page text is produced, so old entries are ignored
+EXTRACTOR_VERSION = f"pypdf2-{PyPDF2.__version__}-1"
+
+# File layout (all integers little-endian):
+#   magic "PTXC" | uint32 format version | uint32 page count
+#   uint64 offsets[page count + 1]       (byte offsets of each page's blob from the file start)
+#   page blobs                           (zlib-compressed UTF-8, one per page)
+_MAGIC = b"PTXC"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+
+
+def file_content_hash(data_or_path: Union[str, Path, bytes], block_size: int = 1 << 20) -> str:
+    """sha256 of a file's content (or of raw bytes), read in blocks."""
+    digest = hashlib.sha256()
+    if isinstance(data_or_path, bytes):
+        digest.update(data_or_path)
+    else:
+        with open(data_or_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractedTextCache:
+    """
+    Per-page extracted PDF text, stored under PROCESSED_TEXTS_DIR.
+
+    Entries are keyed by the PDF's content hash and EXTRACTOR_VERSION, so a changed file or
+    a new extractor simply misses. Each entry is one file with a page-offset index followed by
+    individually compressed pages; reading one page seeks straight to its blob.
+    """
+
+    def __init__(self, directory: str = PROCESSED_TEXTS_DIR, extractor_version: str = EXTRACTOR_VERSION):
+        self.directory = directory
+        self.extractor_version = extractor_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (path, size, mtime_ns) -> content hash, so unchanged files are not re-hashed
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Keys ---
+
+    def key_for_file(self, pdf_path: Union[str, Path]) -> str:
+        stat = os.stat(pdf_path)
+        memo_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            content_hash = self._hash_memo.get(memo_key)
+        if content_hash is None:
+            content_hash = file_content_hash(pdf_path)
+            with self._lock:
+                self._hash_memo[memo_key] = content_hash
+        return self._key(content_hash)
+
+    def key_for_bytes(self, pdf_bytes: bytes) -> str:
+        return self._key(file_content_hash(pdf_bytes))
+
+    def _key(self, content_hash: str) -> str:
+        return f"{content_hash[:32]}-{self.extractor_version}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pages")
+
+    # --- Reading ---
+
+    def _read_index(self, f) -> List[int]:
+        magic, version, page_count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError("not a page-text cache file")
+        return list(struct.unpack(f"<{page_count + 1}Q", f.read(8 * (page_count + 1))))
+
+    def page_count(self, key: str) -> Optional[int]:
+        """Number of cached pages, or None if the entry does not exist (counts a hit or a miss)."""
+        try:
+            with open(self._path(key), "rb") as f:
+                count = len(self._read_index(f)) - 1
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable text cache entry {self._path(key)}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return count
+
+    def read_pages(self, key: str, page_numbers: Iterable[int]) -> Iterator[str]:
+        """Yields the text of the given (0-based) pages, reading only their blobs."""
+        with open(self._path(key), "rb") as f:
+            offsets = self._read_index(f)
+            for page_num in page_numbers:
+                f.seek(offsets[page_num])
+                yield zlib.decompress(f.read(offsets[page_num + 1] - offsets[page_num])).decode("utf-8")
+
+    def read_page(self, key: str, page_num: int) -> str:
+        return next(self.read_pages(key, [page_num]))
+
+    # --- Writing ---
+
+    def writer(self, key: str, page_count: int) -> "PageTextWriter":
+        return PageTextWriter(self._path(key), page_count)
+
+    def write(self, key: str, texts: List[str]):
+        with self.writer(key, len(texts)) as writer:
+            for text in texts:
+                writer.add(text)
+
+
+class PageTextWriter:
+    """
+    Writes one cache entry page by page (so streaming extraction can fill the cache as it goes).
+    The entry only becomes visible, via an atomic rename, once every page has been added.
+    """
+
+    def __init__(self, path: str, page_count: int):
+        self.path = path
+        self.page_count = page_count
+        self._tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._offsets: List[int] = []
+        self._file = open(self._tmp_path, "wb")
+        # Reserve the header and index; they are filled in on commit
+        self._file.write(b"\0" * (_HEADER.size + 8 * (page_count + 1)))
+
+    def add(self, text: Optional[str]):
+        self._offsets.append(self._file.tell())
+        self._file.write(zlib.compress((text or "").encode("utf-8"), 6))
+
+    def commit(self):
+        if len(self._offsets) != self.page_count:
+            raise ValueError(f"Expected {self.page_count} pages, got {len(self._offsets)}")
+        self._offsets.append(self._file.tell())
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, self.page_count))
+        self._file.write(struct.pack(f"<{self.page_count + 1}Q", *self._offsets))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "PageTextWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and len(self._offsets) == self.page_count:
+            self.commit()
+        else:
+            self.abort()
+
+
+_text_cache: Optional[ExtractedTextCache] = None
+
+
+def get_text_cache() -> Optional[ExtractedTextCache]:
+    """Process-wide extracted-text cache, or None when PDF_TEXT_CACHE_ENABLED is off or the directory is unusable."""
+    global _text_cache
+    if not PDF_TEXT_CACHE_ENABLED:
+        return None
+    if _text_cache is None:
+        try:
+            _text_cache = ExtractedTextCache()
+        except OSError as e:
+            logger.warning(f"Extracted-text cache disabled: {e}")
+            return None
+    return _text_cache
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import re
+import time
+from typing import List, Optional, Union
+
+from telegram import Message
+from telegram.constants import ChatAction, MessageLimit
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from app.config import TELEGRAM_EDIT_INTERVAL, STREAM_FIRST_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = MessageLimit.MAX_TEXT_LENGTH # 4096 characters
+TYPING_REFRESH_SECONDS = 4.0 # Telegram shows a chat action for about 5 seconds
+NETWORK_RETRIES = 2          # Further attempts at a send or edit that failed with a network error or timeout
+NETWORK_RETRY_SECONDS = 1.0  # Wait before the first of them; doubled for each one after
+FLUSH_RETRIES = 3            # Failed flushes in a row retried (one edit interval apart) before the rest of the text is given up
+FIRST_SENTENCE = re.compile(r"[.!?:](\s|$)|\n")
+# Where an overlong message is preferably cut, best first
+SPLIT_POINTS = (re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"[.!?]\s"), re.compile(r"\s"))
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+def split_point(text: str, limit: int = MAX_MESSAGE_LENGTH) -> int:
+    """Where to end a message that has to hold the start of `text`: a paragraph, line, sentence or word break."""
+    if len(text) <= limit:
+        return len(text)
+    window = text[:limit]
+    for pattern in SPLIT_POINTS:
+        ends = [match.end() for match in pattern.finditer(window)]
+        # Only break early if that still fills at least half a message
+        if ends and ends[-1] >= limit // 2:
+            return ends[-1]
+    return limit
+
+
+class StreamingReply:
+    """
+    Shows an answer in a Telegram chat while it is being generated.
+
+    A "typing" action is shown from start_typing() (e.g. during retrieval) until the first
+    message goes out. The first message is sent as soon as the first sentence is complete (or
+    after STREAM_FIRST_FLUSH_SECONDS with any text), then edited as more text arrives. Edits
+    run on a background task and are coalesced to at most one per TELEGRAM_EDIT_INTERVAL
+    seconds, so feed() never waits on Telegram and the chat stays within its rate limits. Text
+    past 4096 characters continues in follow-up messages.
+    """
+
+    def __init__(
+        self,
+        bot,
+        chat_id: int,
+        edit_interval: float = TELEGRAM_EDIT_INTERVAL,
+        first_flush_seconds: float = STREAM_FIRST_FLUSH_SECONDS,
+        max_length: int = MAX_MESSAGE_LENGTH,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.first_flush_seconds = first_flush_seconds
+        self.max_length = max_length
+
+        self.text = ""
+        self.messages: List[Message] = []
+        self.started_at = time.monotonic()
+        self.first_text_at: Optional[float] = None    # First generated text
+        self.first_message_at: Optional[float] = None # First message visible to the user
+        self.edits = 0
+
+        self._offset = 0        # Start of the current (last) message within self.text
+        self._closed = 0        # Messages that are full and no longer edited
+        self._shown = ""        # What the current message displays
+        self._last_flush = 0.0
+        self._failed_flushes = 0 # Flushes in a row whose send or edit failed
+        self._changed = asyncio.Event()
+        self._finished = False
+        self._flusher: Optional[asyncio.Task] = None
+        self._typing: Optional[asyncio.Task] = None
+
+    # --- Typing indicator ---
+
+    async def _keep_typing(self):
+        while not self.messages:
+            try:
+                await self.bot.send_chat_action(chat_id=self.chat_id, action=ChatAction.TYPING)
+            except NetworkError as e:
+                logger.debug(f"Could not send typing action: {e}")
+            await asyncio.sleep(TYPING_REFRESH_SECONDS)
+
+    def start_typing(self):
+        if self._typing is None:
+            self._typing = asyncio.create_task(self._keep_typing())
+
+    def _stop_typing(self):
+        if self._typing is not None:
+            self._typing.cancel()
+            self._typing = None
+
+    # --- Feeding text ---
+
+    def feed(self, delta: str):
+        """Adds generated text; it is shown by the background flusher."""
+        if not delta:
+            return
+        if self.first_text_at is None:
+            self.first_text_at = time.monotonic()
+        self.text += delta
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        self._changed.set()
+
+    def _ready_for_first_message(self) -> bool:
+        if not self.text.strip():
+            return False
+        return (
+            self._finished
+            or FIRST_SENTENCE.search(self.text.lstrip()) is not None
+            or time.monotonic() - self.first_text_at >= self.first_flush_seconds
+        )
+
+    async def _flush_loop(self):
+        while True:
+            if not self.messages:
+                # Before the first message, wake up for the first-flush deadline too
+                deadline = self.first_text_at + self.first_flush_seconds - time.monotonic()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), max(deadline, 0.01))
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._changed.wait()
+                # Coalesce: let text accumulate until the edit interval has passed
+                wait = self._last_flush + self.edit_interval - time.monotonic()
+                if wait > 0 and not self._finished:
+                    await asyncio.sleep(wait)
+            self._changed.clear()
+            if (self.messages or self._ready_for_first_message()) and not await self._flush():
+                self._failed_flushes += 1
+                if self._failed_flushes > FLUSH_RETRIES:
+                    logger.warning(f"Could not show {len(self.text) - self._offset} characters of the answer; giving up.")
+                else:
+                    # Nothing was advanced past the failed text: show it again on the next flush
+                    await asyncio.sleep(self.edit_interval)
+                    self._changed.set()
+            if self._finished and not self._changed.is_set():
+                return
+
+    # --- Sending ---
+
+    async def _call(self, method, **kwargs) -> Union[Message, bool, None]:
+        """
+        A Bot API call, waiting out flood control; None if Telegram rejected it or could not be
+        reached. An edit rejected as "not modified" already shows its text and returns True.
+        """
+        failures = 0
+        while True:
+            try:
+                return await method(**kwargs)
+            except RetryAfter as e:
+                logger.warning(f"Telegram flood control; retrying in {_retry_seconds(e)}s.")
+                await asyncio.sleep(_retry_seconds(e))
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return True
+                logger.warning(f"Telegram rejected {getattr(method, '__name__', 'a call')}: {e}")
+                return None
+            except NetworkError as e: # Includes TimedOut
+                if failures >= NETWORK_RETRIES:
+                    logger.warning(f"Giving up on {getattr(method, '__name__', 'a call')} after {failures + 1} attempts: {e}")
+                    return None
+                wait = NETWORK_RETRY_SECONDS * 2 ** failures
+                failures += 1
+                logger.warning(f"Network error from Telegram ({e}); retrying in {wait:.0f}s.")
+                await asyncio.sleep(wait)
+
+    async def _show(self, text: str) -> bool:
+        """Makes the current message display `text` (sending it if there is no current message); False if that failed."""
+        if self.messages and len(self.messages) > self._closed:
+            if text != self._shown:
+                edited = await self._call(self.bot.edit_message_text, chat_id=self.chat_id, message_id=self.messages[-1].message_id, text=text)
+                if edited is None:
+                    return False
+                self.edits += 1
+        else:
+            message = await self._call(self.bot.send_message, chat_id=self.chat_id, text=text)
+            if message is None:
+                return False
+            self.messages.append(message)
+            if self.first_message_at is None:
+                self.first_message_at = time.monotonic()
+                self._stop_typing()
+        self._shown = text
+        return True
+
+    async def _flush(self) -> bool:
+        """Shows the text not yet shown; False if a send or edit failed (the text stays pending)."""
+        self._last_flush = time.monotonic()
+        pending = self.text[self._offset:]
+        # Fill and close messages while the text overflows the current one
+        while len(pending.rstrip()) > self.max_length:
+            end = split_point(pending, self.max_length)
+            if not await self._show(pending[:end].rstrip()):
+                return False
+            self._closed = len(self.messages)
+            skipped = len(pending[end:]) - len(pending[end:].lstrip())
+            self._offset += end + skipped
+            pending = self.text[self._offset:]
+            self._shown = ""
+        if pending.strip() and not await self._show(pending.strip()):
+            return False
+        self._failed_flushes = 0
+        return True
+
+    async def finish(self) -> List[Message]:
+        """Shows the complete text and returns the messages sent."""
+        self._finished = True
+        self._changed.set()
+        try:
+            if self._flusher is not None:
+                await self._flusher
+        finally:
+            self._stop_typing()
+        if self.first_message_at is not None:
+            logger.info(
+                f"Streamed answer: first message after {self.first_message_at - self.started_at:.2f}s, "
+                f"{len(self.text)} chars in {len(self.messages)} message(s) with {self.edits} edits, "
+                f"done after {time.monotonic() - self.started_at:.2f}s."
+            )
+        return self.messages
+
+    async def abort(self, notice: str):
+        """Ends an interrupted answer: what was shown stays, followed by `notice`."""
+        if self._flusher is not None and self._flusher.done():
+            # finish() already ran, or the flusher died: feed() starts a new one for the notice
+            if not self._flusher.cancelled() and self._flusher.exception() is not None:
+                logger.warning(f"Streaming reply flusher failed: {self._flusher.exception()}")
+            self._flusher = None
+        self.feed(f"\n\n{notice}" if self.text.strip() else notice)
+        await self.finish()
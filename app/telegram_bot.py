@@ -6,8 +6,15 @@ from telegram.ext import Application, CommandHandler, MessageHandler, filters, C
 from dotenv import load_dotenv
 
 # Added imports from project
-from app.vector_store import query_vector_store
-from app.config import OPENAI_API_KEY, GPT4_MODEL_NAME
+from app.vector_store import query_vector_store, hybrid_search, close_vector_store
+from app.config import OPENAI_API_KEY, GPT4_MODEL_NAME, OPENAI_CHAT_TIMEOUT, GPT4_MAX_RESPONSE_TOKENS, GPT4_CONTEXT_WINDOW_TOKENS, GPT4_STREAM_ANSWERS
+from app.config import RAG_TOP_K, RAG_MIN_SCORE, RAG_CONTEXT_TOKEN_BUDGET, RETRIEVAL_MODE
+from app.openai_client import get_openai_client, close_openai_client
+from app.tokenizer import get_token_counter
+from app.context_packer import NO_SCORE_CUTOFF, pack_context
+from app.reranker import get_reranker
+from app.update_scheduler import SchedulerUpdateProcessor
+from app.streaming_reply import StreamingReply
 
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -44,72 +51,70 @@ async def handle_message(update: Update, context):
     system_message_content = "You are an expert U.S. Immigration Law assistant. Answer the user's question comprehensively and clearly based on your general knowledge."
     rag_context_available = False
 
+    # Shows "typing" during retrieval, then the answer as it is generated
+    reply = StreamingReply(context.bot, chat_id)
+    reply.start_typing()
+
     try:
         # 1. Attempt to get RAG context
-        logger.info(f"Performing vector search for query: {user_query}")
-        search_results = await query_vector_store(user_query, top_k=10)
+        logger.info(f"Performing {RETRIEVAL_MODE} search for query: {user_query}")
+        if RETRIEVAL_MODE == "hybrid":
+            search_results = await hybrid_search(user_query, top_k=RAG_TOP_K)
+            # Fused scores are rank-based; score floors were applied to each leg before fusion
+            score_cutoff = NO_SCORE_CUTOFF
+        else:
+            search_results = await query_vector_store(user_query, top_k=RAG_TOP_K)
+            score_cutoff = {}
+
+        reranker = get_reranker()
+        if reranker is not None and search_results:
+            if RETRIEVAL_MODE != "hybrid":
+                # Re-ranker scores replace the similarities, so the similarity floor is applied first
+                search_results = [match for match in search_results if match.score >= RAG_MIN_SCORE]
+            search_results = reranker.rerank(user_query, search_results)
+            score_cutoff = NO_SCORE_CUTOFF
 
-        unique_results = []
         if search_results:
-            min_similarity_threshold = 0.60
-            filtered_by_score_results = [
-                match for match in search_results
-                if hasattr(match, 'score') and match.score >= min_similarity_threshold
-            ]
-
-            if filtered_by_score_results:
-                logger.info(f"Retrieved {len(filtered_by_score_results)} results after applying similarity threshold {min_similarity_threshold}.")
-                
-                seen_original_texts = set()
-                for match in filtered_by_score_results:
-                    if hasattr(match, 'metadata') and match.metadata:
-                        original_text = match.metadata.get("original_text")
-                        if original_text and original_text not in seen_original_texts:
-                            unique_results.append(match)
-                            seen_original_texts.add(original_text)
-                        elif not original_text:
-                            logger.warning(f"Match ID {match.id if hasattr(match, 'id') else 'N/A'} missing 'original_text' in metadata (after score filtering), keeping it.")
-                            unique_results.append(match) # Or decide to discard
-                    else:
-                        logger.warning(f"Match ID {match.id if hasattr(match, 'id') else 'N/A'} missing metadata (after score filtering), skipping.")
-            else:
-                logger.info(f"No results met the minimum similarity threshold of {min_similarity_threshold}.")
-        else:
-            logger.info("Vector search returned no initial results.")
-
-        if unique_results:
-            rag_context_available = True
-            logger.info(f"Retrieved {len(unique_results)} unique documents after de-duplication for RAG context.")
-            
-            context_prompt_parts = ["\n\n--- Relevant Information Extracted ---\n"]
-            for i, match in enumerate(unique_results):
-                metadata = match.metadata
-                original_text = metadata.get("original_text", "N/A")
-                doc_context = metadata.get("document_context", "N/A")
-                gpt35_summary = metadata.get("contextualized_summary", "N/A")
-
-                context_prompt_parts.append(f"\n--- Document {i+1} ---\n")
-                context_prompt_parts.append(f"Original Text Snippet: {original_text}\n")
-                context_prompt_parts.append(f"Overall Document Context: {doc_context}\n")
-                context_prompt_parts.append(f"Contextual Summary (AI-generated for this snippet): {gpt35_summary}\n")
-            
-            final_prompt_context += "".join(context_prompt_parts)
-            system_message_content = (
+            rag_system_message_content = (
                 "You are an expert U.S. Immigration Law assistant. "
                 "Based on the user's query and the provided relevant information snippets, "
                 "answer the user's question comprehensively and clearly. "
                 "If the information seems insufficient to fully answer, state that you can only provide partial information based on the snippets. "
                 "Do not make up information not present in the provided snippets."
             )
+
+            # Pack the best snippets, grouped by document, into what the prompt leaves of the model's context window
+            token_counter = get_token_counter(current_gpt4_model_name)
+            prompt_tokens = token_counter.count_messages([
+                {"role": "system", "content": rag_system_message_content},
+                {"role": "user", "content": final_prompt_context},
+            ])
+            context_budget = min(RAG_CONTEXT_TOKEN_BUDGET, GPT4_CONTEXT_WINDOW_TOKENS - GPT4_MAX_RESPONSE_TOKENS - prompt_tokens)
+            packed = pack_context(search_results, context_budget, token_counter, **score_cutoff)
+
+            if packed.snippets:
+                rag_context_available = True
+                system_message_content = rag_system_message_content
+                final_prompt_context += packed.text
+                logger.info(
+                    f"Packed {len(packed.snippets)} of {packed.candidates} snippets from {packed.documents} documents "
+                    f"({len(search_results)} retrieved) into {packed.tokens} tokens ({token_counter.name}) of a {context_budget}-token budget; "
+                    f"saved {packed.tokens_saved} of {packed.baseline_tokens} tokens."
+                )
+            else:
+                logger.info(f"None of {len(search_results)} results passed the score cutoff and fit the context budget (best score {max(match.score for match in search_results):.3f}).")
         else:
-            logger.info("No RAG context available (either no search results, threshold not met, or no unique results). Proceeding with query only.")
+            logger.info("Search returned no results (or none above the similarity floor).")
+
+        if not rag_context_available:
+            logger.info("No RAG context available (either no search results or none met the score cutoff). Proceeding with query only.")
 
         # 4. Call GPT-4 for response generation
         logger.info(f"Sending request to GPT-4 model: {current_gpt4_model_name}. RAG context available: {rag_context_available}")
         logger.debug(f"System Message: {system_message_content}")
         logger.debug(f"User Prompt Context (first 300 chars): {final_prompt_context[:300]}")
 
-        client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+        client = get_openai_client()
         
         gpt_response = await client.chat.completions.create(
             model=current_gpt4_model_name,
@@ -118,21 +123,29 @@ async def handle_message(update: Update, context):
                 {"role": "user", "content": final_prompt_context}
             ],
             temperature=0.3,
-            max_tokens=1500
+            max_tokens=GPT4_MAX_RESPONSE_TOKENS,
+            timeout=OPENAI_CHAT_TIMEOUT,
+            stream=GPT4_STREAM_ANSWERS
         )
-        
-        informed_response = gpt_response.choices[0].message.content.strip()
-        logger.info("Received response from GPT-4.")
 
-        # 5. Send informed message to user
-        await update.message.reply_text(informed_response)
+        # 5. Send informed message to user, sentence by sentence as it is generated
+        if GPT4_STREAM_ANSWERS:
+            async for chunk in gpt_response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    reply.feed(chunk.choices[0].delta.content)
+        else:
+            reply.feed(gpt_response.choices[0].message.content.strip())
+        if not reply.text.strip():
+            reply.feed("I couldn't generate an answer to that. Please try rephrasing your question.")
+        await reply.finish()
+        logger.info(f"Received response from GPT-4 ({len(reply.text)} chars).")
 
     except openai.APIError as e:
         logger.error(f"OpenAI API error during GPT-4 call: {e}", exc_info=True)
-        await update.message.reply_text("I'm having trouble generating a response right now. Please try again later.")
+        await reply.abort("I'm having trouble generating a response right now. Please try again later.")
     except Exception as e:
         logger.error(f"An unexpected error occurred in handle_message: {e}", exc_info=True)
-        await update.message.reply_text("An unexpected error occurred while processing your request. Please try again.")
+        await reply.abort("An unexpected error occurred while processing your request. Please try again.")
 
 async def handle_new_follower(update: Update, context):
     """Handles new members joining the chat."""
@@ -152,15 +165,35 @@ async def handle_new_follower(update: Update, context):
                 await context.bot.send_message(chat_id=update.effective_chat.id, text=disclaimer_text)
                 context.user_data[f"disclaimer_sent_{user_id}"] = True
 
-def main():
-    # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+async def shutdown_clients(application: Application):
+    """post_shutdown hook: releases the shared OpenAI connection pool and the vector store's resources."""
+    await close_openai_client()
+    close_vector_store()
+
+def build_application(token: str = TELEGRAM_TOKEN, polling: bool = True) -> Application:
+    """
+    Creates the bot Application with all handlers registered.
+    For the webhook server (app/main.py) pass polling=False: no Updater is created and updates
+    are fed in with process_update() by the server's UpdateScheduler. When polling, fetched
+    updates go through an UpdateScheduler too (concurrent across chats, in order per chat).
+    """
+    builder = Application.builder().token(token).post_shutdown(shutdown_clients)
+    if polling:
+        builder = builder.concurrent_updates(SchedulerUpdateProcessor())
+    else:
+        builder = builder.updater(None)
+    application = builder.build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     application.add_handler(ChatMemberHandler(handle_new_follower, ChatMemberHandler.MY_CHAT_MEMBER))
+    return application
+
+def main():
+    # Create the Application
+    application = build_application()
 
     # Start the bot
     print("Starting bot...")
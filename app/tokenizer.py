@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.config import EMBEDDING_MODEL_NAME, GPT4_MODEL_NAME, TOKENIZER_DATA_DIR, TOKENIZER_MEMO_SIZE
+
+try:
+    import tiktoken
+    from tiktoken.load import load_tiktoken_bpe
+except ImportError: # Optional: without it, token counts fall back to the 4-characters-per-token estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# BPE encodings we know how to build from a local ranks file (TOKENIZER_DATA_DIR/<name>.tiktoken).
+# Patterns and special tokens are those of tiktoken's openai_public definitions; the hashes are the
+# sha256 of the published ranks files, which scripts/fetch_tokenizer_data.py downloads.
+ENCODING_SPECS: Dict[str, dict] = {
+    "cl100k_base": {
+        "url": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+        "sha256": "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7",
+        "pat_str": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        "special_tokens": {
+            "<|endoftext|>": 100257,
+            "<|fim_prefix|>": 100258,
+            "<|fim_middle|>": 100259,
+            "<|fim_suffix|>": 100260,
+            "<|endofprompt|>": 100276,
+        },
+    },
+    "o200k_base": {
+        "url": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+        "sha256": "446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d",
+        "pat_str": "|".join([
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]),
+        "special_tokens": {"<|endoftext|>": 199999, "<|endofprompt|>": 200018},
+    },
+}
+# Used when a model's own encoding is unavailable offline: a real BPE count is still much closer
+# than the character estimate (o200k_base counts are within a few percent of cl100k_base).
+FALLBACK_ENCODING = "cl100k_base"
+
+# Chat completions add a few framing tokens per message and for the reply
+# (see OpenAI's "How to count tokens with tiktoken" cookbook).
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates token count based on 1 token ~ 4 characters (never less than 1 for non-empty text)."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def encoding_name_for_model(model: str) -> str:
+    if tiktoken is not None:
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            pass
+    return FALLBACK_ENCODING
+
+
+def _load_local_encoding(name: str, data_dir: str):
+    spec = ENCODING_SPECS.get(name)
+    path = os.path.join(data_dir, f"{name}.tiktoken")
+    if spec is None or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if digest != spec["sha256"]:
+        logger.warning(f"Ignoring {path}: sha256 {digest} does not match the published {name} ranks.")
+        return None
+    return tiktoken.Encoding(
+        name=name,
+        pat_str=spec["pat_str"],
+        mergeable_ranks=load_tiktoken_bpe(path),
+        special_tokens=spec["special_tokens"],
+    )
+
+
+def load_encoding(name: str, data_dir: str = TOKENIZER_DATA_DIR):
+    """
+    Returns a tiktoken Encoding for `name`, or None. The bundled ranks file is tried first, then
+    tiktoken's own cache (which may download the file when network access is available).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        encoding = _load_local_encoding(name, data_dir)
+        if encoding is not None:
+            return encoding
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load bundled tokenizer data for {name}: {e}")
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.debug(f"tiktoken could not provide {name}: {e}")
+        return None
+
+
+class TokenCounter:
+    """
+    Counts tokens for one BPE encoding, offline.
+
+    Counts are memoized per text (an LRU of TOKENIZER_MEMO_SIZE entries), so re-counting the same
+    paragraphs and sentences - overlapping chunking windows, repeated headers, re-ingestion of a
+    document, the same snippets in successive prompts - costs a dictionary lookup. If no encoding
+    can be loaded the counter falls back to the 4-characters-per-token estimate; `is_heuristic`
+    tells callers which one they got.
+    """
+
+    def __init__(self, encoding=None, memo_size: int = TOKENIZER_MEMO_SIZE):
+        self.encoding = encoding
+        self.memo_size = memo_size
+        self.hits = 0
+        self.misses = 0
+        self._memo: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.encoding.name if self.encoding is not None else "heuristic"
+
+    @property
+    def is_heuristic(self) -> bool:
+        return self.encoding is None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return estimate_tokens(text)
+        with self._lock:
+            tokens = self._memo.get(text)
+            if tokens is not None:
+                self._memo.move_to_end(text)
+                self.hits += 1
+                return tokens
+        # Special-token markers in document text are counted as ordinary text, never rejected
+        tokens = len(self.encoding.encode_ordinary(text))
+        with self._lock:
+            self.misses += 1
+            self._memo[text] = tokens
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return tokens
+
+    __call__ = count
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """`text` cut to at most `max_tokens` tokens (returned unchanged if it already fits)."""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode_ordinary(text)[:max_tokens])
+
+    def count_messages(self, messages: List[dict]) -> int:
+        """Prompt tokens of a chat completion request with these messages."""
+        return sum(TOKENS_PER_MESSAGE + self.count(message.get("content") or "") for message in messages) + TOKENS_PER_REPLY
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: Optional[str] = None) -> TokenCounter:
+    """
+    Process-wide TokenCounter for a model's encoding (default: EMBEDDING_MODEL_NAME).
+    Encodings are loaded once; models sharing an encoding share a counter and its memo.
+    """
+    name = encoding_name_for_model(model or EMBEDDING_MODEL_NAME)
+    with _counters_lock:
+        counter = _counters.get(name)
+        if counter is None:
+            encoding = load_encoding(name)
+            if encoding is not None:
+                counter = TokenCounter(encoding)
+            elif name != FALLBACK_ENCODING:
+                counter = _counters.get(FALLBACK_ENCODING)
+                if counter is None:
+                    counter = TokenCounter(load_encoding(FALLBACK_ENCODING))
+                    _counters[FALLBACK_ENCODING] = counter
+                if not counter.is_heuristic:
+                    logger.warning(f"Tokenizer data for {name} not found; counting {model or EMBEDDING_MODEL_NAME} tokens with {FALLBACK_ENCODING}.")
+            else:
+                counter = TokenCounter(None)
+            if counter.is_heuristic:
+                logger.warning(f"No tokenizer data available for {name}; token counts are estimated at 4 characters per token.")
+            _counters[name] = counter
+    return counter
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count of `text` for `model` (default: EMBEDDING_MODEL_NAME)."""
+    return get_token_counter(model).count(text)
+
+
+def count_chat_tokens(messages: List[dict], model: str = GPT4_MODEL_NAME) -> int:
+    return get_token_counter(model).count_messages(messages)
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from app.config import (
+    UPDATE_MAX_CONCURRENCY, UPDATE_QUEUE_SIZE, UPDATE_OVERFLOW_POLICY, UPDATE_MAX_AGE, UPDATE_DRAIN_TIMEOUT,
+    UPDATE_METRICS_LOG_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# What submit() does when UPDATE_QUEUE_SIZE updates are already waiting
+OVERFLOW_POLICIES = (
+    "wait",         # Wait for room (polling: the update stays with Telegram/PTB). Without waiting, same as "reject".
+    "reject",       # Refuse the new update (webhook: Telegram is asked to redeliver it later)
+    "drop_oldest",  # Accept the new update and drop the update that has waited longest
+)
+RECENT_UPDATE_IDS = 4096 # Update IDs remembered to drop redeliveries
+WAIT_SAMPLES = 1000      # Recent queue wait times kept for the percentiles in metrics()
+
+
+class _Job:
+    __slots__ = ("seq", "update", "lane", "coroutine", "duplicate_key", "enqueued_at", "done")
+
+    def __init__(self, seq: int, update: Any, lane: Hashable, coroutine: Optional[Awaitable], duplicate_key: Optional[tuple]):
+        self.seq = seq
+        self.update = update
+        self.lane = lane
+        self.coroutine = coroutine
+        self.duplicate_key = duplicate_key
+        self.enqueued_at = time.monotonic()
+        self.done: Optional[asyncio.Future] = None
+
+
+def chat_key(update: Any) -> Hashable:
+    """Updates with the same key are processed in order: per chat, else per user, else unordered."""
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return ("user", user.id)
+    return ("update", getattr(update, "update_id", id(update)))
+
+
+def _message_of(update: Any):
+    return getattr(update, "effective_message", None)
+
+
+class UpdateScheduler:
+    """
+    Runs Telegram updates concurrently across chats and in arrival order within a chat.
+
+    Each chat has its own FIFO lane; at most one update per chat is in progress, and at most
+    `max_concurrency` in total, so one user's slow answer holds up neither other users nor more
+    than its share of the workers. Chats take turns (a chat goes to the back of the line after
+    each update). At most `queue_size` updates wait; beyond that `overflow` decides (see
+    OVERFLOW_POLICIES). Redelivered update IDs, messages identical to one still waiting in the
+    same chat, and (with `max_age`) messages older than `max_age` seconds are dropped.
+
+    Updates are processed with `process(update)` (webhook mode: Application.process_update), or
+    by awaiting the coroutine passed to submit() (polling mode, see SchedulerUpdateProcessor).
+    """
+
+    def __init__(
+        self,
+        process: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        max_concurrency: int = UPDATE_MAX_CONCURRENCY,
+        queue_size: int = UPDATE_QUEUE_SIZE,
+        overflow: str = UPDATE_OVERFLOW_POLICY,
+        max_age: float = UPDATE_MAX_AGE,
+        metrics_log_interval: float = UPDATE_METRICS_LOG_INTERVAL,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}' (choose from {', '.join(OVERFLOW_POLICIES)})")
+        self.process = process
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+        self.max_age = max_age
+        self.metrics_log_interval = metrics_log_interval
+
+        self._lanes: Dict[Hashable, Deque[_Job]] = {}
+        self._scheduled: set = set()          # Lanes that are in _ready or being processed
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._waiting: "OrderedDict[int, _Job]" = OrderedDict() # Queued jobs, oldest first
+        self._waiting_messages: Dict[tuple, _Job] = {}
+        self._recent_ids: "OrderedDict[int, None]" = OrderedDict()
+        self._space = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self._seq = 0
+        self._running = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.counters = {"processed": 0, "failed": 0, "duplicates": 0, "stale": 0, "rejected": 0, "dropped": 0}
+        self.max_depth = 0
+
+    # --- Submitting ---
+
+    def _screen(self, update: Any) -> Optional[str]:
+        """Why the update should be dropped ("duplicates"/"stale"), or None to queue it."""
+        update_id = getattr(update, "update_id", None)
+        if update_id is not None and update_id in self._recent_ids:
+            return "duplicates"
+        message = _message_of(update)
+        if message is not None:
+            key = self._duplicate_key(update)
+            if key is not None and key in self._waiting_messages:
+                return "duplicates"
+            date = getattr(message, "date", None)
+            if self.max_age and date is not None and (datetime.now(timezone.utc) - date).total_seconds() > self.max_age:
+                return "stale"
+        return None
+
+    @staticmethod
+    def _duplicate_key(update: Any) -> Optional[tuple]:
+        message = _message_of(update)
+        text = getattr(message, "text", None) if message is not None else None
+        if not text:
+            return None
+        user = getattr(update, "effective_user", None)
+        return (chat_key(update), user.id if user is not None else None, text)
+
+    def _enqueue(self, update: Any, coroutine: Optional[Awaitable]) -> _Job:
+        self._seq += 1
+        job = _Job(self._seq, update, chat_key(update), coroutine, self._duplicate_key(update))
+        update_id = getattr(update, "update_id", None)
+        if update_id is not None:
+            self._recent_ids[update_id] = None
+            if len(self._recent_ids) > RECENT_UPDATE_IDS:
+                self._recent_ids.popitem(last=False)
+        self._waiting[job.seq] = job
+        if job.duplicate_key is not None:
+            self._waiting_messages[job.duplicate_key] = job
+        self._lanes.setdefault(job.lane, deque()).append(job)
+        if job.lane not in self._scheduled:
+            self._scheduled.add(job.lane)
+            self._ready.put_nowait(job.lane)
+        self._idle.clear()
+        self.max_depth = max(self.max_depth, len(self._waiting))
+        return job
+
+    def _unqueue(self, job: _Job):
+        self._waiting.pop(job.seq, None)
+        if job.duplicate_key is not None and self._waiting_messages.get(job.duplicate_key) is job:
+            del self._waiting_messages[job.duplicate_key]
+
+    def _drop(self, job: _Job, reason: str):
+        """Removes a job that will never run, releasing whoever waits for it."""
+        self._unqueue(job)
+        lane = self._lanes.get(job.lane)
+        if lane is not None and job in lane:
+            lane.remove(job)
+        self._finish(job, False)
+        self.counters[reason] += 1
+        logger.warning(f"Dropped queued update {getattr(job.update, 'update_id', '?')} ({reason}); {len(self._waiting)} waiting.")
+
+    @staticmethod
+    def _finish(job: _Job, processed: bool):
+        if job.coroutine is not None and not processed and hasattr(job.coroutine, "close"):
+            job.coroutine.close() # Never awaited; close it to avoid a "never awaited" warning
+        if job.done is not None and not job.done.done():
+            job.done.set_result(processed)
+
+    def _make_room(self) -> bool:
+        if len(self._waiting) < self.queue_size:
+            return True
+        if self.overflow == "drop_oldest":
+            self._drop(next(iter(self._waiting.values())), "dropped")
+            return True
+        return False
+
+    def submit_nowait(self, update: Any, coroutine: Optional[Awaitable] = None) -> bool:
+        """
+        Queues an update without waiting. Returns False only if it was refused because the queue
+        is full (policies "reject" and "wait"); duplicates and stale updates count as handled.
+        """
+        reason = self._screen(update)
+        if reason is not None:
+            self.counters[reason] += 1
+            if coroutine is not None and hasattr(coroutine, "close"):
+                coroutine.close()
+            return True
+        if not self._make_room():
+            self.counters["rejected"] += 1
+            return False
+        self._enqueue(update, coroutine)
+        return True
+
+    async def submit(self, update: Any, coroutine: Optional[Awaitable] = None) -> bool:
+        """
+        Queues an update (waiting for room under the "wait" policy) and returns once it has been
+        processed: True if it ran, False if it was dropped or refused.
+        """
+        reason = self._screen(update)
+        if reason is not None:
+            self.counters[reason] += 1
+            if coroutine is not None and hasattr(coroutine, "close"):
+                coroutine.close()
+            return False
+        if self.overflow == "wait":
+            async with self._space:
+                await self._space.wait_for(lambda: len(self._waiting) < self.queue_size)
+        elif not self._make_room():
+            self.counters["rejected"] += 1
+            if coroutine is not None and hasattr(coroutine, "close"):
+                coroutine.close()
+            return False
+        job = self._enqueue(update, coroutine)
+        job.done = asyncio.get_running_loop().create_future()
+        return await job.done
+
+    # --- Processing ---
+
+    async def _run(self, job: _Job):
+        self._waits.append(time.monotonic() - job.enqueued_at)
+        try:
+            if job.coroutine is not None:
+                await job.coroutine
+            else:
+                await self.process(job.update)
+            self.counters["processed"] += 1
+            self._finish(job, True)
+        except asyncio.CancelledError:
+            self._finish(job, False)
+            raise
+        except Exception as e:
+            self.counters["failed"] += 1
+            self._finish(job, False)
+            logger.error(f"Error while processing update {getattr(job.update, 'update_id', '?')}: {e}", exc_info=True)
+
+    async def _worker(self):
+        while True:
+            lane_key = await self._ready.get()
+            lane = self._lanes.get(lane_key)
+            if not lane:
+                # Its jobs were dropped while it waited for a worker
+                self._scheduled.discard(lane_key)
+                self._lanes.pop(lane_key, None)
+                self._check_idle()
+                continue
+            job = lane.popleft()
+            self._unqueue(job)
+            async with self._space:
+                self._space.notify()
+            self._running += 1
+            try:
+                await self._run(job)
+            finally:
+                self._running -= 1
+                if lane:
+                    self._ready.put_nowait(lane_key)
+                else:
+                    self._scheduled.discard(lane_key)
+                    self._lanes.pop(lane_key, None)
+                self._check_idle()
+
+    def _check_idle(self):
+        if not self._waiting and not self._running:
+            self._idle.set()
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(self.metrics_log_interval)
+            logger.info(f"Update scheduler: {self.metrics()}")
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(), name=f"update-worker-{i}") for i in range(self.max_concurrency)]
+        if self.metrics_log_interval > 0:
+            self._tasks.append(asyncio.create_task(self._log_metrics(), name="update-metrics"))
+
+    async def stop(self, timeout: float = UPDATE_DRAIN_TIMEOUT):
+        """Lets queued and running updates finish (up to `timeout` seconds), then stops the workers."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping with {len(self._waiting)} updates still queued and {self._running} running.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._waiting.values()):
+            self._drop(job, "dropped")
+
+    # --- Metrics ---
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def percentile(fraction: float) -> float:
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))], 4) if waits else 0.0
+
+        return {
+            "queue_depth": len(self._waiting),
+            "max_queue_depth": self.max_depth,
+            "running": self._running,
+            "chats_waiting": sum(1 for lane in self._lanes.values() if lane),
+            "max_concurrency": self.max_concurrency,
+            "queue_size": self.queue_size,
+            "overflow": self.overflow,
+            "wait_seconds": {
+                "mean": round(sum(waits) / len(waits), 4) if waits else 0.0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 4) if waits else 0.0,
+            },
+            **self.counters,
+        }
+
+
+class SchedulerUpdateProcessor(BaseUpdateProcessor):
+    """
+    Plugs an UpdateScheduler into python-telegram-bot's polling loop
+    (ApplicationBuilder().concurrent_updates(SchedulerUpdateProcessor(...))).
+
+    PTB hands every fetched update to do_process_update() in its own task; the scheduler decides
+    when it runs. PTB's own limit is set to the scheduler's capacity (running + queued), so once
+    that is reached further updates wait inside PTB rather than piling up in the scheduler.
+    """
+
+    def __init__(self, scheduler: Optional[UpdateScheduler] = None):
+        self.scheduler = scheduler or UpdateScheduler()
+        super().__init__(max_concurrent_updates=self.scheduler.max_concurrency + self.scheduler.queue_size)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await self.scheduler.submit(update, coroutine)
+
+    async def initialize(self) -> None:
+        await self.scheduler.start()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.stop()
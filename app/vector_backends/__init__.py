@@ -0,0 +1,37 @@
+# Pluggable vector store backends.
+# The active backend is chosen by VECTOR_STORE_BACKEND ("pinecone" or "local") in app/config.py.
+import logging
+from typing import Optional
+
+from app.config import VECTOR_STORE_BACKEND
+from app.vector_backends.base import UpsertResult, VectorMatch, VectorStoreBackend, matches_filter
+
+logger = logging.getLogger(__name__)
+
+_backend: Optional[VectorStoreBackend] = None
+
+
+def create_backend(name: str) -> VectorStoreBackend:
+    """Instantiates a backend by name. Backend modules are imported lazily so their dependencies stay optional."""
+    if name == "pinecone":
+        from app.vector_backends.pinecone_backend import PineconeBackend
+        return PineconeBackend()
+    if name == "local":
+        from app.vector_backends.local_backend import LocalBackend
+        return LocalBackend()
+    raise ValueError(f"Unknown vector store backend: '{name}'. Expected 'pinecone' or 'local'.")
+
+
+def get_vector_backend() -> VectorStoreBackend:
+    """Returns the process-wide backend selected by VECTOR_STORE_BACKEND."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(VECTOR_STORE_BACKEND)
+        logger.info(f"Using '{_backend.name}' vector store backend.")
+    return _backend
+
+
+def set_vector_backend(backend: VectorStoreBackend):
+    """Overrides the process-wide backend (e.g. to run the RAG path against a local store)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,115 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class VectorMatch:
+    """
+    One query result, independent of the backend that produced it.
+    Supports both attribute access (match.score) and Pinecone-style dict access (match["score"]).
+    """
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+
+@dataclass
+class UpsertResult:
+    """Per-batch upsert response (mirrors the `upserted_count` field of Pinecone's response)."""
+    upserted_count: int
+
+
+class VectorStoreBackend(ABC):
+    """
+    Interface every vector store backend implements.
+    Vectors are passed as [(id, embedding, metadata), ...] and similarity is cosine.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def initialize(self) -> bool:
+        """Connects to / opens the store. Returns True when the backend is ready for use."""
+
+    @abstractmethod
+    def is_ready(self) -> bool:
+        """True once initialize() has succeeded."""
+
+    @abstractmethod
+    async def upsert(self, vectors: list, batch_size: int = 100) -> Optional[List[Any]]:
+        """Inserts or replaces vectors. Returns per-batch responses, or None on failure."""
+
+    @abstractmethod
+    async def query(self, vector: List[float], top_k: int, filter_criteria: Optional[dict] = None) -> List[VectorMatch]:
+        """Returns up to top_k matches ordered by decreasing cosine similarity."""
+
+    @abstractmethod
+    async def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns {id: metadata} for the IDs that are in the store (in batches, for any number of IDs)."""
+
+    @abstractmethod
+    async def delete(self, ids: Optional[list] = None, delete_all: bool = False, namespace: Optional[str] = None) -> bool:
+        """Deletes vectors by ID (or all of them). Returns True on success."""
+
+    def close(self):
+        """Releases resources held by the backend (threads, file handles)."""
+
+
+def matches_filter(metadata: Dict[str, Any], filter_criteria: Optional[dict]) -> bool:
+    """
+    Evaluates a Pinecone-style metadata filter against one metadata dict.
+    Supports implicit equality, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin, $exists, $and and $or.
+    """
+    if not filter_criteria:
+        return True
+    for key, condition in filter_criteria.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if not _apply_operator(op, value, operand, key in metadata):
+                return False
+    return True
+
+
+def _apply_operator(op: str, value: Any, operand: Any, present: bool) -> bool:
+    if op == "$exists":
+        return present == bool(operand)
+    if op == "$ne":
+        # A list-valued field matches $ne when none of its items equal the operand (Pinecone semantics)
+        return operand not in value if isinstance(value, list) else value != operand
+    if op == "$nin":
+        return not (set(value) & set(operand)) if isinstance(value, list) else value not in operand
+    if not present:
+        return False
+    if op == "$eq":
+        return operand in value if isinstance(value, list) else value == operand
+    if op == "$in":
+        return bool(set(value) & set(operand)) if isinstance(value, list) else value in operand
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {op}")
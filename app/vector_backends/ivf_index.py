@@ -0,0 +1,328 @@
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, metric: str, chunk_size: int = 8192) -> np.ndarray:
+    """Nearest centroid per vector ("ip" = max inner product, "l2" = min squared distance), computed in chunks."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    centroid_sq = (centroids * centroids).sum(axis=1) if metric == "l2" else None
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        scores = block @ centroids.T
+        if metric == "l2":
+            scores = 2 * scores - centroid_sq  # argmax of -||x - c||^2 without the constant ||x||^2
+        assignments[start:start + chunk_size] = scores.argmax(axis=1)
+    return assignments
+
+
+def _cluster_sums(vectors: np.ndarray, assignments: np.ndarray, k: int, chunk_size: int = 8192) -> np.ndarray:
+    """Per-cluster vector sums via one-hot matrix products (much faster than np.add.at)."""
+    sums = np.zeros((k, vectors.shape[1]), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        block_assignments = assignments[start:start + chunk_size]
+        one_hot = np.zeros((k, len(block_assignments)), dtype=np.float32)
+        one_hot[block_assignments, np.arange(len(block_assignments))] = 1.0
+        sums += one_hot @ vectors[start:start + chunk_size]
+    return sums
+
+
+def kmeans(vectors: np.ndarray, k: int, n_iter: int = 20, metric: str = "ip", seed: int = 0) -> np.ndarray:
+    """
+    Lloyd's k-means. With metric="ip" the centroids are re-normalized every iteration
+    (spherical k-means, which matches cosine similarity on unit vectors).
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].astype(np.float32, copy=True)
+    for _ in range(n_iter):
+        assignments = _assign(vectors, centroids, metric)
+        sums = _cluster_sums(vectors, assignments, k)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points so every list stays useful
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if metric == "ip":
+            centroids = _normalize(centroids)
+    return centroids.astype(np.float32, copy=False)
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index for cosine similarity, in pure NumPy.
+
+    Vectors are clustered into `n_lists` cells by spherical k-means; a query scans only the
+    `n_probe` cells whose centroids are closest, so raising n_probe trades latency for recall.
+
+    With `pq_subvectors > 0` the cells hold product-quantized residuals (one uint8 code per
+    subvector) instead of full float32 vectors, and are scored with asymmetric distance
+    lookup tables. Passing `refine_fn` to search() re-scores the best `refine_factor * k`
+    PQ candidates with exact vectors.
+
+    Entries are identified by caller-chosen int64 labels; add/remove/relabel work after training.
+    """
+
+    PQ_TRAIN_SIZE = 8192
+    PQ_TRAIN_ITERATIONS = 10
+
+    def __init__(
+        self,
+        dimension: int,
+        n_lists: int = 256,
+        n_probe: int = 16,
+        pq_subvectors: int = 0,
+        refine_factor: int = 4,
+        seed: int = 0,
+    ):
+        if pq_subvectors and dimension % pq_subvectors:
+            raise ValueError(f"dimension ({dimension}) must be divisible by pq_subvectors ({pq_subvectors}).")
+        self.dimension = dimension
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.pq_subvectors = pq_subvectors
+        self.refine_factor = refine_factor
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None      # (n_lists, dimension)
+        self.pq_codebooks: Optional[np.ndarray] = None   # (pq_subvectors, 256, dimension // pq_subvectors)
+
+        self._list_labels: List[np.ndarray] = []
+        self._list_data: List[np.ndarray] = []
+        self._list_sizes: Optional[np.ndarray] = None
+        self._where: Dict[int, Tuple[int, int]] = {}
+
+    # --- Training ---
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, sample_size: int = 50000, n_iter: int = 20):
+        """Learns the coarse centroids (and PQ codebooks) from a sample of the data."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample_size:
+            vectors = vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+        self.n_lists = min(self.n_lists, len(vectors))
+        self.centroids = kmeans(vectors, self.n_lists, n_iter=n_iter, metric="ip", seed=self.seed)
+
+        if self.pq_subvectors:
+            # 256-entry codebooks converge on far fewer points than the coarse quantizer needs
+            if len(vectors) > self.PQ_TRAIN_SIZE:
+                vectors = vectors[rng.choice(len(vectors), size=self.PQ_TRAIN_SIZE, replace=False)]
+            residuals = vectors - self.centroids[_assign(vectors, self.centroids, "ip")]
+            self.pq_codebooks = self._train_codebooks(residuals, min(n_iter, self.PQ_TRAIN_ITERATIONS), rng)
+
+        width = self.pq_subvectors or self.dimension
+        dtype = np.uint8 if self.pq_subvectors else np.float32
+        self._list_labels = [np.empty(0, dtype=np.int64) for _ in range(self.n_lists)]
+        self._list_data = [np.empty((0, width), dtype=dtype) for _ in range(self.n_lists)]
+        self._list_sizes = np.zeros(self.n_lists, dtype=np.int64)
+        self._where = {}
+        logger.info(f"Trained IVF index: {self.n_lists} lists" + (f", PQ with {self.pq_subvectors} subvectors." if self.pq_subvectors else "."))
+
+    def _pq_assign(self, residuals: np.ndarray, codebooks: np.ndarray, chunk_size: int = 1024) -> np.ndarray:
+        """Nearest codeword per subvector for every residual, all subvectors in one batched matmul."""
+        sub_dim = self.dimension // self.pq_subvectors
+        codeword_sq = (codebooks * codebooks).sum(axis=2)[:, None, :]  # (M, 1, 256)
+        codes = np.empty((len(residuals), self.pq_subvectors), dtype=np.uint8)
+        for start in range(0, len(residuals), chunk_size):
+            block = residuals[start:start + chunk_size].reshape(-1, self.pq_subvectors, sub_dim).transpose(1, 0, 2)
+            scores = 2 * np.matmul(block, codebooks.transpose(0, 2, 1)) - codeword_sq  # (M, n, 256)
+            codes[start:start + chunk_size] = scores.argmax(axis=2).T
+        return codes
+
+    def _train_codebooks(self, residuals: np.ndarray, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+        """Lloyd's k-means with 256 codewords, run for all subvector spaces at once."""
+        m_count, sub_dim = self.pq_subvectors, self.dimension // self.pq_subvectors
+        n_codewords = min(256, len(residuals))
+        sub_residuals = residuals.reshape(-1, m_count, sub_dim)
+        codebooks = np.zeros((m_count, 256, sub_dim), dtype=np.float32)
+        codebooks[:, :n_codewords] = sub_residuals[rng.choice(len(residuals), size=n_codewords, replace=False)].transpose(1, 0, 2)
+        flat = sub_residuals.reshape(-1, sub_dim)
+        for _ in range(n_iter):
+            codes = self._pq_assign(residuals, codebooks).astype(np.int64)
+            # Sum members per (subvector, codeword) by sorting on a combined key
+            keys = (np.arange(m_count)[None, :] * 256 + codes).ravel()
+            order = np.argsort(keys, kind="stable")
+            unique_keys, starts = np.unique(keys[order], return_index=True)
+            sums = np.add.reduceat(flat[order], starts, axis=0)
+            counts = np.diff(np.append(starts, len(keys)))
+            updated = codebooks.reshape(-1, sub_dim).copy()
+            updated[unique_keys] = sums / counts[:, None]  # empty codewords keep their old value
+            codebooks = updated.reshape(m_count, 256, sub_dim)
+        return codebooks
+
+    def _encode(self, vectors: np.ndarray, lists: np.ndarray) -> np.ndarray:
+        return self._pq_assign(vectors - self.centroids[lists], self.pq_codebooks)
+
+    # --- Mutation ---
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def add(self, labels: np.ndarray, vectors: np.ndarray):
+        """Adds (or replaces) entries. The index must be trained first."""
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors.")
+        labels = np.asarray(labels, dtype=np.int64)
+        existing = [int(label) for label in labels if int(label) in self._where]
+        if existing:
+            self.remove(existing)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        lists = _assign(vectors, self.centroids, "ip")
+        data = self._encode(vectors, lists) if self.pq_subvectors else vectors
+
+        order = np.argsort(lists, kind="stable")
+        boundaries = np.flatnonzero(np.diff(lists[order])) + 1
+        for group in np.split(order, boundaries):
+            if group.size == 0:
+                continue
+            list_id = int(lists[group[0]])
+            size = int(self._list_sizes[list_id])
+            needed = size + group.size
+            if needed > len(self._list_labels[list_id]):
+                capacity = max(needed, 2 * len(self._list_labels[list_id]), 16)
+                self._list_labels[list_id] = np.resize(self._list_labels[list_id], capacity)
+                grown = np.empty((capacity, data.shape[1]), dtype=data.dtype)
+                grown[:size] = self._list_data[list_id][:size]
+                self._list_data[list_id] = grown
+            self._list_labels[list_id][size:needed] = labels[group]
+            self._list_data[list_id][size:needed] = data[group]
+            for slot, label in enumerate(labels[group], start=size):
+                self._where[int(label)] = (list_id, slot)
+            self._list_sizes[list_id] = needed
+
+    def remove(self, labels) -> int:
+        """Removes entries by label (swap-with-last inside their list). Returns how many existed."""
+        removed = 0
+        for label in labels:
+            location = self._where.pop(int(label), None)
+            if location is None:
+                continue
+            list_id, slot = location
+            last = int(self._list_sizes[list_id]) - 1
+            if slot != last:
+                moved_label = int(self._list_labels[list_id][last])
+                self._list_labels[list_id][slot] = moved_label
+                self._list_data[list_id][slot] = self._list_data[list_id][last]
+                self._where[moved_label] = (list_id, slot)
+            self._list_sizes[list_id] = last
+            removed += 1
+        return removed
+
+    def relabel(self, old_label: int, new_label: int):
+        """Changes an entry's label in place (used when the owning store moves a row)."""
+        location = self._where.pop(int(old_label))
+        self._where[int(new_label)] = location
+        self._list_labels[location[0]][location[1]] = new_label
+
+    # --- Search ---
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        n_probe: Optional[int] = None,
+        refine_fn: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (labels, scores) of the approximate top-k by cosine similarity, best first."""
+        if not self.is_trained or not self._where or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        if self.pq_subvectors:
+            sub_dim = self.dimension // self.pq_subvectors
+            # lut[m, c] = <query_m, codebook_m[c]>: the residual part of the inner product
+            lut = np.einsum("mcd,md->mc", self.pq_codebooks, query.reshape(self.pq_subvectors, sub_dim))
+            columns = np.arange(self.pq_subvectors)
+
+        label_parts, score_parts = [], []
+        for list_id in probe:
+            size = int(self._list_sizes[list_id])
+            if size == 0:
+                continue
+            data = self._list_data[list_id][:size]
+            if self.pq_subvectors:
+                scores = centroid_scores[list_id] + lut[columns, data].sum(axis=1)
+            else:
+                scores = data @ query
+            label_parts.append(self._list_labels[list_id][:size])
+            score_parts.append(scores)
+        if not label_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        labels = np.concatenate(label_parts)
+        scores = np.concatenate(score_parts).astype(np.float32, copy=False)
+
+        shortlist = k * self.refine_factor if (self.pq_subvectors and refine_fn is not None) else k
+        labels, scores = self._top(labels, scores, shortlist)
+        if shortlist != k:
+            exact = _normalize(np.asarray(refine_fn(labels), dtype=np.float32)) @ query
+            labels, scores = self._top(labels, exact, k)
+        return labels, scores
+
+    @staticmethod
+    def _top(labels: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            labels, scores = labels[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return labels[order], scores[order]
+
+    # --- Persistence ---
+
+    def save(self, path: str):
+        """Writes the index to a single .npz file (lists are stored compacted)."""
+        sizes = self._list_sizes if self._list_sizes is not None else np.zeros(0, dtype=np.int64)
+        arrays = {
+            "params": np.array([self.dimension, self.n_lists, self.n_probe, self.pq_subvectors, self.refine_factor, self.seed], dtype=np.int64),
+            "list_sizes": sizes,
+        }
+        if self.is_trained:
+            arrays["centroids"] = self.centroids
+            arrays["labels"] = np.concatenate([l[:s] for l, s in zip(self._list_labels, sizes)]) if len(sizes) else np.empty(0, np.int64)
+            arrays["data"] = np.concatenate([d[:s] for d, s in zip(self._list_data, sizes)]) if len(sizes) else np.empty(0)
+        if self.pq_codebooks is not None:
+            arrays["pq_codebooks"] = self.pq_codebooks
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as f:
+            dimension, n_lists, n_probe, pq_subvectors, refine_factor, seed = (int(v) for v in f["params"])
+            index = cls(dimension, n_lists, n_probe, pq_subvectors, refine_factor, seed)
+            if "centroids" not in f:
+                return index
+            index.centroids = f["centroids"]
+            if "pq_codebooks" in f:
+                index.pq_codebooks = f["pq_codebooks"]
+            sizes = f["list_sizes"]
+            labels, data = f["labels"], f["data"]
+        index._list_sizes = sizes.astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        index._list_labels, index._list_data, index._where = [], [], {}
+        for list_id in range(len(sizes)):
+            start, end = int(offsets[list_id]), int(offsets[list_id + 1])
+            index._list_labels.append(labels[start:end].copy())
+            index._list_data.append(data[start:end].copy())
+            for slot, label in enumerate(index._list_labels[-1]):
+                index._where[int(label)] = (list_id, slot)
+        return index
@@ -0,0 +1,463 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (
+    EMBEDDING_DIMENSION,
+    LOCAL_VECTOR_STORE_DIR,
+    LOCAL_ANN_INDEX,
+    LOCAL_ANN_MIN_VECTORS,
+    LOCAL_ANN_NLIST,
+    LOCAL_ANN_NPROBE,
+    LOCAL_ANN_PQ_SUBVECTORS,
+)
+from app.vector_backends.base import UpsertResult, VectorMatch, VectorStoreBackend, matches_filter
+from app.vector_backends.ivf_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_MIN_BYTES = 4 * 2**20 # The log is folded into index.json once it outgrows both this and index.json
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine index.
+
+    Vectors are L2-normalized on insert and kept in a float32 matrix that lives in a
+    memory-mapped file (`vectors.f32`), so exact cosine similarity is one matrix-vector product.
+    IDs and metadata are stored next to it: `index.json` is a snapshot, and each upsert or
+    delete after it is appended to `index.log`, so a write costs O(batch) rather than a rewrite
+    of every ID. The log is folded into a new snapshot once it is larger than the snapshot
+    (keeping the total work linear in the number of writes), on save_ann() and on close().
+    Rows are kept dense: deleting a vector moves the last row into its slot.
+
+    Once the store holds `ann_min_vectors` vectors, unfiltered queries go through an IVF
+    approximate index (`ivf.npz`, labels = row positions) that is kept in sync on every
+    upsert and delete. It is trained outside the lock, written to disk by save_ann() /
+    close() and rebuilt on load if it is missing or older than the vectors.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    INDEX_FILE = "index.json"
+    LOG_FILE = "index.log"
+    ANN_FILE = "ivf.npz"
+    ANN_TRAIN_SAMPLE = 50000 # Vectors copied out for k-means when (re)building the ANN index
+    ANN_ADD_BATCH = 50000    # Rows copied out (under the lock) per batch added to a new ANN index
+
+    def __init__(
+        self,
+        directory: str = LOCAL_VECTOR_STORE_DIR,
+        dimension: int = EMBEDDING_DIMENSION,
+        initial_capacity: int = 1024,
+        ann_mode: str = LOCAL_ANN_INDEX,
+        ann_min_vectors: int = LOCAL_ANN_MIN_VECTORS,
+        ann_n_probe: int = LOCAL_ANN_NPROBE,
+    ):
+        if ann_mode not in ("none", "ivf", "ivfpq"):
+            raise ValueError(f"Unknown ANN mode '{ann_mode}'. Expected 'none', 'ivf' or 'ivfpq'.")
+        self.directory = directory
+        self.dimension = dimension
+        self.ann_mode = ann_mode
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_n_probe = ann_n_probe
+        self.ids: List[str] = []
+        self.metadata: List[dict] = []
+        self._positions: Dict[str, int] = {}
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._ann: Optional[IVFIndex] = None
+        self._generation = 0      # Bumped on every mutation
+        self._ann_generation = -1 # Generation the saved ANN file corresponds to
+        self._ann_dirty: Optional[set] = None # Rows written while build_ann() runs outside the lock
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load(initial_capacity)
+
+    # --- Persistence ---
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, self.VECTORS_FILE)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, self.INDEX_FILE)
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.directory, self.LOG_FILE)
+
+    @property
+    def _ann_path(self) -> str:
+        return os.path.join(self.directory, self.ANN_FILE)
+
+    def _load(self, initial_capacity: int):
+        if os.path.isfile(self._index_path) and os.path.isfile(self._vectors_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state["dimension"] != self.dimension:
+                raise ValueError(
+                    f"Local vector store at {self.directory} has dimension {state['dimension']}, expected {self.dimension}."
+                )
+            self.ids = state["ids"]
+            self.metadata = state["metadata"]
+            self._positions = {vector_id: i for i, vector_id in enumerate(self.ids)}
+            self._generation = state.get("generation", 0)
+            self._ann_generation = state.get("ann_generation", -1)
+            self._snapshot_bytes = os.path.getsize(self._index_path)
+            replayed = self._replay_log()
+            file_rows = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+            self._open_vectors(max(state["capacity"], file_rows, len(self.ids), 1))
+            logger.info(f"Loaded local vector store from {self.directory} ({len(self.ids)} vectors, {replayed} logged writes).")
+            self._load_ann()
+        else:
+            self._open_vectors(initial_capacity)
+            self._checkpoint() # The snapshot the log builds on
+
+    def _load_ann(self):
+        if self.ann_mode == "none" or len(self.ids) < self.ann_min_vectors:
+            return
+        if os.path.isfile(self._ann_path) and self._ann_generation == self._generation:
+            try:
+                self._ann = IVFIndex.load(self._ann_path)
+                logger.info(f"Loaded ANN index from {self._ann_path} ({len(self._ann)} vectors).")
+                return
+            except Exception as e:
+                logger.warning(f"Could not load ANN index from {self._ann_path}: {e}. Rebuilding.")
+        self.build_ann()
+
+    def _open_vectors(self, capacity: int):
+        """(Re)maps the vectors file, growing it to `capacity` rows if needed."""
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        required_bytes = capacity * self.dimension * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < required_bytes:
+                f.truncate(required_bytes)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self._capacity = capacity
+
+    def _replay_log(self) -> int:
+        """Applies the log entries newer than the snapshot to the IDs and metadata (the vectors file already has them)."""
+        if not os.path.isfile(self._log_path):
+            return 0
+        replayed = 0
+        with open(self._log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._log_bytes += len(line.encode("utf-8"))
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring a truncated entry at the end of {self._log_path}.")
+                    break
+                if entry["generation"] <= self._generation:
+                    continue # Already in the snapshot (a checkpoint was interrupted before the log was removed)
+                if entry["op"] == "upsert":
+                    for vector_id, metadata in entry["items"]:
+                        self._set_row(vector_id, metadata)
+                elif entry["op"] == "delete":
+                    for vector_id in entry["ids"]:
+                        self._remove_row(vector_id)
+                elif entry["op"] == "clear":
+                    self.ids, self.metadata, self._positions = [], [], {}
+                self._generation = entry["generation"]
+                replayed += 1
+        return replayed
+
+    def _append_log(self, entry: dict):
+        """Records one write; the vectors are flushed first, so a logged write always has its rows on disk."""
+        self._vectors.flush()
+        line = json.dumps({"generation": self._generation, **entry}) + "\n"
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+        self._log_bytes += len(line.encode("utf-8"))
+        if self._log_bytes > max(CHECKPOINT_MIN_BYTES, self._snapshot_bytes):
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Writes a full snapshot of the IDs and metadata and starts a new, empty log."""
+        self._vectors.flush()
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dimension": self.dimension,
+                "capacity": self._capacity,
+                "generation": self._generation,
+                "ann_generation": self._ann_generation,
+                "ids": self.ids,
+                "metadata": self.metadata,
+            }, f)
+        os.replace(tmp_path, self._index_path)
+        self._snapshot_bytes = os.path.getsize(self._index_path)
+        if os.path.isfile(self._log_path):
+            os.remove(self._log_path)
+        self._log_bytes = 0
+
+    # --- Approximate index ---
+
+    def build_ann(self):
+        """
+        (Re)trains the IVF index on the current vectors and adds all of them.
+
+        Training and adding run outside the lock, so queries and writes carry on meanwhile
+        (k-means over a large store takes seconds); rows written or moved in the meantime are
+        re-added before the new index is swapped in.
+        """
+        with self._lock:
+            count = len(self.ids)
+            if self.ann_mode == "none" or count == 0:
+                self._ann = None
+                return
+            if self._ann_dirty is not None:
+                return # Another build is running and will pick up the current rows
+            dirty = self._ann_dirty = set()
+            sample = np.arange(count)
+            if count > self.ANN_TRAIN_SAMPLE:
+                sample = np.sort(np.random.default_rng(0).choice(count, size=self.ANN_TRAIN_SAMPLE, replace=False))
+            training = np.array(self._vectors[sample])
+        try:
+            n_lists = LOCAL_ANN_NLIST or max(16, int(4 * np.sqrt(count)))
+            pq_subvectors = LOCAL_ANN_PQ_SUBVECTORS if self.ann_mode == "ivfpq" else 0
+            ann = IVFIndex(self.dimension, n_lists=n_lists, n_probe=self.ann_n_probe, pq_subvectors=pq_subvectors)
+            ann.train(training, sample_size=self.ANN_TRAIN_SAMPLE)
+            del training
+            for start in range(0, count, self.ANN_ADD_BATCH):
+                with self._lock:
+                    end = min(start + self.ANN_ADD_BATCH, len(self.ids))
+                    if start >= end:
+                        break
+                    rows = np.array(self._vectors[start:end])
+                ann.add(np.arange(start, end), rows)
+            with self._lock:
+                if self._ann_dirty is not dirty:
+                    return # clear() ran meanwhile
+                ann.remove(dirty)
+                live = sorted(position for position in dirty if position < len(self.ids))
+                if live:
+                    ann.add(np.asarray(live, dtype=np.int64), self._vectors[live])
+                self._ann = ann
+                logger.info(f"Built '{self.ann_mode}' ANN index over {len(self.ids)} vectors ({n_lists} lists).")
+                self.save_ann()
+        finally:
+            with self._lock:
+                if self._ann_dirty is dirty:
+                    self._ann_dirty = None
+
+    def save_ann(self):
+        """Writes the ANN index to disk and records which generation of the vectors it matches."""
+        with self._lock:
+            if self._ann is None or self._ann_generation == self._generation:
+                return
+            self._ann.save(self._ann_path)
+            self._ann_generation = self._generation
+            self._checkpoint()
+
+    def close(self):
+        with self._lock:
+            self.save_ann()
+            if self._vectors is not None and self._log_bytes:
+                self._checkpoint()
+
+    # --- Operations ---
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _set_row(self, vector_id: str, metadata: dict) -> int:
+        """Adds or updates the ID's metadata; returns its row."""
+        position = self._positions.get(vector_id)
+        if position is None:
+            position = len(self.ids)
+            self.ids.append(vector_id)
+            self.metadata.append(metadata)
+            self._positions[vector_id] = position
+        else:
+            self.metadata[position] = metadata
+        return position
+
+    def _remove_row(self, vector_id: str) -> Optional[Tuple[int, int]]:
+        """Removes the ID, moving the last row's ID and metadata into its slot; returns (freed row, moved row)."""
+        position = self._positions.pop(vector_id, None)
+        if position is None:
+            return None
+        last = len(self.ids) - 1
+        if position != last:
+            self.ids[position] = self.ids[last]
+            self.metadata[position] = self.metadata[last]
+            self._positions[self.ids[position]] = position
+        self.ids.pop()
+        self.metadata.pop()
+        return position, last
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, vectors: list) -> int:
+        """Inserts or replaces [(id, embedding, metadata), ...]. Returns the number of vectors written."""
+        if not vectors:
+            return 0
+        matrix = self._normalize(np.asarray([embedding for _, embedding, _ in vectors], dtype=np.float32))
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {matrix.shape[1]}.")
+        with self._lock:
+            new_count = len(self.ids) + sum(1 for vector_id, _, _ in vectors if str(vector_id) not in self._positions)
+            if new_count > self._capacity:
+                self._open_vectors(max(new_count, self._capacity * 2))
+            written = {} # position -> row of `matrix` (the last one wins if an ID repeats)
+            items = []
+            for row_number, (row, (vector_id, _, metadata)) in enumerate(zip(matrix, vectors)):
+                vector_id, metadata = str(vector_id), dict(metadata or {})
+                position = self._set_row(vector_id, metadata)
+                self._vectors[position] = row
+                written[position] = row_number
+                items.append((vector_id, metadata))
+            self._generation += 1
+            if self._ann is not None:
+                self._ann.add(np.fromiter(written.keys(), dtype=np.int64), matrix[list(written.values())])
+            if self._ann_dirty is not None:
+                self._ann_dirty.update(written)
+            self._append_log({"op": "upsert", "items": items})
+            needs_ann = self._ann is None and self.ann_mode != "none" and len(self.ids) >= self.ann_min_vectors
+        if needs_ann:
+            self.build_ann()
+        return len(vectors)
+
+    def delete(self, ids: List[str]) -> int:
+        """Deletes vectors by ID. Returns how many existed."""
+        deleted = []
+        with self._lock:
+            for vector_id in map(str, ids):
+                removed = self._remove_row(vector_id)
+                if removed is None:
+                    continue
+                position, last = removed
+                if self._ann is not None:
+                    self._ann.remove([position])
+                if position != last:
+                    # Keep rows dense: move the last row into the freed slot
+                    self._vectors[position] = self._vectors[last]
+                    if self._ann is not None:
+                        self._ann.relabel(last, position)
+                if self._ann_dirty is not None:
+                    self._ann_dirty.update((position, last))
+                deleted.append(vector_id)
+            if deleted:
+                self._generation += 1
+                self._append_log({"op": "delete", "ids": deleted})
+        return len(deleted)
+
+    def clear(self):
+        with self._lock:
+            self.ids, self.metadata, self._positions = [], [], {}
+            self._ann = None
+            self._ann_dirty = None # Discards a build in progress
+            self._generation += 1
+            self._checkpoint()
+
+    def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        """{id: metadata} for the IDs that are in the store."""
+        with self._lock:
+            return {
+                vector_id: dict(self.metadata[self._positions[vector_id]])
+                for vector_id in map(str, ids) if vector_id in self._positions
+            }
+
+    def query(self, vector: List[float], top_k: int, filter_criteria: Optional[dict] = None, exact: bool = False) -> List[VectorMatch]:
+        """
+        Cosine top-k, optionally restricted to vectors whose metadata matches the filter.
+        Unfiltered queries use the ANN index when one is built (unless exact=True); filtered
+        queries are always exact over the matching vectors.
+        """
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            count = len(self.ids)
+            if count == 0 or top_k <= 0:
+                return []
+            if self._ann is not None and not filter_criteria and not exact:
+                positions, scores = self._ann.search(query, top_k, refine_fn=lambda labels: self._vectors[labels])
+                return [
+                    VectorMatch(id=self.ids[p], score=float(score), metadata=dict(self.metadata[p]))
+                    for p, score in zip(positions, scores)
+                ]
+            if filter_criteria:
+                candidates = np.fromiter(
+                    (i for i in range(count) if matches_filter(self.metadata[i], filter_criteria)), dtype=np.int64
+                )
+                if candidates.size == 0:
+                    return []
+                scores = self._vectors[candidates] @ query
+            else:
+                candidates = None
+                scores = self._vectors[:count] @ query
+
+            k = min(top_k, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+            top = top[np.argsort(-scores[top], kind="stable")]
+            positions = candidates[top] if candidates is not None else top
+            return [
+                VectorMatch(id=self.ids[p], score=float(scores[t]), metadata=dict(self.metadata[p]))
+                for p, t in zip(positions, top)
+            ]
+
+
+class LocalBackend(VectorStoreBackend):
+    """In-process vector store: no network hop, works offline (e.g. in CI)."""
+
+    name = "local"
+
+    def __init__(self, directory: str = LOCAL_VECTOR_STORE_DIR, dimension: int = EMBEDDING_DIMENSION):
+        self.directory = directory
+        self.dimension = dimension
+        self.index: Optional[LocalVectorIndex] = None
+
+    def initialize(self) -> bool:
+        if self.index is None:
+            try:
+                self.index = LocalVectorIndex(self.directory, self.dimension)
+            except Exception as e:
+                logger.error(f"Failed to open local vector store at {self.directory}: {e}", exc_info=True)
+                return False
+        return True
+
+    def is_ready(self) -> bool:
+        return self.index is not None
+
+    async def upsert(self, vectors: list, batch_size: int = 100):
+        responses = []
+        for i in range(0, len(vectors), batch_size):
+            # File writes happen here; keep them off the event loop
+            count = await asyncio.to_thread(self.index.upsert, vectors[i:i + batch_size])
+            responses.append(UpsertResult(upserted_count=count))
+        logger.info(f"Upserted {len(vectors)} vectors to the local vector store ({len(self.index)} total).")
+        return responses
+
+    async def query(self, vector: List[float], top_k: int, filter_criteria: Optional[dict] = None) -> List[VectorMatch]:
+        # Filtered queries scan every metadata row, and the index lock is held by writes; keep
+        # both off the event loop
+        return await asyncio.to_thread(self.index.query, vector, top_k, filter_criteria)
+
+    async def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.index.fetch, ids)
+
+    async def delete(self, ids: Optional[list] = None, delete_all: bool = False, namespace: Optional[str] = None) -> bool:
+        if delete_all:
+            await asyncio.to_thread(self.index.clear)
+        else:
+            deleted = await asyncio.to_thread(self.index.delete, ids)
+            logger.info(f"Deleted {deleted} of {len(ids)} vectors from the local vector store.")
+        return True
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import pinecone
+import urllib3
+from app.config import (
+    PINECONE_API_KEY,
+    PINECONE_ENVIRONMENT,
+    PINECONE_INDEX_NAME,
+    PINECONE_IO_THREADS,
+    PINECONE_UPSERT_CONCURRENCY,
+    PINECONE_MAX_RETRIES,
+    EMBEDDING_DIMENSION,
+)
+from app.rate_limiter import backoff_delay
+from app.vector_backends.base import VectorMatch, VectorStoreBackend
+
+logger = logging.getLogger(__name__)
+
+# --- Pinecone Initialization ---
+pc = None
+index = None
+
+def init_pinecone():
+    global pc, index
+    if not all([PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME]):
+        if PINECONE_API_KEY == "YOUR_PINECONE_API_KEY_PLACEHOLDER" or \
+        PINECONE_ENVIRONMENT == "YOUR_PINECONE_ENVIRONMENT_PLACEHOLDER":
+            logger.warning("Pinecone API Key or Environment is using placeholder values. Pinecone will not be initialized.")
+            return False
+        logger.error("Pinecone configuration (API_KEY, ENVIRONMENT, INDEX_NAME) incomplete in config.py.")
+        return False
+
+    try:
+        pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
+
+        # Check if index exists
+        if PINECONE_INDEX_NAME not in pinecone.list_indexes():
+            logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist. Attempting to create it.")
+            try:
+                pinecone.create_index(
+                    name=PINECONE_INDEX_NAME,
+                    dimension=EMBEDDING_DIMENSION,
+                    metric="cosine"
+                )
+                logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' created successfully with dimension {EMBEDDING_DIMENSION}.")
+            except Exception as create_e:
+                logger.error(f"Failed to create Pinecone index '{PINECONE_INDEX_NAME}': {create_e}", exc_info=True)
+                return False
+
+        index = pinecone.Index(PINECONE_INDEX_NAME)
+        logger.info(f"Successfully connected to Pinecone index: {PINECONE_INDEX_NAME}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to initialize Pinecone: {e}", exc_info=True)
+        return False
+
+
+# --- Pinecone I/O off the event loop ---
+# index.upsert / query / delete are blocking network calls. They run on this bounded pool so
+# that one slow Pinecone round trip never stalls other coroutines (e.g. other Telegram updates).
+_pinecone_executor = ThreadPoolExecutor(max_workers=PINECONE_IO_THREADS, thread_name_prefix="pinecone-io")
+
+PINECONE_DELETE_BATCH_SIZE = 1000 # Pinecone's limit on IDs per delete request
+PINECONE_FETCH_BATCH_SIZE = 200   # IDs per fetch request (they travel in the URL)
+
+
+# Connection failures and timeouts below the HTTP layer (the Pinecone client talks through urllib3)
+TRANSIENT_NETWORK_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    urllib3.exceptions.MaxRetryError,
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.TimeoutError,
+)
+
+
+def _is_retryable_pinecone_error(e: Exception) -> bool:
+    """Retry network errors, rate limits (429) and server errors (5xx); anything else is raised at once."""
+    if isinstance(e, TRANSIENT_NETWORK_ERRORS):
+        return True
+    status = getattr(e, "status", None) or getattr(e, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+async def _run_pinecone(fn, *args, description: str = "Pinecone call", max_retries: int = PINECONE_MAX_RETRIES, **kwargs):
+    """Runs a blocking Pinecone call on the I/O pool, retrying transient failures with jittered backoff."""
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        try:
+            return await loop.run_in_executor(_pinecone_executor, functools.partial(fn, *args, **kwargs))
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable_pinecone_error(e):
+                raise
+            delay = backoff_delay(attempt, base_delay=0.5, max_delay=10.0)
+            logger.warning(f"{description} failed (attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {delay:.2f}s.")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+def shutdown_pinecone_executor():
+    """Shutdown hook: stops the Pinecone I/O thread pool."""
+    _pinecone_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def process_vector_id(vector_id: str) -> str:
+    """Process vector ID to ensure it meets Pinecone's requirements."""
+    # First, clean the ID by replacing newlines and multiple spaces with single spaces
+    cleaned_id = ' '.join(vector_id.replace('\n', ' ').split())
+
+    # If the cleaned ID is already short enough, return it
+    if len(cleaned_id) <= 512:
+        return cleaned_id
+
+    # If still too long, create a hash of the entire ID
+    hash_suffix = hashlib.md5(cleaned_id.encode()).hexdigest()[:8]
+
+    # Take first 503 characters of cleaned ID and add hash
+    truncated_id = cleaned_id[:503] + "_" + hash_suffix  # 503 + 1 + 8 = 512
+
+    logger.warning(f"Vector ID was too long ({len(cleaned_id)} chars). Truncated to '{truncated_id}'")
+    return truncated_id
+
+
+class PineconeBackend(VectorStoreBackend):
+    """Vector store backed by a hosted Pinecone index."""
+
+    name = "pinecone"
+
+    def initialize(self) -> bool:
+        return index is not None or init_pinecone()
+
+    def is_ready(self) -> bool:
+        return index is not None
+
+    async def upsert(self, vectors: list, batch_size: int = 100):
+        """
+        Batches are sent in parallel (PINECONE_UPSERT_CONCURRENCY) off the event loop and retried
+        individually. Returns the per-batch responses, or None if any batch ultimately failed.
+        """
+        batches = [
+            # Process each vector in the batch to ensure IDs meet requirements
+            [(process_vector_id(str(id_)), embedding, metadata) for id_, embedding, metadata in vectors[i:i + batch_size]]
+            for i in range(0, len(vectors), batch_size)
+        ]
+        semaphore = asyncio.Semaphore(PINECONE_UPSERT_CONCURRENCY)
+
+        async def upsert_batch(batch_number: int, processed_batch: list):
+            async with semaphore:
+                logger.debug(f"Upserting batch {batch_number + 1}/{len(batches)} of {len(processed_batch)} vectors to Pinecone.")
+                response = await _run_pinecone(
+                    index.upsert, vectors=processed_batch,
+                    description=f"Upsert batch {batch_number + 1}/{len(batches)}"
+                )
+                logger.info(f"Successfully upserted batch to Pinecone. Upserted count: {response.upserted_count}")
+                return response
+
+        # Batches go out in parallel; each failed batch is retried on its own, so a transient
+        # error only re-sends that batch rather than the whole upsert.
+        results = await asyncio.gather(*(upsert_batch(n, b) for n, b in enumerate(batches)), return_exceptions=True)
+        failed = [(n, r) for n, r in enumerate(results) if isinstance(r, BaseException)]
+        for n, e in failed:
+            logger.error(f"Error upserting batch {n + 1}/{len(batches)} to Pinecone: {e}", exc_info=e)
+        if failed:
+            logger.error(f"{len(failed)} of {len(batches)} upsert batches failed after retries.")
+            return None
+        return results
+
+    async def query(self, vector: List[float], top_k: int, filter_criteria: Optional[dict] = None) -> List[VectorMatch]:
+        query_params = {
+            "vector": vector,
+            "top_k": top_k,
+            "include_metadata": True
+        }
+        if filter_criteria:
+            query_params["filter"] = filter_criteria
+
+        logger.debug(f"Querying Pinecone with top_k={top_k}, filter={filter_criteria}")
+        query_response = await _run_pinecone(index.query, description="Pinecone query", **query_params)
+        return [
+            VectorMatch(id=match.id, score=match.score, metadata=dict(match.metadata or {}))
+            for match in query_response.get('matches', [])
+        ]
+
+    async def fetch(self, ids: List[str]) -> Dict[str, dict]:
+        # Look up the IDs as upsert() stored them, and report them as the caller knows them
+        requested = {process_vector_id(str(vector_id)): str(vector_id) for vector_id in ids}
+        pinecone_ids = list(requested)
+        id_batches = [pinecone_ids[i:i + PINECONE_FETCH_BATCH_SIZE] for i in range(0, len(pinecone_ids), PINECONE_FETCH_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(PINECONE_UPSERT_CONCURRENCY)
+
+        async def fetch_batch(batch: list):
+            async with semaphore:
+                return await _run_pinecone(index.fetch, ids=batch, description="Pinecone fetch")
+
+        found = {}
+        for response in await asyncio.gather(*(fetch_batch(batch) for batch in id_batches)):
+            vectors = response.get('vectors', {}) if isinstance(response, dict) else response.vectors
+            for vector_id, vector in (vectors or {}).items():
+                metadata = vector.get('metadata') if isinstance(vector, dict) else vector.metadata
+                found[requested.get(vector_id, vector_id)] = dict(metadata or {})
+        return found
+
+    async def delete(self, ids: Optional[list] = None, delete_all: bool = False, namespace: Optional[str] = None) -> bool:
+        if delete_all:
+            logger.info(f"Attempting to delete all vectors in namespace: {namespace if namespace else 'default'}")
+            response = await _run_pinecone(index.delete, delete_all=True, namespace=namespace, description="Pinecone delete_all")
+        else:
+            logger.info(f"Attempting to delete {len(ids)} vectors by ID.")
+            id_batches = [ids[i:i + PINECONE_DELETE_BATCH_SIZE] for i in range(0, len(ids), PINECONE_DELETE_BATCH_SIZE)]
+            semaphore = asyncio.Semaphore(PINECONE_UPSERT_CONCURRENCY)
+
+            async def delete_batch(batch: list):
+                async with semaphore:
+                    return await _run_pinecone(index.delete, ids=batch, namespace=namespace, description="Pinecone delete")
+
+            response = await asyncio.gather(*(delete_batch(batch) for batch in id_batches))
+        logger.info(f"Pinecone delete response: {response}") # Pinecone delete returns an empty dict {} on success
+        return True # Assuming success if no exception
+
+    def close(self):
+        shutdown_pinecone_executor()
@@ -1,22 +1,30 @@
+import asyncio
 import logging
 import os
+import time
 import openai
-import pinecone
-from pinecone import Pinecone, ServerlessSpec
 from app.config import (
-    PINECONE_API_KEY,
-    PINECONE_ENVIRONMENT,
     PINECONE_INDEX_NAME,
     EMBEDDING_MODEL_NAME, # This will now be 'text-embedding-3-small'
     EMBEDDING_DIMENSION,  # This will be 1536 for text-embedding-3-small
-    OPENAI_API_KEY        # Added for OpenAI
+    OPENAI_API_KEY,       # Added for OpenAI
+    OPENAI_EMBEDDING_TIMEOUT,
+    RAG_MIN_SCORE,
+    HYBRID_CANDIDATES,
+    HYBRID_LEXICAL_MIN_SCORE,
+    HYBRID_LEXICAL_MIN_RELATIVE,
+    RRF_K,
 )
+from app.openai_client import get_openai_client
+from app.embedding_cache import get_embedding_cache, normalize_text
+from app.chunk_store import close_chunk_store, get_chunk_store, split_metadata
+from app.lexical_index import close_lexical_index, get_lexical_index
 
 logger = logging.getLogger(__name__)
 
 # --- OpenAI Client Initialization ---
-# The OpenAI client is typically initialized when needed, or once globally.
-# For simplicity here, we'll ensure the API key is set.
+# The client itself is shared process-wide (see app/openai_client.py).
+# Here we only ensure the API key is set.
 if not OPENAI_API_KEY or OPENAI_API_KEY == "YOUR_OPENAI_API_KEY_PLACEHOLDER":
     logger.warning("OPENAI_API_KEY not set or is placeholder. OpenAI embeddings will fail.")
     # openai.api_key will not be set, calls will fail.
@@ -28,10 +36,9 @@ else:
 async def generate_embedding(text: str, model: str = EMBEDDING_MODEL_NAME): # model parameter defaults to config
     """
     Generates an embedding for the given text using the specified OpenAI model.
+    Embeddings are looked up in the persistent embedding cache first; only cache misses
+    are sent to the API (and stored in the cache afterwards).
     """
-    if not openai.api_key:
-        logger.error("OpenAI API key not configured. Cannot generate embedding.")
-        return None
     if not isinstance(text, (str, list)):
         logger.error(f"Invalid input type for embedding: {type(text)}. Expected str or list of str.")
         return None
@@ -40,19 +47,32 @@ async def generate_embedding(text: str, model: str = EMBEDDING_MODEL_NAME): # mo
     # If a single string, it's better to wrap it in a list for consistency with the API's batch processing.
     input_texts = [text] if isinstance(text, str) else text
     
-    # Replace newlines for OpenAI's recommendation
-    input_texts = [item.replace("\n", " ") for item in input_texts]
+    # Normalize whitespace (replaces newlines, per OpenAI's recommendation); this is also the cache key text
+    input_texts = [normalize_text(item) for item in input_texts]
 
     try:
-        # Create async client
-        client = openai.AsyncOpenAI(api_key=openai.api_key)
-        
-        # Use async client to create embeddings
-        response = await client.embeddings.create(input=input_texts, model=model)
-        
-        # The response object has a 'data' attribute that contains a list of embedding objects
-        # Each embedding object has an 'embedding' attribute
-        embeddings = [item.embedding for item in response.data]
+        cache = get_embedding_cache()
+        known = cache.get_many(model, EMBEDDING_DIMENSION, input_texts) if cache else {}
+        # De-duplicate misses so repeated texts in one batch are embedded once
+        missing_texts = list(dict.fromkeys(item for item in input_texts if item not in known))
+
+        if missing_texts:
+            if not openai.api_key:
+                logger.error("OpenAI API key not configured. Cannot generate embedding.")
+                return None
+            # Use the shared, pooled async client to create embeddings
+            client = get_openai_client()
+            response = await client.embeddings.create(input=missing_texts, model=model, timeout=OPENAI_EMBEDDING_TIMEOUT)
+            
+            # The response object has a 'data' attribute that contains a list of embedding objects
+            # Each embedding object has an 'embedding' attribute
+            fresh = {item_text: item.embedding for item_text, item in zip(missing_texts, response.data)}
+            if cache:
+                cache.put_many(model, EMBEDDING_DIMENSION, fresh)
+            known.update(fresh)
+
+        logger.debug(f"Embedding cache: {len(input_texts) - len(missing_texts)} hit(s), {len(missing_texts)} sent to the API.")
+        embeddings = [known[item] for item in input_texts]
         
         if isinstance(text, str): # If original input was a single string, return a single embedding
             return embeddings[0]
@@ -66,116 +86,114 @@ async def generate_embedding(text: str, model: str = EMBEDDING_MODEL_NAME): # mo
         logger.error(f"Error generating OpenAI embedding for text: '{str(text)[:100]}...': {e}", exc_info=True)
         return None
 
-# --- Pinecone Initialization ---
-pc = None
-index = None
-
-def init_pinecone():
-    global pc, index
-    if not all([PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME]):
-        if PINECONE_API_KEY == "YOUR_PINECONE_API_KEY_PLACEHOLDER" or \
-        PINECONE_ENVIRONMENT == "YOUR_PINECONE_ENVIRONMENT_PLACEHOLDER":
-            logger.warning("Pinecone API Key or Environment is using placeholder values. Pinecone will not be initialized.")
-            return False
-        logger.error("Pinecone configuration (API_KEY, ENVIRONMENT, INDEX_NAME) incomplete in config.py.")
-        return False
+# --- Vector store backend ---
+# Pinecone helpers are re-exported here for existing callers (e.g. scripts/chunker_pipeline.py).
+from app.vector_backends import VectorMatch, get_vector_backend
+from app.vector_backends.pinecone_backend import init_pinecone, shutdown_pinecone_executor
+
 
+def init_vector_store() -> bool:
+    """Initializes the configured vector store backend. Returns True when it is ready."""
+    return get_vector_backend().initialize()
+
+# Attempt to initialize the vector store when the module is loaded.
+# For FastAPI, this could also be triggered by a startup event in main.py
+if not init_vector_store():
+    logger.warning(f"Vector store ('{get_vector_backend().name}') not initialized. Vector store operations will be degraded or fail.")
+
+
+def close_vector_store():
+    """Shutdown hook: releases the backend's threads and file handles, closes the chunk store and saves the lexical index."""
+    get_vector_backend().close()
+    close_chunk_store()
+    close_lexical_index()
+
+
+def _store_chunk_text(vectors: list) -> list:
+    """
+    Moves chunk text, summaries and document context into the local chunk store (app/chunk_store.py)
+    and returns the vectors with only their slim metadata. Vectors are returned unchanged if the
+    store is disabled or the write fails, so the text is never lost.
+    """
+    store = get_chunk_store()
+    if store is None:
+        return vectors
+    stored, slim_vectors = [], []
+    for vector_id, embedding, metadata in vectors:
+        fields, slim = split_metadata(metadata or {})
+        if fields:
+            stored.append((str(vector_id), fields))
+        slim_vectors.append((vector_id, embedding, slim))
     try:
-        pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENVIRONMENT)
-        
-        # Check if index exists
-        if PINECONE_INDEX_NAME not in pinecone.list_indexes():
-            logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' does not exist. Attempting to create it.")
-            try:
-                pinecone.create_index(
-                    name=PINECONE_INDEX_NAME,
-                    dimension=EMBEDDING_DIMENSION,
-                    metric="cosine"
-                )
-                logger.info(f"Pinecone index '{PINECONE_INDEX_NAME}' created successfully with dimension {EMBEDDING_DIMENSION}.")
-            except Exception as create_e:
-                logger.error(f"Failed to create Pinecone index '{PINECONE_INDEX_NAME}': {create_e}", exc_info=True)
-                return False
-        
-        index = pinecone.Index(PINECONE_INDEX_NAME)
-        logger.info(f"Successfully connected to Pinecone index: {PINECONE_INDEX_NAME}")
-        return True
+        store.put_many(stored)
     except Exception as e:
-        logger.error(f"Failed to initialize Pinecone: {e}", exc_info=True)
-        return False
+        logger.error(f"Could not write {len(stored)} chunks to the chunk store: {e}. Upserting full metadata instead.", exc_info=True)
+        return vectors
+    return slim_vectors
 
-# Attempt to initialize Pinecone when the module is loaded.
-# For FastAPI, this could also be triggered by a startup event in main.py
-if not init_pinecone():
-    logger.warning("Pinecone not initialized. Vector store operations will be degraded or fail.")
+
+def _hydrate_matches(matches: list) -> list:
+    """
+    Fills in the chunk store fields of matches whose metadata lacks them, with one batched lookup.
+    Matches left without text are reported once per query, as an error when they are the majority:
+    the vectors were then ingested with CHUNK_STORE_ENABLED and this process cannot see that store.
+    """
+    missing = [match for match in matches if "original_text" not in match.metadata]
+    if not missing:
+        return matches
+    store = get_chunk_store()
+    if store is not None:
+        stored = store.get_many([match.id for match in missing])
+        for match in missing:
+            match.metadata.update(stored.get(match.id) or {})
+        missing = [match for match in missing if "original_text" not in match.metadata]
+    if not missing:
+        return matches
+    where = f"the chunk store at {store.path}" if store is not None else "vector metadata (CHUNK_STORE_ENABLED is off)"
+    message = f"{len(missing)} of {len(matches)} matches have no chunk text in {where}; they cannot be used as context."
+    if len(missing) * 2 > len(matches):
+        logger.error(f"{message} Run with CHUNK_STORE_ENABLED and the chunk store file ingestion wrote, or re-ingest with it off.")
+    else:
+        logger.warning(message)
+    return matches
 
 
 async def upsert_vectors(vectors: list, batch_size: int = 100):
     """
-    Upserts vectors into the Pinecone index.
+    Upserts vectors into the configured vector store.
     Expects vectors in the format: [(id1, embedding1, metadata1), (id2, embedding2, metadata2), ...]
+    Returns the per-batch responses (each with an `upserted_count`), or None on failure.
     """
-    if not index:
-        logger.error("Pinecone index is not initialized. Cannot upsert vectors.")
+    backend = get_vector_backend()
+    if not backend.is_ready():
+        logger.error(f"Vector store ('{backend.name}') is not initialized. Cannot upsert vectors.")
         return None
     if not vectors:
         logger.warning("No vectors provided to upsert.")
         return None
-
-    def process_vector_id(vector_id: str) -> str:
-        """Process vector ID to ensure it meets Pinecone's requirements."""
-        # First, clean the ID by replacing newlines and multiple spaces with single spaces
-        cleaned_id = ' '.join(vector_id.replace('\n', ' ').split())
-        
-        # If the cleaned ID is already short enough, return it
-        if len(cleaned_id) <= 512:
-            return cleaned_id
-        
-        # If still too long, create a hash of the entire ID
-        import hashlib
-        hash_suffix = hashlib.md5(cleaned_id.encode()).hexdigest()[:8]
-        
-        # Take first 503 characters of cleaned ID and add hash
-        truncated_id = cleaned_id[:503] + "_" + hash_suffix  # 503 + 1 + 8 = 512
-        
-        logger.warning(f"Vector ID was too long ({len(cleaned_id)} chars). Truncated to '{truncated_id}'")
-        return truncated_id
-
     try:
-        upsert_responses = []
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            # Process each vector in the batch to ensure IDs meet requirements
-            processed_batch = [
-                (process_vector_id(str(id_)), embedding, metadata)
-                for id_, embedding, metadata in batch
-            ]
-            
-            logger.debug(f"Upserting batch of {len(processed_batch)} vectors to Pinecone.")
-            response = index.upsert(vectors=processed_batch)
-            upsert_responses.append(response)
-            logger.info(f"Successfully upserted batch to Pinecone. Upserted count: {response.upserted_count}")
-        return upsert_responses
+        responses = await backend.upsert(_store_chunk_text(vectors), batch_size=batch_size)
     except Exception as e:
-        logger.error(f"Error upserting vectors to Pinecone: {e}", exc_info=True)
+        logger.error(f"Error upserting vectors to '{backend.name}' vector store: {e}", exc_info=True)
         return None
+    lexical_index = get_lexical_index()
+    if responses is not None and lexical_index is not None:
+        lexical_index.add_many(
+            (str(vector_id), metadata["original_text"]) for vector_id, _, metadata in vectors
+            if metadata and metadata.get("original_text")
+        )
+    return responses
 
 
-async def query_vector_store(query_text: str, top_k: int = 20, filter_criteria: dict = None):
+async def query_vector_store(query_text: str, top_k: int = 20, filter_criteria: dict = None, hydrate: bool = True):
     """
-    Queries the Pinecone vector store for relevant documents using cosine similarity (if index is configured for it).
-    Returns top_k embeddings along with their metadata.
+    Queries the configured vector store for relevant documents using cosine similarity.
+    Returns up to top_k VectorMatch objects (id, score, metadata), best first; with hydrate=False
+    their chunk text is not filled in from the chunk store.
     """
-    if not index:
-        logger.error("Pinecone index is not initialized. Cannot query.")
-        # Fallback to simulated response if Pinecone is not available
-        logger.info(f"Simulating querying vector store for: '{query_text}' with top_k={top_k}. (Pinecone not initialized)")
-        return [
-            {"id": "sim_doc1", "score": 0.9, "metadata": {"text": "This is a simulated relevant document because Pinecone is not available."}},
-            {"id": "sim_doc2", "score": 0.85, "metadata": {"text": "Another simulated document discussing laws, due to Pinecone unavailability."}}
-        ]
-    if not openai.api_key: # Check if OpenAI client is ready
-        logger.error("OpenAI API key not configured. Cannot generate query embedding.")
+    backend = get_vector_backend()
+    if not backend.is_ready():
+        logger.error(f"Vector store ('{backend.name}') is not initialized. Cannot query.")
         return []
 
     try:
@@ -184,51 +202,135 @@ async def query_vector_store(query_text: str, top_k: int = 20, filter_criteria:
             logger.error("Failed to generate embedding for the query.")
             return []
 
-        query_params = {
-            "vector": query_embedding,
-            "top_k": top_k,
-            "include_metadata": True
-        }
-        if filter_criteria:
-            query_params["filter"] = filter_criteria
-        
-        logger.debug(f"Querying Pinecone with top_k={top_k}, filter={filter_criteria}")
-        query_response = index.query(**query_params)
-        
-        matches = query_response.get('matches', [])
-        logger.info(f"Query to Pinecone for '{query_text[:50]}...' returned {len(matches)} matches.")
-        
-        # Example processing:
-        # results = [{"id": match.id, "score": match.score, "text": match.metadata.get("text")} for match in matches]
-        return matches
+        matches = await backend.query(query_embedding, top_k, filter_criteria)
+        logger.info(f"Query to '{backend.name}' vector store for '{query_text[:50]}...' returned {len(matches)} matches.")
+        return matches if not hydrate else _hydrate_matches(matches)
 
     except Exception as e:
-        logger.error(f"Error querying Pinecone: {e}", exc_info=True)
+        logger.error(f"Error querying '{backend.name}' vector store: {e}", exc_info=True)
         return []
 
 
+def _lexical_search(lexical_index, query_text: str, top_k: int, min_score: float = HYBRID_LEXICAL_MIN_SCORE, min_relative: float = HYBRID_LEXICAL_MIN_RELATIVE) -> list:
+    """BM25 hits (best first) scoring at least `min_score` and `min_relative` x the best hit."""
+    start = time.perf_counter()
+    hits = lexical_index.search(query_text, top_k)
+    floor = max(min_score, hits[0][1] * min_relative) if hits else 0.0
+    kept = [(chunk_id, score) for chunk_id, score in hits if score >= floor]
+    logger.info(
+        f"Lexical search for '{query_text[:50]}...' returned {len(hits)} matches in {(time.perf_counter() - start) * 1000:.1f} ms; "
+        f"{len(kept)} kept above BM25 score {floor:.2f}."
+    )
+    return kept
+
+
+def reciprocal_rank_fusion(rankings: dict, k: int = RRF_K) -> list:
+    """[(id, fused score), ...] best first, from {leg name: [id, ...] best first}; score = sum of 1 / (k + rank)."""
+    fused = {}
+    for ranking in rankings.values():
+        for rank, match_id in enumerate(ranking, start=1):
+            fused[match_id] = fused.get(match_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+async def _fetch_lexical_only(matches: list, vector_ids: set) -> list:
+    """
+    Fills in the vector metadata of matches only BM25 found, with one batched backend fetch.
+    Matches the vector store no longer holds (the lexical index is behind a delete) are dropped.
+    """
+    lexical_only = [match.id for match in matches if match.id not in vector_ids]
+    if not lexical_only:
+        return matches
+    try:
+        fetched = await get_vector_backend().fetch(lexical_only)
+    except Exception as e:
+        logger.error(f"Could not fetch {len(lexical_only)} lexical-only matches from the vector store: {e}", exc_info=True)
+        return [match for match in matches if match.id in vector_ids]
+    kept = []
+    for match in matches:
+        if match.id not in vector_ids:
+            if match.id not in fetched:
+                continue
+            match.metadata.update({key: value for key, value in fetched[match.id].items() if key not in match.metadata})
+        kept.append(match)
+    if len(kept) < len(matches):
+        logger.warning(f"{len(matches) - len(kept)} lexical matches are no longer in the vector store; rebuild the lexical index.")
+    return kept
+
+
+async def hybrid_search(query_text: str, top_k: int = 20, filter_criteria: dict = None, candidates: int = HYBRID_CANDIDATES, min_vector_score: float = RAG_MIN_SCORE):
+    """
+    Vector search and BM25 search over the local lexical index (app/lexical_index.py), run
+    concurrently and merged with reciprocal rank fusion. BM25 catches the exact form numbers, visa
+    classes and statute sections that embeddings blur; vector search catches paraphrases.
+
+    Vector matches below `min_vector_score` are dropped before fusion, as the vector-only path drops
+    them; BM25 hits are cut likewise by _lexical_search(). The lexical leg is skipped when a metadata filter is given, since the lexical index holds
+    no metadata. Metadata (and so text) of hits only BM25 found is fetched from the vector store in
+    one batch; the chunk store fills in text kept there. Returns up to top_k VectorMatch objects whose `score` is the
+    fused RRF score; `vector_score` and `lexical_score` in their metadata keep each leg's score.
+    """
+    lexical_index = get_lexical_index()
+    use_lexical = lexical_index is not None and len(lexical_index) > 0 and not filter_criteria
+    loop = asyncio.get_running_loop()
+    # BM25 runs on a worker thread while the query is embedded and sent to the vector store
+    lexical_leg = loop.run_in_executor(None, _lexical_search, lexical_index, query_text, candidates) if use_lexical else None
+    vector_matches = await query_vector_store(query_text, top_k=max(top_k, candidates), filter_criteria=filter_criteria, hydrate=False)
+    lexical_hits = []
+    if lexical_leg is not None:
+        try:
+            lexical_hits = await lexical_leg
+        except Exception as e:
+            logger.error(f"Lexical search failed: {e}. Using vector results only.", exc_info=True)
+
+    vector_matches = [match for match in vector_matches if match.score >= min_vector_score]
+    by_id = {match.id: match for match in vector_matches}
+    lexical_scores = dict(lexical_hits)
+    fused = reciprocal_rank_fusion({
+        "vector": [match.id for match in vector_matches],
+        "lexical": [chunk_id for chunk_id, _ in lexical_hits],
+    })[:top_k]
+
+    matches = []
+    for match_id, score in fused:
+        match = by_id.get(match_id) or VectorMatch(id=match_id, score=0.0)
+        metadata = dict(match.metadata)
+        if match_id in by_id:
+            metadata["vector_score"] = match.score
+        if match_id in lexical_scores:
+            metadata["lexical_score"] = lexical_scores[match_id]
+        matches.append(VectorMatch(id=match_id, score=score, metadata=metadata))
+    matches = await _fetch_lexical_only(matches, set(by_id))
+    both = sum(1 for match in matches if "vector_score" in match.metadata and "lexical_score" in match.metadata)
+    logger.info(f"Hybrid search fused {len(vector_matches)} vector and {len(lexical_hits)} lexical matches into {len(matches)} ({both} found by both).")
+    return _hydrate_matches(matches)
+
+
 async def delete_vectors(ids: list = None, delete_all: bool = False, namespace: str = None):
     """
-    Deletes vectors from the Pinecone index by IDs or deletes all vectors in a namespace.
+    Deletes vectors from the configured vector store by IDs, or all vectors (in a namespace, for Pinecone).
     """
-    if not index:
-        logger.error("Pinecone index is not initialized. Cannot delete vectors.")
+    backend = get_vector_backend()
+    if not backend.is_ready():
+        logger.error(f"Vector store ('{backend.name}') is not initialized. Cannot delete vectors.")
+        return False
+    if not delete_all and not ids:
+        logger.warning("No IDs provided and delete_all is False. Nothing to delete.")
         return False
     try:
-        if delete_all:
-            logger.info(f"Attempting to delete all vectors in namespace: {namespace if namespace else 'default'}")
-            response = index.delete(delete_all=True, namespace=namespace)
-        elif ids:
-            logger.info(f"Attempting to delete {len(ids)} vectors by ID.")
-            response = index.delete(ids=ids, namespace=namespace)
-        else:
-            logger.warning("No IDs provided and delete_all is False. Nothing to delete.")
-            return False
-        
-        logger.info(f"Pinecone delete response: {response}") # Pinecone delete returns an empty dict {} on success
-        return True # Assuming success if no exception
+        deleted = await backend.delete(ids=ids, delete_all=delete_all, namespace=namespace)
+        store = get_chunk_store()
+        if deleted and store is not None:
+            store.delete(chunk_ids=ids, delete_all=delete_all)
+        lexical_index = get_lexical_index()
+        if deleted and lexical_index is not None:
+            if delete_all:
+                lexical_index.clear()
+            else:
+                lexical_index.delete(ids)
+        return deleted
     except Exception as e:
-        logger.error(f"Error deleting vectors from Pinecone: {e}", exc_info=True)
+        logger.error(f"Error deleting vectors from '{backend.name}' vector store: {e}", exc_info=True)
         return False
 
 if __name__ == "__main__":
@@ -239,13 +341,14 @@ if __name__ == "__main__":
     # For a more robust test, you might mock Pinecone and SentenceTransformer.
     async def main_test():
         logger.info("Starting vector_store.py direct test...")
-        # init_pinecone() is called at module load, but we can check its status
-        if not index or not embedding_model:
-            logger.error("Pinecone index or embedding model not initialized. Aborting test.")
-            print("Pinecone index or embedding model not initialized. Check logs and .env file. Aborting test.")
+        # init_vector_store() is called at module load, but we can check its status
+        backend = get_vector_backend()
+        if not backend.is_ready():
+            logger.error(f"Vector store ('{backend.name}') not initialized. Aborting test.")
+            print("Vector store not initialized. Check logs and .env file. Aborting test.")
             return
 
-        print(f"Testing with Pinecone index: {PINECONE_INDEX_NAME}")
+        print(f"Testing with '{backend.name}' vector store (Pinecone index: {PINECONE_INDEX_NAME})")
         print(f"Testing with Embedding model: {EMBEDDING_MODEL_NAME} (Dimension: {EMBEDDING_DIMENSION})")
 
         # Test embedding generation
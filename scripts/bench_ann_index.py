@@ -0,0 +1,111 @@
+"""
+Benchmark: exact brute-force cosine search vs. the IVF / IVF-PQ index used by the local backend.
+
+Generates a synthetic clustered corpus (embeddings of real documents are far from uniform,
+so uniform random vectors would make any ANN index look worse than it is), builds the
+indexes, and reports build time, recall@k against the exact top-k and mean latency per query.
+
+Usage:
+    python scripts/bench_ann_index.py --n 100000 --dim 1536 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.vector_backends.ivf_index import IVFIndex, _normalize
+
+
+def make_corpus(n: int, dim: int, n_topics: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    corpus = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 10000):
+        end = min(start + 10000, n)
+        corpus[start:end] = topics[rng.integers(0, n_topics, end - start)]
+        corpus[start:end] += noise * rng.standard_normal((end - start, dim), dtype=np.float32)
+    return _normalize(corpus)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> tuple:
+    start = time.perf_counter()
+    results = []
+    for query in queries:
+        scores = corpus @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        results.append(top[np.argsort(-scores[top])])
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def evaluate(index: IVFIndex, corpus: np.ndarray, queries: np.ndarray, truth: list, k: int, n_probe: int, refine: bool) -> tuple:
+    refine_fn = (lambda labels: corpus[labels]) if refine else None
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        labels, _ = index.search(query, k, n_probe=n_probe, refine_fn=refine_fn)
+        hits += len(set(labels.tolist()) & set(expected.tolist()))
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return hits / (k * len(queries)), elapsed
+
+
+def build(corpus: np.ndarray, n_lists: int, pq_subvectors: int) -> tuple:
+    start = time.perf_counter()
+    index = IVFIndex(corpus.shape[1], n_lists=n_lists, pq_subvectors=pq_subvectors)
+    index.train(corpus)
+    for offset in range(0, len(corpus), 50000):
+        index.add(np.arange(offset, min(offset + 50000, len(corpus))), corpus[offset:offset + 50000])
+    return index, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark for the local ANN index.")
+    parser.add_argument("--n", type=int, default=100000, help="Number of corpus vectors.")
+    parser.add_argument("--dim", type=int, default=1536, help="Vector dimension.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries.")
+    parser.add_argument("--k", type=int, default=10, help="Top-k for recall@k.")
+    parser.add_argument("--topics", type=int, default=2000, help="Number of synthetic topic clusters.")
+    parser.add_argument("--noise", type=float, default=1.0, help="Per-vector noise around its topic (relative to topic norm).")
+    parser.add_argument("--n_lists", type=int, default=0, help="IVF lists (0 = 4 * sqrt(n)).")
+    parser.add_argument("--n_probes", type=str, default="4,8,16,32,64", help="Comma-separated n_probe values to try.")
+    parser.add_argument("--pq_subvectors", type=int, default=64, help="PQ subvectors for the IVF-PQ run (0 = skip).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    n_lists = args.n_lists or max(16, int(4 * np.sqrt(args.n)))
+    n_probes = [int(p) for p in args.n_probes.split(",")]
+
+    print(f"Corpus: {args.n} x {args.dim} float32 ({args.n * args.dim * 4 / 2**20:.0f} MiB), {args.topics} topics; "
+          f"{args.queries} queries, k={args.k}, {n_lists} lists")
+    corpus = make_corpus(args.n, args.dim, args.topics, args.noise, args.seed)
+    # Queries are perturbed corpus vectors, like a question phrased close to a stored chunk
+    rng = np.random.default_rng(args.seed + 1)
+    queries = corpus[rng.choice(args.n, size=args.queries, replace=False)]
+    queries = _normalize(queries + 0.5 * args.noise / np.sqrt(args.dim) * rng.standard_normal(queries.shape, dtype=np.float32))
+
+    truth, exact_latency = exact_top_k(corpus, queries, args.k)
+    print(f"\n{'method':<28}{'build (s)':>10}{'recall@' + str(args.k):>12}{'ms/query':>10}{'speedup':>9}")
+    print(f"{'exact (brute force)':<28}{'-':>10}{1.0:>12.3f}{exact_latency * 1000:>10.2f}{1.0:>9.1f}")
+
+    runs = [("IVF-Flat", 0, False)]
+    if args.pq_subvectors:
+        runs += [(f"IVF-PQ{args.pq_subvectors}", args.pq_subvectors, False), (f"IVF-PQ{args.pq_subvectors}+refine", args.pq_subvectors, True)]
+    built = {}
+    for label, pq_subvectors, refine in runs:
+        if pq_subvectors not in built:
+            built[pq_subvectors] = build(corpus, n_lists, pq_subvectors)
+        index, build_time = built[pq_subvectors]
+        for n_probe in n_probes:
+            recall, latency = evaluate(index, corpus, queries, truth, args.k, n_probe, refine)
+            name = f"{label} (n_probe={n_probe})"
+            print(f"{name:<28}{build_time:>10.1f}{recall:>12.3f}{latency * 1000:>10.2f}{exact_latency / latency:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
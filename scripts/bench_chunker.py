@@ -0,0 +1,103 @@
+"""
+Benchmark: scaling of the offset-based chunker (scripts/text_chunker.py) with input size.
+
+Generates synthetic legal-style text (paragraphs of varying length, some over the upper limit
+so they are sentence-split) from 1 MB up to 100 MB, chunks it with iter_chunks() and with the
+page-streaming IncrementalChunker, and reports wall time and throughput. Tokens are counted with
+the embedding model's BPE encoding (--tokenizer heuristic for the 4-characters estimate). Linear scaling shows
+up as a flat MB/s column; the last column is time per MB relative to the smallest size.
+
+Usage:
+    python scripts/bench_chunker.py
+    python scripts/bench_chunker.py --sizes 1,10,100 --upper 1000 --lower 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.tokenizer import TokenCounter, get_token_counter
+from scripts.text_chunker import IncrementalChunker, iter_chunks
+
+WORDS = (
+    "the alien shall be inadmissible under section 212(a)(9)(B) of the Act unless a waiver is granted "
+    "by the Attorney General pursuant to 8 U.S.C. 1182 and the applicant files Form I-601 with USCIS "
+    "before the removal proceedings conclude in immigration court"
+).split()
+PAGE_SIZE = 3000 # Characters per simulated PDF page
+
+
+def make_text(size_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    pool = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))) + rng.choice(".!?") for _ in range(2000)]
+    paragraphs, total, number = [], 0, 0
+    while total < size_bytes:
+        sentences = []
+        # Mostly short paragraphs, with the occasional very long one
+        for _ in range(rng.choice([1, 2, 3, 5, 8, 60])):
+            # Numbered so that no sentence repeats (repeats would just hit the token-count memo)
+            number += 1
+            sentences.append(f"{number} {rng.choice(pool)}")
+        paragraphs.append(" ".join(sentences))
+        total += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)[:size_bytes]
+
+
+def time_iter_chunks(text: str, upper: int, lower: int, token_counter: TokenCounter) -> tuple:
+    start = time.perf_counter()
+    count = sum(1 for _ in iter_chunks(text, upper, lower, token_counter))
+    return time.perf_counter() - start, count
+
+
+def split_pages(text: str) -> list:
+    """Cuts the text into PAGE_SIZE-character pages."""
+    return [text[offset:offset + PAGE_SIZE] for offset in range(0, len(text), PAGE_SIZE)]
+
+
+def time_incremental(pages: list, upper: int, lower: int, token_counter: TokenCounter) -> tuple:
+    start = time.perf_counter()
+    chunker = IncrementalChunker(upper, lower, token_counter)
+    count = 0
+    for page_number, page in enumerate(pages, start=1):
+        count += len(chunker.feed(page, page_number))
+    count += len(chunker.finish())
+    return time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunker scaling benchmark (1 MB to 100 MB).")
+    parser.add_argument("--sizes", type=str, default="1,2,5,10,20,50,100", help="Comma-separated input sizes in MB.")
+    parser.add_argument("--upper", type=int, default=1000, help="Upper chunk size limit in tokens.")
+    parser.add_argument("--lower", type=int, default=300, help="Lower chunk size limit in tokens.")
+    parser.add_argument("--tokenizer", choices=["bpe", "heuristic"], default="bpe", help="Count tokens with the embedding model's encoding or the 4-characters-per-token estimate.")
+    args = parser.parse_args()
+
+    sizes = [float(s) for s in args.sizes.split(",")]
+    print(f"upper={args.upper} lower={args.lower} tokens, {PAGE_SIZE}-char pages for the streaming chunker\n")
+    print(f"{'MB':>6}{'chunks':>10}{'iter s':>9}{'MB/s':>8}{'stream s':>10}{'MB/s':>8}{'s/MB vs first':>15}")
+    encoding = None if args.tokenizer == "heuristic" else get_token_counter().encoding
+    first_per_mb = None
+    for size in sizes:
+        pages = split_pages(make_text(int(size * 1024 * 1024)))
+        # The streaming chunker sees the pages joined with newlines; give iter_chunks the same text
+        text = "\n".join(pages)
+        iter_time, iter_count = time_iter_chunks(text, args.upper, args.lower, TokenCounter(encoding))
+        stream_time, stream_count = time_incremental(pages, args.upper, args.lower, TokenCounter(encoding))
+        if stream_count != iter_count:
+            print(f"  chunk counts differ: iter_chunks {iter_count}, IncrementalChunker {stream_count}")
+        per_mb = iter_time / size
+        if first_per_mb is None:
+            first_per_mb = per_mb
+        print(f"{size:>6g}{iter_count:>10}{iter_time:>9.2f}{size / iter_time:>8.1f}"
+              f"{stream_time:>10.2f}{size / stream_time:>8.1f}{per_mb / first_per_mb:>15.2f}")
+        del text, pages
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: BM25 lexical index (app/lexical_index.py) build time, size and query latency.
+
+Generates a synthetic corpus of chunks in the style of immigration guidance (a Zipf-distributed
+vocabulary, like natural text, plus form numbers, visa classes and CFR sections) and times queries
+that mix identifiers with ordinary words. --vocabulary 0 uses only the few dozen domain words, so
+every term occurs in nearly every chunk: the worst case for postings length. The query latency
+is that of the lexical leg of hybrid_search().
+
+Usage:
+    python scripts/bench_lexical_index.py
+    python scripts/bench_lexical_index.py --chunks 200000 --queries 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.lexical_index import BM25Index
+
+WORDS = (
+    "applicant petition beneficiary employer filing fee waiver interview field office evidence "
+    "eligibility adjustment status permanent resident naturalization citizenship visa consular "
+    "processing priority date category spouse child parent sibling employment authorization travel "
+    "document biometrics appointment request notice approval denial appeal motion reopen reconsider"
+).split()
+IDENTIFIERS = (
+    ["I-130", "I-485", "I-765", "I-131", "I-140", "I-129", "N-400", "N-600", "DS-160", "DS-260", "I-864", "I-751"]
+    + ["H-1B", "L-1A", "L-1B", "O-1", "EB-1", "EB-2", "EB-3", "F-1", "J-1", "K-1", "TN", "E-2"]
+    + [f"8 CFR {part}.{section}({letter})" for part in (103, 204, 214, 245) for section in (1, 2, 5) for letter in "abh"]
+)
+
+
+def make_vocabulary(size: int) -> tuple:
+    """Words and their Zipf weights: the domain words are the most frequent, then `size` rarer made-up words."""
+    words = WORDS + [f"term{i}" for i in range(size)]
+    return words, [1.0 / rank for rank in range(1, len(words) + 1)]
+
+
+def make_chunk(rng: random.Random, words: int, vocabulary: tuple) -> str:
+    tokens = rng.choices(vocabulary[0], weights=vocabulary[1], k=words)
+    for _ in range(rng.randint(0, 4)):
+        tokens.insert(rng.randrange(len(tokens)), rng.choice(IDENTIFIERS))
+    return " ".join(tokens) + "."
+
+
+def make_query(rng: random.Random, vocabulary: tuple) -> str:
+    return f"{rng.choice(IDENTIFIERS)} {' '.join(rng.choices(vocabulary[0], weights=vocabulary[1], k=rng.randint(2, 6)))}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 lexical index build and query benchmark.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Number of synthetic chunks.")
+    parser.add_argument("--words", type=int, default=250, help="Words per chunk.")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Extra Zipf-distributed words beyond the domain words.")
+    parser.add_argument("--queries", type=int, default=300, help="Number of queries to time.")
+    parser.add_argument("--top_k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary)
+    chunks = [(f"chunk_{i}", make_chunk(rng, args.words, vocabulary)) for i in range(args.chunks)]
+    queries = [make_query(rng, vocabulary) for _ in range(args.queries)]
+
+    index = BM25Index(path=None)
+    start = time.perf_counter()
+    index.add_many(chunks)
+    build_seconds = time.perf_counter() - start
+    stats = index.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        index.path = os.path.join(directory, "lexical_index.npz")
+        start = time.perf_counter()
+        index.save()
+        save_seconds = time.perf_counter() - start
+        file_mb = os.path.getsize(index.path) / 2**20
+        start = time.perf_counter()
+        BM25Index(path=index.path)
+        load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, args.top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+
+    print(f"{args.chunks} chunks of {args.words} words: {stats['terms']} terms, {stats['postings']} postings "
+          f"({stats['postings_bytes'] / 2**20:.1f} MiB in memory, {file_mb:.1f} MiB on disk)")
+    print(f"build {build_seconds:.1f}s ({args.chunks / build_seconds:.0f} chunks/s), save {save_seconds:.2f}s, load {load_seconds:.2f}s")
+    print(f"query (top {args.top_k}): mean {latencies.mean():.2f} ms, p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p95 {np.percentile(latencies, 95):.2f} ms, max {latencies.max():.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
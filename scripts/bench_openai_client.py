@@ -0,0 +1,140 @@
+"""
+Micro-benchmark: fresh AsyncOpenAI client per call vs. the shared pooled client.
+
+Runs a tiny local HTTP/1.1 stub of the /v1/embeddings endpoint, counts the TCP
+connections it accepts and (optionally) charges a simulated handshake delay on every
+new connection, the way a real TLS handshake to api.openai.com would.
+
+Usage:
+    python scripts/bench_openai_client.py --requests 200 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import openai
+from app.openai_client import OpenAIClientManager
+
+
+class StubEmbeddingServer:
+    """Minimal keep-alive HTTP/1.1 server answering every POST with a fixed embedding response."""
+
+    def __init__(self, handshake_delay: float, dimension: int = 8):
+        self.handshake_delay = handshake_delay
+        self.connections_accepted = 0
+        self.requests_served = 0
+        self._body = json.dumps({
+            "object": "list",
+            "data": [{"object": "embedding", "index": 0, "embedding": [0.1] * dimension}],
+            "model": "stub-embedding",
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }).encode()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections_accepted += 1
+        if self.handshake_delay:
+            await asyncio.sleep(self.handshake_delay)  # Simulated TLS handshake cost
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                content_length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        content_length = int(line.split(b":", 1)[1])
+                if content_length:
+                    await reader.readexactly(content_length)
+                self.requests_served += 1
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(self._body)}\r\n\r\n".encode()
+                    + self._body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+
+async def run_fresh_clients(base_url: str, n_requests: int, concurrency: int) -> list:
+    """Baseline: what the code did before, a brand-new client for every call."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_call():
+        async with semaphore:
+            start = time.perf_counter()
+            client = openai.AsyncOpenAI(api_key="stub", base_url=base_url, max_retries=0)
+            await client.embeddings.create(input=["hello"], model="stub-embedding")
+            latencies.append(time.perf_counter() - start)
+            await client.close()
+
+    await asyncio.gather(*(one_call() for _ in range(n_requests)))
+    return latencies
+
+
+async def run_shared_client(base_url: str, n_requests: int, concurrency: int) -> list:
+    """Shared pooled client from app.openai_client."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    manager = OpenAIClientManager(api_key="stub", base_url=base_url, max_retries=0)
+
+    async def one_call():
+        async with semaphore:
+            start = time.perf_counter()
+            client = manager.get_client()
+            await client.embeddings.create(input=["hello"], model="stub-embedding")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one_call() for _ in range(n_requests)))
+    await manager.aclose()
+    return latencies
+
+
+def _report(label: str, latencies: list, server: StubEmbeddingServer, elapsed: float):
+    latencies_ms = sorted(l * 1000 for l in latencies)
+    p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1]
+    print(
+        f"{label:<14} requests={server.requests_served:<5} connections={server.connections_accepted:<5} "
+        f"p50={statistics.median(latencies_ms):7.2f} ms  p95={p95:7.2f} ms  total={elapsed:6.2f} s"
+    )
+
+
+async def main(n_requests: int, concurrency: int, handshake_ms: float):
+    for label, runner in (("fresh-client", run_fresh_clients), ("shared-client", run_shared_client)):
+        server = StubEmbeddingServer(handshake_delay=handshake_ms / 1000)
+        base_url = await server.start()
+        start = time.perf_counter()
+        latencies = await runner(base_url, n_requests, concurrency)
+        elapsed = time.perf_counter() - start
+        _report(label, latencies, server, elapsed)
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OpenAI client connection reuse against a local stub server.")
+    parser.add_argument("--requests", type=int, default=200, help="Number of embedding calls per mode (default: 200).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent in-flight calls (default: 4).")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="Simulated per-connection handshake delay in ms (default: 30).")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency, args.handshake_ms))
@@ -0,0 +1,73 @@
+"""
+Benchmark: serial vs. multi-process PDF text extraction (PDFService).
+
+Extracts every page of a PDF with 1, 2, 4, ... worker processes (up to the number of cores),
+checks that each run returns exactly the serial text, and reports wall time and speedup.
+
+Usage:
+    python scripts/bench_pdf_extraction.py
+    python scripts/bench_pdf_extraction.py path/to/file.pdf --workers 1,2,4,8 --repeat 3
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.pdf_service import PDFService
+
+DEFAULT_PDF = os.path.join(project_root, "data", "raw_documents", "Fundamentals_of_Immigration_Law.pdf")
+
+
+def time_extraction(pdf_path: str, workers: int, repeat: int) -> tuple:
+    # No extracted-text cache, and handles are closed between runs, so every run really parses
+    service = PDFService(workers=workers, parallel_min_pages=1, use_text_cache=False)
+    try:
+        # Warm-up run starts the pool, so the timings below measure steady-state extraction
+        texts = service.read_pdf(pdf_path)['text_content']
+        timings = []
+        for _ in range(repeat):
+            service.close_documents()
+            start = time.perf_counter()
+            texts = service.read_pdf(pdf_path)['text_content']
+            timings.append(time.perf_counter() - start)
+    finally:
+        service.close()
+    return min(timings), texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial vs. parallel PDF text extraction benchmark.")
+    parser.add_argument("pdf_path", nargs="?", default=DEFAULT_PDF, help="PDF to extract (default: Fundamentals_of_Immigration_Law.pdf).")
+    parser.add_argument("--workers", type=str, default=None, help="Comma-separated worker counts (default: powers of two up to the core count).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per worker count (best is reported).")
+    args = parser.parse_args()
+    logging.getLogger("PyPDF2").setLevel(logging.ERROR)
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(",")]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cores:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cores:
+            worker_counts.append(cores)
+
+    print(f"{os.path.basename(args.pdf_path)} on {cores} cores, best of {args.repeat} runs\n")
+    print(f"{'workers':>8}{'seconds':>10}{'pages/s':>10}{'speedup':>9}  identical")
+    baseline_time, baseline_texts = None, None
+    for workers in worker_counts:
+        elapsed, texts = time_extraction(args.pdf_path, workers, args.repeat)
+        if baseline_time is None:
+            baseline_time, baseline_texts = elapsed, texts
+        print(f"{workers:>8}{elapsed:>10.2f}{len(texts) / elapsed:>10.1f}{baseline_time / elapsed:>9.2f}  {texts == baseline_texts}")
+
+
+if __name__ == "__main__":
+    main()
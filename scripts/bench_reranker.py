@@ -0,0 +1,82 @@
+"""
+Benchmark: re-ranking latency (app/reranker.py) per query.
+
+Builds candidate lists like those hybrid_search() returns (RAG_TOP_K chunks of a few hundred
+words, with form numbers and CFR sections mixed in) and times rerank() three ways: with the
+chunk store's pre-tokenized terms, with terms already memoized by chunk ID, and cold (every
+chunk analyzed from its text). The first is what the bot normally pays.
+
+Usage:
+    python scripts/bench_reranker.py
+    python scripts/bench_reranker.py --candidates 20 --words 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.chunk_store import TERMS_FIELD
+from app.lexical_index import analyze
+from app.reranker import LexicalOverlapReranker
+from app.vector_backends.base import VectorMatch
+from scripts.bench_lexical_index import IDENTIFIERS, make_chunk, make_query, make_vocabulary
+
+
+def make_candidates(rng: random.Random, count: int, words: int, vocabulary: tuple, query_number: int, pretokenized: bool) -> list:
+    candidates = []
+    for i in range(count):
+        text = make_chunk(rng, words, vocabulary)
+        metadata = {"original_text": text}
+        if pretokenized:
+            metadata[TERMS_FIELD] = " ".join(analyze(text))
+        candidates.append(VectorMatch(id=f"q{query_number}_chunk_{i}", score=0.9 - i * 0.01, metadata=metadata))
+    return candidates
+
+
+def time_rerank(reranker, queries: list, candidate_lists: list) -> np.ndarray:
+    latencies = []
+    for query, candidates in zip(queries, candidate_lists):
+        start = time.perf_counter()
+        reranker.rerank(query, candidates)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-ranking latency benchmark.")
+    parser.add_argument("--candidates", type=int, default=10, help="Candidates per query (RAG_TOP_K).")
+    parser.add_argument("--words", type=int, default=350, help="Words per candidate chunk.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(20000)
+    queries = [make_query(rng, vocabulary) for _ in range(args.queries)]
+    stored = [make_candidates(rng, args.candidates, args.words, vocabulary, n, pretokenized=True) for n in range(args.queries)]
+    raw = [[VectorMatch(id=f"raw_{match.id}", score=match.score, metadata={"original_text": match.metadata["original_text"]}) for match in candidates] for candidates in stored]
+
+    print(f"{args.queries} queries, {args.candidates} candidates of {args.words} words ({len(IDENTIFIERS)} identifier kinds)\n")
+    print(f"{'terms from':<26}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for label, reranker, candidate_lists in (
+        ("chunk store (pre-tokenized)", LexicalOverlapReranker(), stored),
+        ("memo (repeat candidates)", None, raw),
+        ("analyzed per query (cold)", LexicalOverlapReranker(), raw),
+    ):
+        if reranker is None:
+            reranker = LexicalOverlapReranker()
+            time_rerank(reranker, queries, candidate_lists) # Warm the memo
+        latencies = time_rerank(reranker, queries, candidate_lists)
+        print(f"{label:<26}{latencies.mean():>9.2f}{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 95):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: full vs lean parsing in ScrapingService (app/services/scraping_service.py).
+
+Generates synthetic pages shaped like the government pages we scrape (large navigation menus,
+inline scripts, a .field--name-body block with the actual text), parses them the way scrape_page()
+does in each mode and keeps every result, as a bulk crawl that collects its pages would. Each mode
+runs in its own subprocess so peak RSS (ru_maxrss) is measured independently; "RSS +MB" is the
+growth over the process's RSS after the pages were generated. The fields the two modes have in
+common are compared on a sample of pages.
+
+Usage:
+    python scripts/bench_scraping.py
+    python scripts/bench_scraping.py --pages 2000 --paragraphs 80
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.crawler import FetchResult
+from app.services.scraping_service import ScrapingService
+
+MODES = ("full", "lean")
+COMMON_FIELDS = ("title", "description", "main_content", "links")
+WORDS = (
+    "applicants must file Form I-485 with USCIS and pay the filing fee unless a fee waiver under "
+    "8 CFR 103.7 is approved before the interview at the field office"
+).split()
+
+
+def make_page(number: int, paragraphs: int, rng: random.Random) -> str:
+    menu = "".join(
+        f'<li class="menu-item"><a href="/section/{i}">Section {i}</a><ul class="menu">'
+        + "".join(f'<li class="menu-item"><a href="/section/{i}/{j}">Topic {j}</a></li>' for j in range(8))
+        + "</ul></li>"
+        for i in range(25)
+    )
+    body = "".join(
+        f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))} "
+        f"<a href='/policy/{number}/{i}'>See chapter {i}</a>.</p><!-- paragraph {i} -->"
+        for i in range(paragraphs)
+    )
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Page {number} | USCIS</title>'
+        f'<meta name="description" content="Guidance page {number}">'
+        f'<script>window.settings = {json.dumps({"path": f"/page/{number}", "menu": list(range(300))})};</script>'
+        f'<style>.menu-item {{ display: inline-block; }}</style></head><body>'
+        f'<header><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<main><div class="clearfix text-formatted field field--name-body field--type-text-with-summary">'
+        f'<h2>Overview</h2>{body}</div></main><footer><nav><ul class="menu">{menu}</ul></nav></footer></body></html>'
+    )
+
+
+def make_pages(count: int, paragraphs: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [make_page(number, paragraphs, rng) for number in range(count)]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KB on Linux
+
+
+def run_mode(mode: str, count: int, paragraphs: int) -> dict:
+    """Parses all pages in one mode, keeping the results; runs inside the child process."""
+    pages = make_pages(count, paragraphs)
+    fetched = [FetchResult(f"https://example.gov/page/{i}", f"https://example.gov/page/{i}", 200, {"content-type": "text/html"}, text, 0.0, 1)
+               for i, text in enumerate(pages)]
+    del pages
+    service = ScrapingService(use_http_cache=False)
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    results = [service._parse(page, lean=(mode == "lean")) for page in fetched]
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "pages_per_second": len(results) / elapsed,
+        "rss_growth_mb": peak_rss_mb() - baseline,
+        "peak_rss_mb": peak_rss_mb(),
+        "sample": [{field: results[i][field] for field in COMMON_FIELDS} for i in range(0, len(results), max(1, len(results) // 20))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs lean HTML parsing benchmark (throughput and peak RSS).")
+    parser.add_argument("--pages", type=int, default=500, help="Number of synthetic pages.")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Paragraphs in each page's main content.")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS) # Set on the per-mode subprocesses
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.pages, args.paragraphs)))
+        return
+
+    page_kb = len(make_page(0, args.paragraphs, random.Random(0))) / 1024
+    print(f"{args.pages} pages of ~{page_kb:.0f} KB, results kept in memory\n")
+    print(f"{'mode':>6}{'seconds':>10}{'pages/s':>10}{'RSS +MB':>10}{'peak MB':>10}")
+    reports = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode, "--pages", str(args.pages), "--paragraphs", str(args.paragraphs)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        reports[mode] = report
+        print(f"{mode:>6}{report['seconds']:>10.2f}{report['pages_per_second']:>10.1f}{report['rss_growth_mb']:>10.1f}{report['peak_rss_mb']:>10.1f}")
+
+    full, lean = reports["full"], reports["lean"]
+    print(f"\nlean: {lean['pages_per_second'] / full['pages_per_second']:.1f}x pages/s, "
+          f"{full['rss_growth_mb'] / max(lean['rss_growth_mb'], 0.1):.1f}x less memory held")
+    if full["sample"] != lean["sample"]:
+        print("WARNING: title/description/main_content/links differ between the modes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Rebuilds the BM25 lexical index (app/lexical_index.py) from the chunk store (app/chunk_store.py)
+or, when chunk text lives in vector metadata (CHUNK_STORE_ENABLED off, the default), from the
+vector store: the chunk IDs of every ingested document are read from the ingestion manifests
+and their metadata fetched in batches.
+
+Ingestion keeps the lexical index up to date as chunks are upserted; a rebuild is only needed
+for chunks ingested before hybrid retrieval existed, after the index file was lost, or after an
+ingestion run was interrupted between saving its manifest and the index.
+
+Usage:
+    python scripts/build_lexical_index.py
+    python scripts/build_lexical_index.py --source vector_store --output data/lexical_index.npz
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, List, Tuple
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.config import CHUNK_STORE_ENABLED, CHUNK_STORE_PATH, INGESTION_MANIFEST_DIR, LEXICAL_INDEX_PATH
+from app.chunk_store import ChunkStore
+from app.lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH_SIZE = 1000 # Chunk IDs requested from the vector store at a time
+
+
+def manifest_chunk_ids(manifest_dir: str = INGESTION_MANIFEST_DIR) -> List[str]:
+    """Chunk IDs of every document recorded in the ingestion manifests."""
+    chunk_ids = []
+    for path in sorted(glob.glob(os.path.join(manifest_dir, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                chunk_ids.extend(json.load(f).get("chunk_ids", []))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable manifest {path}: {e}")
+    return list(dict.fromkeys(chunk_ids))
+
+
+async def fetch_texts(chunk_ids: List[str], batch_size: int = FETCH_BATCH_SIZE) -> List[Tuple[str, str]]:
+    """(chunk_id, original_text) from vector metadata for the IDs still in the vector store."""
+    from app.vector_store import get_vector_backend
+
+    backend = get_vector_backend()
+    if not backend.is_ready() and not backend.initialize():
+        raise RuntimeError(f"Vector store ('{backend.name}') could not be initialized.")
+    texts = []
+    for start in range(0, len(chunk_ids), batch_size):
+        fetched = await backend.fetch(chunk_ids[start:start + batch_size])
+        texts.extend((chunk_id, metadata["original_text"]) for chunk_id, metadata in fetched.items() if metadata.get("original_text"))
+    if len(texts) < len(chunk_ids):
+        logger.warning(f"{len(chunk_ids) - len(texts)} of {len(chunk_ids)} manifest chunks have no text in the vector store.")
+    return texts
+
+
+def chunk_store_texts(chunk_store_path: str) -> Iterator[Tuple[str, str]]:
+    if not os.path.isfile(chunk_store_path):
+        raise FileNotFoundError(f"No chunk store at {chunk_store_path}.")
+    store = ChunkStore(chunk_store_path)
+    try:
+        yield from store.iter_texts()
+    finally:
+        store.close()
+
+
+def build_index(
+    chunk_store_path: str = CHUNK_STORE_PATH,
+    output_path: str = LEXICAL_INDEX_PATH,
+    source: str = "chunk_store" if CHUNK_STORE_ENABLED else "vector_store",
+    manifest_dir: str = INGESTION_MANIFEST_DIR,
+) -> BM25Index:
+    index = BM25Index(path=None)
+    start = time.perf_counter()
+    if source == "chunk_store":
+        index.add_many(chunk_store_texts(chunk_store_path))
+    elif source == "vector_store":
+        index.add_many(asyncio.run(fetch_texts(manifest_chunk_ids(manifest_dir))))
+    else:
+        raise ValueError(f"Unknown source '{source}'. Expected 'chunk_store' or 'vector_store'.")
+    index.path = output_path
+    index.save()
+    logger.info(f"Indexed {len(index)} chunks from the {source} in {time.perf_counter() - start:.1f}s: {index.stats()}")
+    return index
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Rebuilds the BM25 lexical index from the chunk store or the vector store.")
+    parser.add_argument("--source", choices=("chunk_store", "vector_store"), default="chunk_store" if CHUNK_STORE_ENABLED else "vector_store",
+                        help="Where chunk text is read from (default: the chunk store if CHUNK_STORE_ENABLED, else vector metadata).")
+    parser.add_argument("--chunk_store", default=CHUNK_STORE_PATH, help=f"Chunk store to read (default: {CHUNK_STORE_PATH}).")
+    parser.add_argument("--manifests", default=INGESTION_MANIFEST_DIR, help=f"Ingestion manifests listing the chunk IDs (default: {INGESTION_MANIFEST_DIR}).")
+    parser.add_argument("--output", default=LEXICAL_INDEX_PATH, help=f"Index file to write (default: {LEXICAL_INDEX_PATH}).")
+    args = parser.parse_args()
+
+    build_index(args.chunk_store, args.output, args.source, args.manifests)
@@ -1,133 +1,54 @@
 import argparse
 import asyncio
 import logging
-import re
 import os
 import sys
+from typing import Iterable
 
 # Add project root to sys.path to allow imports from 'app'
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from app.vector_store import generate_embedding, upsert_vectors, init_pinecone
-from app.config import OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME
+from app.vector_store import upsert_vectors, delete_vectors, init_vector_store
+from app.config import (
+    OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME, OPENAI_CHAT_TIMEOUT,
+    VECTOR_STORE_BACKEND,
+    CONTEXTUALIZE_INITIAL_CONCURRENCY, CONTEXTUALIZE_MAX_CONCURRENCY, CONTEXTUALIZE_MAX_RETRIES,
+    INGEST_STREAM_BATCH_SIZE, INGEST_STREAM_QUEUE_SIZE
+)
+from app.openai_client import get_openai_client, close_openai_client
+from app.lexical_index import save_lexical_index
+from app.embedding_engine import embed_texts
+from app.rate_limiter import AdaptiveConcurrencyLimiter, call_with_retries
+from app.services.pdf_service import PDFService
+from scripts.ingestion_manifest import ChunkIdGenerator, IngestionManifest, chunk_ids_for
+from app.tokenizer import TokenCounter, count_tokens
+from scripts.text_chunker import IncrementalChunker, TextChunk, iter_chunks
 import openai
 
 # --- Configuration & Setup ---
 logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
-def _estimate_tokens(text: str | int) -> int:
-    """Estimates token count based on 1 token ~ 4 characters."""
-    if isinstance(text, int):
-        return text // 4
-    if not text:
-        return 0
-    return len(text) // 4
-
-def chunk_text(text: str, chunk_size_upper_tokens: int, chunk_size_lower_tokens: int) -> list[str]:
+def chunk_text(
+    text: str,
+    chunk_size_upper_tokens: int,
+    chunk_size_lower_tokens: int,
+    token_counter: TokenCounter | None = None,
+) -> list[str]:
     """
     Chunks text, prioritizing paragraph breaks, then sentence breaks,
-    while respecting upper and lower token limits.
+    while respecting upper and lower token limits. Tokens are counted with the
+    embedding model's encoding unless another `token_counter` is given.
     """
     logger.info(f"Chunking text. Upper_limit: {chunk_size_upper_tokens} tokens, Lower_limit: {chunk_size_lower_tokens} tokens.")
-    
-    final_chunks = []
+
     if not text.strip():
         logger.warning("Input text is empty or whitespace only.")
-        return final_chunks
-
-    # Split by paragraphs (one or more blank lines)
-    paragraphs = re.split(r'\n\s*\n+', text.strip())
-    paragraphs = [p.strip() for p in paragraphs if p.strip()]
-
-    current_chunk_parts = []
-    current_chunk_char_count = 0
-
-    for i, paragraph in enumerate(paragraphs):
-        paragraph_char_count = len(paragraph)
-        paragraph_tokens = _estimate_tokens(paragraph)
-
-        # If current paragraph itself is larger than upper limit, it needs to be split by sentences
-        if paragraph_tokens > chunk_size_upper_tokens:
-            # Finalize any existing current_chunk_parts before processing the large paragraph
-            if current_chunk_parts:
-                assembled_chunk = "\n\n".join(current_chunk_parts)
-                if _estimate_tokens(assembled_chunk) >= chunk_size_lower_tokens or not final_chunks: # Keep if substantial or only one
-                    final_chunks.append(assembled_chunk)
-                elif final_chunks: # Try to append to last chunk if it doesn't make it too big
-                    if _estimate_tokens(final_chunks[-1] + "\n\n" + assembled_chunk) <= chunk_size_upper_tokens:
-                        final_chunks[-1] += "\n\n" + assembled_chunk
-                    else:
-                        final_chunks.append(assembled_chunk) # Add as its own if cannot append
-                current_chunk_parts = []
-                current_chunk_char_count = 0
-            
-            # Split the large paragraph by sentences
-            # Regex: looks for . ! ? followed by a space or newline. Not perfect for all cases (e.g. Mr. Smith).
-            sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-            sentences = [s.strip() for s in sentences if s.strip()]
-            
-            temp_sentence_chunk_parts = []
-            temp_sentence_char_count = 0
-            for sentence in sentences:
-                sentence_char_count = len(sentence)
-                if _estimate_tokens(temp_sentence_char_count + sentence_char_count) <= chunk_size_upper_tokens:
-                    temp_sentence_chunk_parts.append(sentence)
-                    temp_sentence_char_count += sentence_char_count + 1 # +1 for space
-                else:
-                    if temp_sentence_chunk_parts: # Finalize current sentence group
-                        final_chunks.append(" ".join(temp_sentence_chunk_parts))
-                    temp_sentence_chunk_parts = [sentence] # Start new group with current sentence
-                    temp_sentence_char_count = sentence_char_count
-            
-            if temp_sentence_chunk_parts: # Add any remaining sentence group
-                final_chunks.append(" ".join(temp_sentence_chunk_parts))
-            continue # Move to the next paragraph
-
-        # Try to add current paragraph to current_chunk_parts
-        if _estimate_tokens(current_chunk_char_count + paragraph_char_count) <= chunk_size_upper_tokens:
-            current_chunk_parts.append(paragraph)
-            current_chunk_char_count += paragraph_char_count + (len("\n\n") if current_chunk_parts else 0)
-        else:
-            # Finalize current_chunk_parts as it's full
-            if current_chunk_parts:
-                final_chunks.append("\n\n".join(current_chunk_parts))
-            # Start new chunk with current paragraph
-            current_chunk_parts = [paragraph]
-            current_chunk_char_count = paragraph_char_count
-
-        # If current_chunk is "full enough" (>= lower_tokens), finalize it
-        if _estimate_tokens(current_chunk_char_count) >= chunk_size_lower_tokens:
-            if current_chunk_parts:
-                final_chunks.append("\n\n".join(current_chunk_parts))
-                current_chunk_parts = []
-                current_chunk_char_count = 0
-    
-    # Add any remaining parts in current_chunk_parts
-    if current_chunk_parts:
-        final_chunks.append("\n\n".join(current_chunk_parts))
-
-    # Post-processing: Attempt to merge small chunks if they are below lower_token_limit
-    merged_chunks = []
-    i = 0
-    while i < len(final_chunks):
-        current_merged_chunk = final_chunks[i]
-        current_merged_tokens = _estimate_tokens(current_merged_chunk)
-        i += 1
-        # If current chunk is too small, try to merge with next ones
-        while current_merged_tokens < chunk_size_lower_tokens and i < len(final_chunks):
-            next_chunk_tokens = _estimate_tokens(final_chunks[i])
-            if current_merged_tokens + next_chunk_tokens <= chunk_size_upper_tokens:
-                current_merged_chunk += "\n\n" + final_chunks[i] # Assuming paragraph merge
-                current_merged_tokens += next_chunk_tokens
-                i += 1
-            else:
-                break # Next chunk makes it too big
-        merged_chunks.append(current_merged_chunk)
-    
-    final_chunks = [chunk for chunk in merged_chunks if chunk.strip()] # Ensure no empty chunks
+        return []
+
+    final_chunks = [chunk.text for chunk in iter_chunks(text, chunk_size_upper_tokens, chunk_size_lower_tokens, token_counter)]
     logger.info(f"Generated {len(final_chunks)} final chunks after attempting merges.")
     return final_chunks
 
@@ -136,8 +57,14 @@ async def contextualize_chunk_with_gpt(
     current_chunk_text: str,
     document_context: str,
     preceding_chunk_text: str | None = None,
-    succeeding_chunk_text: str | None = None
+    succeeding_chunk_text: str | None = None,
+    limiter: AdaptiveConcurrencyLimiter | None = None
 ) -> str:
+    """
+    Asks GPT for a short contextual summary of one chunk.
+    When a limiter is given, the call runs inside it and rate limits / transient errors are
+    retried with backoff there (the client's own retries are disabled so the limiter sees every 429).
+    """
     if not openai.api_key: # Check if API key was set
         logger.error("OpenAI API key not set. Cannot contextualize chunk.")
         return "Error: OpenAI API key not configured."
@@ -156,15 +83,25 @@ Succeeding Chunk (if any): "{succeeding_chunk_text if succeeding_chunk_text else
 Based on the document context and the surrounding text (previous, current, and next chunks), briefly explain the main topic or add key contextual details specifically for the "Current Chunk". Focus on information that would help understand this "Current Chunk" in relation to the larger document and its immediate neighbors. Provide only the contextual explanation for the "Current Chunk".
         """}
     ]
-    try:
-        # Using new OpenAI API format (v1.0.0+)
-        client = openai.AsyncOpenAI(api_key=openai.api_key)
-        response = await client.chat.completions.create(
+
+    async def request_contextualization():
+        # Using new OpenAI API format (v1.0.0+) through the shared, pooled client
+        client = get_openai_client()
+        if limiter:
+            client = client.with_options(max_retries=0)
+        return await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=prompt_messages,
             temperature=0.3, 
-            max_tokens=200  # Increased slightly for potentially richer context
+            max_tokens=200,  # Increased slightly for potentially richer context
+            timeout=OPENAI_CHAT_TIMEOUT
         )
+
+    try:
+        if limiter:
+            response = await call_with_retries(limiter, request_contextualization, max_retries=CONTEXTUALIZE_MAX_RETRIES)
+        else:
+            response = await request_contextualization()
         contextualization = response.choices[0].message.content.strip()
         logger.info(f"Contextualized chunk (first 30 chars): '{current_chunk_text[:30]}...' -> '{contextualization[:50]}...'")
         return contextualization
@@ -173,66 +110,129 @@ Based on the document context and the surrounding text (previous, current, and n
         return f"Error during contextualization: {str(e)}"
 
 
-async def process_document_pipeline(text_content: str, chunk_size_upper: int, chunk_size_lower: int, doc_context: str):
-    logger.info("Starting document processing pipeline...")
+async def contextualize_chunks(
+    chunks: list[str],
+    document_context: str,
+    indices: list[int] | None = None,
+    initial_concurrency: int = CONTEXTUALIZE_INITIAL_CONCURRENCY,
+    max_concurrency: int = CONTEXTUALIZE_MAX_CONCURRENCY
+) -> list[str]:
+    """
+    Contextualizes chunks concurrently under an adaptive (AIMD) limit.
+    Only the chunks at `indices` are sent (default: all of them); neighbours are still
+    taken from the full chunk list. Returns the summaries in the order of `indices`.
+    """
+    if indices is None:
+        indices = list(range(len(chunks)))
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=min(initial_concurrency, max_concurrency),
+        max_limit=max_concurrency,
+        name="contextualize"
+    )
+    logger.info(f"Contextualizing {len(indices)} chunks (concurrency {limiter.limit} -> max {max_concurrency})...")
+    return await asyncio.gather(*(
+        contextualize_chunk_with_gpt(
+            chunks[i],
+            document_context,
+            chunks[i-1] if i > 0 else None,
+            chunks[i+1] if i < len(chunks) - 1 else None,
+            limiter=limiter
+        )
+        for i in indices
+    ))
+
 
-    if not all([PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME]) or \
-       PINECONE_API_KEY == "YOUR_PINECONE_API_KEY_PLACEHOLDER":
+def _prepare_vector_store() -> bool:
+    """Checks the configuration and initializes the vector store. Returns False if the pipeline should abort."""
+    if VECTOR_STORE_BACKEND == "pinecone" and (
+        not all([PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME]) or
+        PINECONE_API_KEY == "YOUR_PINECONE_API_KEY_PLACEHOLDER"
+    ):
         logger.error("Pinecone credentials not fully configured. Aborting.")
-        return
+        return False
+    if not init_vector_store(): 
+        logger.error(f"Failed to initialize the '{VECTOR_STORE_BACKEND}' vector store. Aborting pipeline.")
+        return False
+    logger.info(f"Vector store '{VECTOR_STORE_BACKEND}' initialized successfully.")
+    return True
+
 
-    # 1. Initialize Pinecone (ensure it's ready)
-    if not init_pinecone(): 
-        logger.error("Failed to initialize Pinecone. Aborting pipeline.")
-        return
-    logger.info("Pinecone initialized successfully.")
+async def process_document_pipeline(
+    text_content: str,
+    chunk_size_upper: int,
+    chunk_size_lower: int,
+    doc_context: str,
+    source_id: str | None = None,
+    force_full: bool = False
+):
+    """
+    Chunks, contextualizes, embeds and upserts one document.
+
+    Chunk IDs are content-addressed (see scripts/ingestion_manifest.py) and the IDs currently
+    in the index are recorded in a per-document manifest keyed by `source_id` (defaults to
+    `doc_context`). On re-ingest only new or changed chunks are contextualized, embedded and
+    upserted, and vectors for chunks that no longer exist are deleted.
+
+    Returns True when the index now holds exactly the document's current chunks (False if the
+    pipeline aborted or some upserts/deletes failed and will be retried on the next run).
+    """
+    logger.info("Starting document processing pipeline...")
+    source_id = source_id or doc_context
+
+    # 1. Initialize the vector store (ensure it's ready)
+    if not _prepare_vector_store():
+        return False
 
     # 2. Chunk text
     logger.info("Chunking text...")
     chunks = chunk_text(text_content, chunk_size_upper, chunk_size_lower)
     if not chunks:
         logger.warning("No chunks were generated from the text.")
-        return
+        return False
     logger.info(f"Generated {len(chunks)} chunks.")
 
-    vectors_to_upsert = []
-    for i, chunk_text_original in enumerate(chunks):
-        logger.info(f"Processing chunk {i+1}/{len(chunks)} (length: {len(chunk_text_original)} chars)...")
-
-        preceding_chunk = chunks[i-1] if i > 0 else None
-        succeeding_chunk = chunks[i+1] if i < len(chunks) - 1 else None
-        
-        logger.debug(f"Contextualizing chunk {i+1}...")
-        contextualized_summary = await contextualize_chunk_with_gpt(
-            chunk_text_original,
-            doc_context,
-            preceding_chunk,
-            succeeding_chunk
+    # 3. Diff against the ingestion manifest
+    manifest = IngestionManifest.load(source_id)
+    chunk_ids = chunk_ids_for(source_id, chunks)
+    new_ids, unchanged_ids, removed_ids = manifest.diff(chunk_ids)
+    if force_full:
+        new_ids, unchanged_ids = set(chunk_ids), set()
+    pending = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in new_ids]
+    logger.info(f"Manifest diff for '{source_id}': {len(pending)} new/changed, {len(unchanged_ids)} unchanged, {len(removed_ids)} removed.")
+
+    # 4. Contextualize (concurrent, rate-limited) and embed (packed batches) the new chunks at once
+    contextualized_summaries, embeddings = [], []
+    if pending:
+        logger.info(f"Contextualizing and embedding {len(pending)} chunks...")
+        contextualized_summaries, embeddings = await asyncio.gather(
+            contextualize_chunks(chunks, doc_context, pending),
+            embed_texts([chunks[i] for i in pending])
         )
 
-        logger.debug(f"Generating embedding for original chunk {i+1}...")
-        embedding = await generate_embedding(chunk_text_original) 
+    vectors_to_upsert = []
+    for i, contextualized_summary, embedding in zip(pending, contextualized_summaries, embeddings):
+        chunk_text_original = chunks[i]
+        chunk_id = chunk_ids[i]
+        logger.debug(f"Preparing chunk {i+1}/{len(chunks)} (length: {len(chunk_text_original)} chars)...")
 
         if embedding:
-            # Create a more robust unique ID
-            doc_hash = hash(doc_context[:10] + text_content[:10]) # Simple hash of doc context and start of text
-            chunk_id = f"doc_{doc_hash}_chunk_{i}"
-            
             metadata = {
                 "original_text": chunk_text_original,
                 "contextualized_summary": contextualized_summary,
                 "document_context": doc_context,
                 "chunk_index": i,
                 "total_chunks": len(chunks),
-                "estimated_tokens": _estimate_tokens(chunk_text_original)
+                "estimated_tokens": count_tokens(chunk_text_original)
             }
             vectors_to_upsert.append((chunk_id, embedding, metadata))
-            logger.info(f"Prepared vector for chunk {i+1} (ID: {chunk_id}).")
+            logger.debug(f"Prepared vector for chunk {i+1} (ID: {chunk_id}).")
         else:
             logger.warning(f"Failed to generate embedding for chunk {i+1}. Skipping.")
 
+    # 5. Upsert new/changed chunks
+    upserted_ids = set()
     if vectors_to_upsert:
-        logger.info(f"Upserting {len(vectors_to_upsert)} vectors to Pinecone...")
+        logger.info(f"Upserting {len(vectors_to_upsert)} vectors to the vector store...")
         upsert_responses = await upsert_vectors(vectors_to_upsert) 
         if upsert_responses:
             total_upserted = 0
@@ -240,23 +240,198 @@ async def process_document_pipeline(text_content: str, chunk_size_upper: int, ch
             # Assuming it's a list of responses, each with an 'upserted_count'
             if isinstance(upsert_responses, list) and upsert_responses and hasattr(upsert_responses[0], 'upserted_count'):
                  total_upserted = sum(res.upserted_count for res in upsert_responses)
-            logger.info(f"Successfully upserted {total_upserted} vectors to Pinecone (details may vary by client version).")
+            logger.info(f"Successfully upserted {total_upserted} vectors (details may vary by backend/client version).")
+            upserted_ids = {chunk_id for chunk_id, _, _ in vectors_to_upsert}
         else:
-            logger.error("Failed to upsert vectors to Pinecone or no response received.")
+            logger.error("Failed to upsert vectors to the vector store or no response received.")
     else:
         logger.info("No vectors to upsert.")
+
+    # 6. Delete vectors of chunks that no longer exist
+    still_present = set()
+    if removed_ids:
+        logger.info(f"Deleting {len(removed_ids)} stale vectors from the vector store...")
+        if not await delete_vectors(ids=sorted(removed_ids)):
+            logger.error("Failed to delete stale vectors; they stay in the manifest and will be retried next run.")
+            still_present = removed_ids
+
+    # 7. Record what is now in the index (failed upserts are retried on the next run)
+    manifest.save([chunk_id for chunk_id in chunk_ids if chunk_id in unchanged_ids or chunk_id in upserted_ids] + sorted(still_present))
     
     logger.info("Document processing pipeline finished.")
+    return not still_present and upserted_ids == {chunk_ids[i] for i in pending}
+
+async def remove_document(source_id: str) -> bool:
+    """
+    Deletes every vector of a source document (as recorded in its ingestion manifest) and the
+    manifest itself. Returns False if the deletion failed; the manifest is then kept for a retry.
+    """
+    if not _prepare_vector_store():
+        return False
+    manifest = IngestionManifest.load(source_id)
+    if manifest.chunk_ids:
+        logger.info(f"Deleting {len(manifest.chunk_ids)} vectors of removed document '{source_id}'...")
+        if not await delete_vectors(ids=list(manifest.chunk_ids)):
+            logger.error(f"Failed to delete the vectors of '{source_id}'; they will be retried next run.")
+            return False
+    manifest.remove()
+    return True
+
+
+async def process_pages_pipeline(
+    pages: Iterable[tuple[int, str]],
+    chunk_size_upper: int,
+    chunk_size_lower: int,
+    doc_context: str,
+    source_id: str,
+    force_full: bool = False,
+    batch_size: int = INGEST_STREAM_BATCH_SIZE,
+    queue_size: int = INGEST_STREAM_QUEUE_SIZE
+):
+    """
+    Streaming variant of process_document_pipeline for documents delivered page by page
+    (e.g. PDFService.iter_pages). Three stages run concurrently, connected by bounded queues:
+
+      extract/chunk -> contextualize + embed (in batches of `batch_size`) -> upsert
+
+    Pages are pulled from `pages` on a worker thread and chunked incrementally, so memory use
+    does not grow with the document and embedding starts after the first few pages. Chunk
+    metadata carries `page_start`/`page_end`; `total_chunks` is not known up front and is omitted.
+    Manifest handling and the return value are the same as in process_document_pipeline.
+    """
+    logger.info(f"Starting streaming pipeline for '{source_id}'...")
+    if not _prepare_vector_store():
+        return False
+
+    manifest = IngestionManifest.load(source_id)
+    previous_ids = set(manifest.chunk_ids)
+    id_generator = ChunkIdGenerator(source_id)
+    chunker = IncrementalChunker(chunk_size_upper, chunk_size_lower)
+    limiter = AdaptiveConcurrencyLimiter(
+        initial_limit=min(CONTEXTUALIZE_INITIAL_CONCURRENCY, CONTEXTUALIZE_MAX_CONCURRENCY),
+        max_limit=CONTEXTUALIZE_MAX_CONCURRENCY,
+        name="contextualize"
+    )
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size * batch_size)
+    vector_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    seen_ids: list[str] = []      # Every chunk ID of the current version, in document order
+    upserted_ids: set[str] = set()
+    stats = {"pages": 0, "chunks": 0, "pending": 0}
+
+    async def extract_stage():
+        page_iterator = iter(pages)
+        while True:
+            # PDF parsing is blocking CPU work; keep it off the event loop
+            page = await asyncio.to_thread(next, page_iterator, None)
+            chunks = chunker.feed(page[1], page[0]) if page is not None else chunker.finish()
+            for chunk in chunks:
+                await chunk_queue.put(chunk)
+            if page is None:
+                break
+            stats["pages"] += 1
+        await chunk_queue.put(None)
+
+    async def embed_batch(batch: list[tuple[int, str, TextChunk, TextChunk | None, TextChunk | None]]):
+        summaries, embeddings = await asyncio.gather(
+            asyncio.gather(*(
+                contextualize_chunk_with_gpt(
+                    chunk.text, doc_context,
+                    previous.text if previous else None,
+                    following.text if following else None,
+                    limiter=limiter
+                )
+                for _, _, chunk, previous, following in batch
+            )),
+            embed_texts([chunk.text for _, _, chunk, _, _ in batch])
+        )
+        vectors = []
+        for (index, chunk_id, chunk, _, _), summary, embedding in zip(batch, summaries, embeddings):
+            if not embedding:
+                logger.warning(f"Failed to generate embedding for chunk {index + 1} (pages {chunk.page_start}-{chunk.page_end}). Skipping.")
+                continue
+            vectors.append((chunk_id, embedding, {
+                "original_text": chunk.text,
+                "contextualized_summary": summary,
+                "document_context": doc_context,
+                "chunk_index": index,
+                "page_start": chunk.page_start,
+                "page_end": chunk.page_end,
+                "estimated_tokens": count_tokens(chunk.text)
+            }))
+        if vectors:
+            await vector_queue.put(vectors)
+
+    async def embed_stage():
+        # A chunk is contextualized with its neighbours, so it is held until the next one arrives
+        previous: TextChunk | None = None
+        current: TextChunk | None = None
+        batch = []
+        while True:
+            following = await chunk_queue.get()
+            if current is not None:
+                index = len(seen_ids)
+                chunk_id = id_generator.next_id(current.text)
+                seen_ids.append(chunk_id)
+                if force_full or chunk_id not in previous_ids:
+                    batch.append((index, chunk_id, current, previous, following))
+                    stats["pending"] += 1
+                if len(batch) >= batch_size or (following is None and batch):
+                    await embed_batch(batch)
+                    batch = []
+            if following is None:
+                break
+            previous, current = current, following
+            stats["chunks"] += 1
+        await vector_queue.put(None)
+
+    async def upsert_stage():
+        while True:
+            vectors = await vector_queue.get()
+            if vectors is None:
+                break
+            if await upsert_vectors(vectors):
+                upserted_ids.update(chunk_id for chunk_id, _, _ in vectors)
+            else:
+                logger.error(f"Failed to upsert a batch of {len(vectors)} vectors; they will be retried on the next run.")
+
+    stages = [asyncio.create_task(stage()) for stage in (extract_stage, embed_stage, upsert_stage)]
+    try:
+        await asyncio.gather(*stages)
+    except Exception:
+        for stage in stages:
+            stage.cancel()
+        raise
+    logger.info(
+        f"Streamed {stats['pages']} pages into {stats['chunks']} chunks; "
+        f"{stats['pending']} new/changed, {len(upserted_ids)} upserted."
+    )
+
+    # Delete vectors of chunks that no longer exist, then record what is now in the index
+    current_ids = set(seen_ids)
+    removed_ids = previous_ids - current_ids
+    still_present = set()
+    if removed_ids:
+        logger.info(f"Deleting {len(removed_ids)} stale vectors from the vector store...")
+        if not await delete_vectors(ids=sorted(removed_ids)):
+            logger.error("Failed to delete stale vectors; they stay in the manifest and will be retried next run.")
+            still_present = removed_ids
+    unchanged_ids = set() if force_full else current_ids & previous_ids
+    manifest.save([chunk_id for chunk_id in seen_ids if chunk_id in unchanged_ids or chunk_id in upserted_ids] + sorted(still_present))
+    logger.info("Streaming pipeline finished.")
+    return not still_present and len(upserted_ids) == stats["pending"]
+
 
 # --- Main Execution ---
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s')
 
-    parser = argparse.ArgumentParser(description="Chunks text, contextualizes with GPT, embeds, and upserts to Pinecone.")
-    parser.add_argument("text_input", help="Raw text string or path to a text file (UTF-8 encoded).")
+    parser = argparse.ArgumentParser(description="Chunks text, contextualizes with GPT, embeds, and upserts to the vector store (Pinecone or local).")
+    parser.add_argument("text_input", help="Raw text string, path to a text file (UTF-8 encoded), or path to a PDF (streamed page by page).")
     parser.add_argument("--chunk_size_upper", type=int, required=True, help="Upper limit for chunk size in tokens (e.g., 500).")
     parser.add_argument("--chunk_size_lower", type=int, default=100, help="Lower limit for chunk size in tokens (default: 100).")
     parser.add_argument("--document_context", type=str, required=True, help="Overall context/summary for the document.")
+    parser.add_argument("--source_id", type=str, default=None, help="Stable identifier of the source document for incremental re-ingestion (default: the input file name, or the document context).")
+    parser.add_argument("--force_full", action="store_true", help="Re-embed and upsert every chunk, ignoring the ingestion manifest.")
     
     args = parser.parse_args()
 
@@ -266,7 +441,13 @@ if __name__ == "__main__":
     openai.api_key = OPENAI_API_KEY # Set for pre-v1.0 openai library
 
     text_content = ""
-    if os.path.isfile(args.text_input):
+    source_id = args.source_id
+    is_pdf = os.path.isfile(args.text_input) and args.text_input.lower().endswith(".pdf")
+    if is_pdf:
+        # PDFs are streamed page by page (see process_pages_pipeline)
+        source_id = source_id or os.path.basename(args.text_input)
+    elif os.path.isfile(args.text_input):
+        source_id = source_id or os.path.basename(args.text_input)
         try:
             with open(args.text_input, 'r', encoding='utf-8') as f:
                 text_content = f.read()
@@ -278,7 +459,7 @@ if __name__ == "__main__":
         text_content = args.text_input 
         logging.info("Using provided string as text input.")
 
-    if not text_content.strip():
+    if not is_pdf and not text_content.strip():
         logging.error("Input text is empty. Nothing to process.")
         sys.exit(1)
     
@@ -286,9 +467,28 @@ if __name__ == "__main__":
         logging.error(f"chunk_size_lower ({args.chunk_size_lower}) must be less than chunk_size_upper ({args.chunk_size_upper}).")
         sys.exit(1)
 
-    asyncio.run(process_document_pipeline(
-        text_content,
-        args.chunk_size_upper,
-        args.chunk_size_lower,
-        args.document_context
-    ))
\ No newline at end of file
+    async def run_pipeline():
+        try:
+            if is_pdf:
+                await process_pages_pipeline(
+                    PDFService().iter_pages(args.text_input),
+                    args.chunk_size_upper,
+                    args.chunk_size_lower,
+                    args.document_context,
+                    source_id=source_id,
+                    force_full=args.force_full
+                )
+            else:
+                await process_document_pipeline(
+                    text_content,
+                    args.chunk_size_upper,
+                    args.chunk_size_lower,
+                    args.document_context,
+                    source_id=source_id,
+                    force_full=args.force_full
+                )
+        finally:
+            save_lexical_index()
+            await close_openai_client()
+
+    asyncio.run(run_pipeline())
\ No newline at end of file
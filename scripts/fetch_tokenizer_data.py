@@ -0,0 +1,71 @@
+"""
+Downloads BPE ranks files into TOKENIZER_DATA_DIR so token counting works offline (see app/tokenizer.py).
+
+Each file is checked against its published sha256 before it is written. cl100k_base (embedding
+models, gpt-4 / gpt-3.5) is bundled with the repository; o200k_base (gpt-4o, gpt-4.1, o-series)
+can be added with this script.
+
+Usage:
+    python scripts/fetch_tokenizer_data.py                 # encodings of the configured models
+    python scripts/fetch_tokenizer_data.py o200k_base cl100k_base
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+
+import requests
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.config import EMBEDDING_MODEL_NAME, GPT4_MODEL_NAME, TOKENIZER_DATA_DIR
+from app.tokenizer import ENCODING_SPECS, encoding_name_for_model
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_encoding(name: str, data_dir: str = TOKENIZER_DATA_DIR, force: bool = False) -> bool:
+    spec = ENCODING_SPECS[name]
+    path = os.path.join(data_dir, f"{name}.tiktoken")
+    if os.path.exists(path) and not force:
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).hexdigest() == spec["sha256"]:
+                logger.info(f"{name}: already present at {path}")
+                return True
+    logger.info(f"{name}: downloading {spec['url']}")
+    try:
+        response = requests.get(spec["url"], timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"{name}: download failed: {e}")
+        return False
+    digest = hashlib.sha256(response.content).hexdigest()
+    if digest != spec["sha256"]:
+        logger.error(f"{name}: sha256 mismatch (got {digest}, expected {spec['sha256']}); not saved.")
+        return False
+    os.makedirs(data_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    logger.info(f"{name}: saved {len(response.content)} bytes to {path}")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Download tokenizer data for offline token counting.")
+    parser.add_argument("encodings", nargs="*", help=f"Encodings to fetch (choices: {', '.join(ENCODING_SPECS)}; default: those of the configured models).")
+    parser.add_argument("--force", action="store_true", help="Download even if a valid file is already present.")
+    args = parser.parse_args()
+
+    names = args.encodings or sorted({encoding_name_for_model(EMBEDDING_MODEL_NAME), encoding_name_for_model(GPT4_MODEL_NAME)})
+    unknown = [name for name in names if name not in ENCODING_SPECS]
+    if unknown:
+        parser.error(f"Unknown encoding(s): {', '.join(unknown)}")
+    ok = all([fetch_encoding(name, force=args.force) for name in names])
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.config import INGESTION_MANIFEST_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def document_key(source_id: str) -> str:
+    """Stable short key for a source document (e.g. a file name or URL)."""
+    return hashlib.sha256(source_id.encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkIdGenerator:
+    """
+    Content-addressed, process-independent chunk IDs, assigned one chunk at a time.
+    The ID depends only on the source document and the chunk text; a text that repeats
+    within one document gets an occurrence suffix so IDs stay unique.
+    """
+
+    def __init__(self, source_id: str):
+        self.doc_key = document_key(source_id)
+        self._seen: dict[str, int] = {}
+
+    def next_id(self, chunk: str) -> str:
+        content_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+        occurrence = self._seen.get(content_hash, 0)
+        self._seen[content_hash] = occurrence + 1
+        return f"doc_{self.doc_key}_chunk_{content_hash}" + (f"_{occurrence}" if occurrence else "")
+
+
+def chunk_ids_for(source_id: str, chunks: list[str]) -> list[str]:
+    """IDs for a whole chunked document (see ChunkIdGenerator)."""
+    generator = ChunkIdGenerator(source_id)
+    return [generator.next_id(chunk) for chunk in chunks]
+
+
+class IngestionManifest:
+    """
+    Local record of which chunk IDs of one source document are currently in the vector index.
+    Stored as JSON in INGESTION_MANIFEST_DIR, one file per source document.
+    """
+
+    def __init__(self, source_id: str, manifest_dir: str = INGESTION_MANIFEST_DIR):
+        self.source_id = source_id
+        self.doc_key = document_key(source_id)
+        self.path = os.path.join(manifest_dir, f"{self.doc_key}.json")
+        self.chunk_ids: list[str] = []
+        self.updated_at: float | None = None
+
+    @classmethod
+    def load(cls, source_id: str, manifest_dir: str = INGESTION_MANIFEST_DIR) -> "IngestionManifest":
+        manifest = cls(source_id, manifest_dir)
+        if os.path.isfile(manifest.path):
+            try:
+                with open(manifest.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                manifest.chunk_ids = list(data.get("chunk_ids", []))
+                manifest.updated_at = data.get("updated_at")
+                logger.info(f"Loaded ingestion manifest for '{source_id}' ({len(manifest.chunk_ids)} chunks).")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read manifest {manifest.path}: {e}. Treating document as new.")
+        return manifest
+
+    def diff(self, current_ids: list[str]) -> tuple[set[str], set[str], set[str]]:
+        """Returns (new_ids, unchanged_ids, removed_ids) of the current chunking against the manifest."""
+        previous, current = set(self.chunk_ids), set(current_ids)
+        return current - previous, current & previous, previous - current
+
+    def save(self, chunk_ids: list[str]):
+        """Atomically writes the manifest with the given chunk IDs."""
+        self.chunk_ids = list(chunk_ids)
+        self.updated_at = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "source_id": self.source_id,
+                "doc_key": self.doc_key,
+                "updated_at": self.updated_at,
+                "chunk_ids": self.chunk_ids,
+            }, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Deletes the manifest file (once the document's vectors are gone from the index)."""
+        self.chunk_ids = []
+        if os.path.isfile(self.path):
+            os.remove(self.path)
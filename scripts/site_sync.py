@@ -0,0 +1,339 @@
+"""
+Incremental site sync: keeps the vector index in step with a website's sitemaps.
+
+Each run reads the configured sitemap.xml files (following sitemap indexes) and compares every
+listed URL's <lastmod> with a local state file (SITE_SYNC_STATE_PATH):
+
+  - new URLs, and URLs whose lastmod changed (or that have no lastmod), are fetched with bounded
+    concurrency (per-host politeness and the conditional HTTP cache of ScrapingService apply);
+    their .field--name-body text goes through process_document_pipeline (chunk, contextualize,
+    embed, upsert), which only embeds the chunks that changed;
+  - pages whose body text is unchanged since the last sync are recorded without re-ingesting;
+  - URLs that are no longer listed have their vectors deleted, using their ingestion manifests.
+
+With --match only the matching URLs are fetched; pages synced earlier that fall outside the
+pattern stay in the index unless --prune_unmatched is given.
+
+A URL is recorded in the state file only once its pipeline has succeeded, and the file is saved
+every SITE_SYNC_CHECKPOINT_EVERY pages, so an interrupted run resumes where it left off. Removals
+are skipped when a sitemap could not be read, so a failed fetch never empties the index.
+
+Usage:
+    python scripts/site_sync.py https://www.example.gov/sitemap.xml
+    python scripts/site_sync.py --dry_run           # sitemaps from SITE_SYNC_SITEMAPS
+    python scripts/site_sync.py --match "/policy-manual/" --workers 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.config import (
+    SITE_SYNC_SITEMAPS, SITE_SYNC_STATE_PATH, SITE_SYNC_WORKERS, SITE_SYNC_CHECKPOINT_EVERY,
+    SITE_SYNC_CHUNK_SIZE_UPPER, SITE_SYNC_CHUNK_SIZE_LOWER
+)
+from app.openai_client import close_openai_client
+from app.lexical_index import save_lexical_index
+from app.services.crawler import CrawlError, normalize_url
+from app.services.scraping_service import ScrapingService, extract_main_text
+from scripts.chunker_pipeline import process_document_pipeline, remove_document
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_MAX_DEPTH = 3 # Levels of nested sitemap indexes that are followed
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+
+@dataclass
+class SitemapEntry:
+    url: str
+    lastmod: Optional[str] = None
+
+
+def _local_name(element) -> str:
+    return etree.QName(element).localname
+
+
+def parse_sitemap(xml: str) -> Tuple[List[SitemapEntry], List[str]]:
+    """(page entries, child sitemap URLs) of a <urlset> or <sitemapindex> document."""
+    # The declaration's encoding no longer applies to an already decoded string
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = etree.fromstring(XML_DECLARATION.sub("", xml, count=1), parser)
+    if root is None:
+        raise ValueError("not an XML document")
+
+    entries, sitemaps = [], []
+    for item in root:
+        if not isinstance(item.tag, str): # Comments and processing instructions
+            continue
+        fields = {_local_name(child): (child.text or "").strip() for child in item if isinstance(child.tag, str)}
+        if not fields.get("loc"):
+            continue
+        if _local_name(root) == "sitemapindex":
+            sitemaps.append(fields["loc"])
+        elif _local_name(root) == "urlset":
+            entries.append(SitemapEntry(fields["loc"], fields.get("lastmod") or None))
+    return entries, sitemaps
+
+
+async def read_sitemaps(service: ScrapingService, sitemap_urls: List[str]) -> Tuple[Dict[str, SitemapEntry], bool]:
+    """
+    All page entries of `sitemap_urls` and the sitemaps they index, keyed by normalized URL.
+    The flag is False if any sitemap could not be fetched or parsed (the listing is incomplete).
+    """
+    entries: Dict[str, SitemapEntry] = {}
+    complete = True
+    seen = set()
+    level = [normalize_url(url) for url in sitemap_urls]
+    for depth in range(SITEMAP_MAX_DEPTH + 1):
+        level = [url for url in dict.fromkeys(level) if url not in seen]
+        if not level:
+            break
+        seen.update(level)
+        if depth == SITEMAP_MAX_DEPTH:
+            logger.warning(f"Not following {len(level)} sitemaps nested more than {SITEMAP_MAX_DEPTH} levels deep.")
+            complete = False
+            break
+        responses = await asyncio.gather(
+            *(service.scrape_page_async(url, lean=True, include_html=True) for url in level), return_exceptions=True
+        )
+        next_level = []
+        for url, response in zip(level, responses):
+            try:
+                if isinstance(response, BaseException):
+                    raise response
+                page_entries, children = parse_sitemap(response['content'] or "")
+            except (CrawlError, ValueError, etree.XMLSyntaxError) as e:
+                logger.error(f"Could not read sitemap {url}: {e}")
+                complete = False
+                continue
+            logger.info(f"Sitemap {url}: {len(page_entries)} URLs, {len(children)} nested sitemaps.")
+            for entry in page_entries:
+                entry.url = normalize_url(entry.url)
+                entries[entry.url] = entry
+            next_level.extend(normalize_url(child, url) for child in children)
+        level = next_level
+    return entries, complete
+
+
+class SyncState:
+    """
+    What the last successful sync of each URL ingested: its sitemap lastmod and the hash of its
+    body text. Stored as one JSON file, written atomically.
+    """
+
+    def __init__(self, path: str = SITE_SYNC_STATE_PATH):
+        self.path = path
+        self.pages: Dict[str, dict] = {}
+        self.updated_at: Optional[float] = None
+
+    @classmethod
+    def load(cls, path: str = SITE_SYNC_STATE_PATH) -> "SyncState":
+        state = cls(path)
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                state.pages = dict(data.get("pages", {}))
+                state.updated_at = data.get("updated_at")
+                logger.info(f"Loaded site sync state ({len(state.pages)} pages) from {path}.")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read site sync state {path}: {e}. Starting from scratch.")
+        return state
+
+    def needs_sync(self, entry: SitemapEntry) -> bool:
+        """True for new URLs, changed lastmods, and URLs without a lastmod (checked by content instead)."""
+        previous = self.pages.get(entry.url)
+        return previous is None or entry.lastmod is None or previous.get("lastmod") != entry.lastmod
+
+    def record(self, url: str, lastmod: Optional[str], content_hash: str, title: Optional[str]):
+        self.pages[url] = {"lastmod": lastmod, "content_hash": content_hash, "title": title, "synced_at": time.time()}
+
+    def forget(self, url: str):
+        self.pages.pop(url, None)
+
+    def save(self):
+        self.updated_at = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": self.updated_at, "pages": self.pages}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def _document_context(url: str, title: Optional[str], description: Optional[str]) -> str:
+    return " - ".join(part.strip() for part in (title, description) if part and part.strip()) or url
+
+
+async def sync_site(
+    sitemap_urls: List[str],
+    state_path: str = SITE_SYNC_STATE_PATH,
+    workers: int = SITE_SYNC_WORKERS,
+    chunk_size_upper: int = SITE_SYNC_CHUNK_SIZE_UPPER,
+    chunk_size_lower: int = SITE_SYNC_CHUNK_SIZE_LOWER,
+    url_pattern: Optional[str] = None,
+    prune_unmatched: bool = False,
+    force_full: bool = False,
+    dry_run: bool = False,
+    checkpoint_every: int = SITE_SYNC_CHECKPOINT_EVERY,
+    service: Optional[ScrapingService] = None,
+) -> Dict[str, int]:
+    """
+    Runs one sync (see the module docstring) and returns its counts. Only URLs matching
+    `url_pattern` (a regular expression) are fetched; pages synced earlier that do not match it
+    are left alone unless `prune_unmatched` is set, which removes them from the index. `dry_run`
+    only reports what would be fetched and removed.
+    """
+    own_service = service is None
+    service = service or ScrapingService()
+    state = SyncState.load(state_path)
+    stats = {"listed": 0, "to_sync": 0, "ingested": 0, "unchanged": 0, "empty": 0, "failed": 0, "removed": 0}
+    try:
+        listed, complete = await read_sitemaps(service, sitemap_urls)
+        # Removals are judged against the whole listing: a page outside the pattern is not gone
+        removed = [url for url in state.pages if url not in listed]
+        if url_pattern:
+            pattern = re.compile(url_pattern)
+            if prune_unmatched:
+                removed += [url for url in state.pages if url in listed and not pattern.search(url)]
+            listed = {url: entry for url, entry in listed.items() if pattern.search(url)}
+        to_sync = [entry for entry in listed.values() if force_full or state.needs_sync(entry)]
+        stats.update(listed=len(listed), to_sync=len(to_sync))
+        logger.info(f"{len(listed)} URLs listed: {len(to_sync)} new or changed, {len(removed)} no longer listed.")
+        if not complete and removed:
+            logger.warning(f"Some sitemaps could not be read; keeping the {len(removed)} unlisted URLs until a complete run.")
+            removed = []
+        if dry_run:
+            for entry in to_sync:
+                logger.info(f"Would sync {entry.url} (lastmod {entry.lastmod})")
+            for url in removed:
+                logger.info(f"Would remove {url}")
+            stats["removed"] = len(removed)
+            return stats
+
+        completed = 0
+
+        def checkpoint():
+            nonlocal completed
+            completed += 1
+            if completed % checkpoint_every == 0:
+                # The lexical index goes first: a page recorded as synced must be searchable
+                save_lexical_index()
+                state.save()
+                logger.info(f"Checkpoint: {completed}/{len(to_sync)} pages processed.")
+
+        async def sync_page(entry: SitemapEntry):
+            try:
+                page = await service.scrape_page_async(entry.url, lean=True, include_html=True)
+            except (CrawlError, ValueError) as e:
+                logger.warning(f"Could not fetch {entry.url}: {e}")
+                stats["failed"] += 1
+                return
+            previous = state.pages.get(entry.url)
+            text = extract_main_text(page['content'] or "") or ""
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            if previous is not None and previous.get("content_hash") == content_hash and not force_full:
+                stats["unchanged"] += 1
+                state.record(entry.url, entry.lastmod, content_hash, page.get('title'))
+                return
+            if not text:
+                # No body text (any more): nothing to index for this page
+                logger.info(f"No .field--name-body text on {entry.url}.")
+                succeeded = await remove_document(entry.url)
+                stats["empty" if succeeded else "failed"] += 1
+            else:
+                succeeded = await process_document_pipeline(
+                    text, chunk_size_upper, chunk_size_lower,
+                    _document_context(entry.url, page.get('title'), page.get('description')),
+                    source_id=entry.url, force_full=force_full
+                )
+                stats["ingested" if succeeded else "failed"] += 1
+            if succeeded:
+                state.record(entry.url, entry.lastmod, content_hash, page.get('title'))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for entry in to_sync:
+            queue.put_nowait(entry)
+
+        async def worker():
+            while not queue.empty():
+                entry = queue.get_nowait()
+                try:
+                    await sync_page(entry)
+                except Exception as e:
+                    logger.error(f"Failed to sync {entry.url}: {e}", exc_info=True)
+                    stats["failed"] += 1
+                checkpoint()
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(to_sync))))))
+
+        for url in removed:
+            if await remove_document(url):
+                state.forget(url)
+                stats["removed"] += 1
+            else:
+                stats["failed"] += 1
+        return stats
+    finally:
+        if not dry_run:
+            save_lexical_index()
+            state.save()
+        if own_service:
+            await service.aclose()
+        logger.info(f"Site sync: {stats}")
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Syncs the vector index with the pages listed in a site's sitemaps.")
+    parser.add_argument("sitemaps", nargs="*", help="Sitemap or sitemap index URLs (default: SITE_SYNC_SITEMAPS).")
+    parser.add_argument("--state", default=SITE_SYNC_STATE_PATH, help=f"State file (default: {SITE_SYNC_STATE_PATH}).")
+    parser.add_argument("--workers", type=int, default=SITE_SYNC_WORKERS, help="Pages fetched and ingested concurrently.")
+    parser.add_argument("--chunk_size_upper", type=int, default=SITE_SYNC_CHUNK_SIZE_UPPER, help="Upper limit for chunk size in tokens.")
+    parser.add_argument("--chunk_size_lower", type=int, default=SITE_SYNC_CHUNK_SIZE_LOWER, help="Lower limit for chunk size in tokens.")
+    parser.add_argument("--match", default=None, help="Only fetch URLs matching this regular expression.")
+    parser.add_argument("--prune_unmatched", action="store_true", help="With --match, remove pages synced earlier that do not match it.")
+    parser.add_argument("--force_full", action="store_true", help="Re-fetch and re-embed every listed page.")
+    parser.add_argument("--dry_run", action="store_true", help="Only report what would be synced and removed.")
+    args = parser.parse_args()
+
+    sitemaps = args.sitemaps or SITE_SYNC_SITEMAPS
+    if not sitemaps:
+        parser.error("No sitemap URLs given and SITE_SYNC_SITEMAPS is not set.")
+    if args.chunk_size_lower >= args.chunk_size_upper:
+        parser.error(f"chunk_size_lower ({args.chunk_size_lower}) must be less than chunk_size_upper ({args.chunk_size_upper}).")
+
+    async def run_sync():
+        try:
+            return await sync_site(
+                sitemaps,
+                state_path=args.state,
+                workers=args.workers,
+                chunk_size_upper=args.chunk_size_upper,
+                chunk_size_lower=args.chunk_size_lower,
+                url_pattern=args.match,
+                prune_unmatched=args.prune_unmatched,
+                force_full=args.force_full,
+                dry_run=args.dry_run,
+            )
+        finally:
+            await close_openai_client()
+
+    result = asyncio.run(run_sync())
+    sys.exit(1 if result["failed"] else 0)
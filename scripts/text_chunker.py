@@ -0,0 +1,414 @@
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+# Add project root to sys.path to allow imports from 'app'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.tokenizer import TokenCounter, get_token_counter
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n+')
+# Looks for . ! ? followed by whitespace. Not perfect for all cases (e.g. Mr. Smith).
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+PARAGRAPH_SEPARATOR = "\n\n"
+SENTENCE_SEPARATOR = " "
+
+
+class ChunkSizer:
+    """
+    How chunk sizes are measured. With a BPE TokenCounter, a span's size is its token count
+    (memoized per paragraph and sentence by the counter) and a chunk's size is the sum of its
+    spans and separators. With the heuristic counter, sizes are character counts and tokens are
+    estimated at 4 characters per token, exactly as chunk_text() always did.
+    """
+
+    def __init__(self, token_counter: TokenCounter | None = None):
+        token_counter = token_counter if token_counter is not None else get_token_counter()
+        self.token_counter = None if token_counter.is_heuristic else token_counter
+        self.paragraph_separator = self.size(PARAGRAPH_SEPARATOR)
+        self.sentence_separator = self.size(SENTENCE_SEPARATOR)
+
+    def size(self, text: str, start: int = 0, end: int | None = None) -> int:
+        end = len(text) if end is None else end
+        if self.token_counter is None:
+            return end - start
+        return self.token_counter.count(text[start:end])
+
+    def tokens(self, size: int) -> int:
+        return size if self.token_counter is not None else size // 4
+
+
+@dataclass
+class TextChunk:
+    """
+    One chunk and where it came from. `start`/`end` are offsets into the source text (for a
+    page stream: into the pages joined with newlines); the text is the chunk's paragraphs or
+    sentences joined with normalized separators, so it may differ from source[start:end] in
+    whitespace between them.
+    """
+    text: str
+    start: int
+    end: int
+    page_start: int | None = None
+    page_end: int | None = None
+
+
+class _SpanGroup:
+    """
+    Chunk under construction: (separator, start, end) spans into the source plus the size
+    of their joined text (see ChunkSizer), so sizes are known without building any strings.
+    """
+    __slots__ = ("spans", "size")
+
+    def __init__(self, spans: list, size: int):
+        self.spans = spans
+        self.size = size
+
+    @classmethod
+    def single(cls, start: int, end: int, size: int) -> "_SpanGroup":
+        return cls([("", start, end)], size)
+
+    def add(self, separator: str, separator_size: int, start: int, end: int, size: int):
+        self.spans.append((separator, start, end))
+        self.size += separator_size + size
+
+    def append(self, other: "_SpanGroup", separator: str, separator_size: int):
+        first_separator, start, end = other.spans[0]
+        self.spans.append((separator, start, end))
+        self.spans.extend(other.spans[1:])
+        self.size += separator_size + other.size
+
+
+class SpanChunker:
+    """
+    The chunking rules of chunk_text(), applied in a single pass over paragraph and sentence
+    spans:
+
+      1. paragraphs are packed up to the upper limit and closed once they reach the lower limit;
+         a paragraph over the upper limit is split into sentences that are packed the same way
+         (a small group of paragraphs before it is appended to the previous chunk if that fits);
+      2. chunks under the lower limit are merged into their successors while the sum of their
+         token estimates stays within the upper limit.
+
+    Nothing but span offsets and sizes is handled here; `emit` receives each finished chunk as
+    a list of (separator, start, end) spans. A chunk is emitted as soon as no later input can
+    change it, so only a couple of chunks' worth of spans is ever held.
+    """
+
+    def __init__(self, chunk_size_upper_tokens: int, chunk_size_lower_tokens: int, emit: Callable[[list], None], sizer: ChunkSizer):
+        self.upper = chunk_size_upper_tokens
+        self.lower = chunk_size_lower_tokens
+        self._emit = emit
+        self._tokens = sizer.tokens
+        self._paragraph_separator = sizer.paragraph_separator
+        self._sentence_separator = sizer.sentence_separator
+        # Paragraph packing
+        self._parts: _SpanGroup | None = None
+        self._parts_size = 0
+        self._tail: _SpanGroup | None = None # Last packed chunk; a following small group may still be appended to it
+        self._packed_any = False
+        # Sentence grouping of an oversized paragraph
+        self.in_long_paragraph = False
+        self._group: _SpanGroup | None = None
+        self._group_size = 0
+        # Merging of small chunks
+        self._merged: _SpanGroup | None = None
+        self._merged_tokens = 0
+
+    def pending_start(self) -> int | None:
+        """Smallest source offset still referenced by an unfinished chunk (None if there is none)."""
+        starts = [group.spans[0][1] for group in (self._merged, self._tail, self._parts, self._group) if group is not None]
+        return min(starts) if starts else None
+
+    # --- Paragraphs ---
+
+    def add_paragraph(self, start: int, end: int, size: int):
+        """Adds a complete, stripped paragraph that fits within the upper limit."""
+        if self._tokens(self._parts_size + size) <= self.upper:
+            if self._parts is None:
+                self._parts = _SpanGroup.single(start, end, size)
+            else:
+                self._parts.add(PARAGRAPH_SEPARATOR, self._paragraph_separator, start, end, size)
+            self._parts_size += size + self._paragraph_separator
+        else:
+            if self._parts is not None:
+                self._pack(self._parts)
+            self._parts = _SpanGroup.single(start, end, size)
+            self._parts_size = size
+
+        if self._tokens(self._parts_size) >= self.lower and self._parts is not None:
+            self._pack(self._parts)
+            self._parts = None
+            self._parts_size = 0
+
+    def is_oversized(self, size: int) -> bool:
+        """True if a stripped paragraph of this size must be split into sentences."""
+        return self._tokens(size) > self.upper
+
+    # --- Oversized paragraphs ---
+
+    def start_long_paragraph(self):
+        # Finalize the paragraphs gathered so far before the oversized one
+        if self._parts is not None:
+            assembled = self._parts
+            if self._tokens(assembled.size) >= self.lower or not self._packed_any:
+                self._pack(assembled)
+            elif self._tokens(self._tail.size + self._paragraph_separator + assembled.size) <= self.upper:
+                self._tail.append(assembled, PARAGRAPH_SEPARATOR, self._paragraph_separator)
+            else:
+                self._pack(assembled)
+            self._parts = None
+            self._parts_size = 0
+        self.in_long_paragraph = True
+        self._group, self._group_size = None, 0
+
+    def add_sentence(self, start: int, end: int, size: int):
+        """Adds a complete, stripped sentence of the oversized paragraph in progress."""
+        if self._tokens(self._group_size + size) <= self.upper:
+            if self._group is None:
+                self._group = _SpanGroup.single(start, end, size)
+            else:
+                self._group.add(SENTENCE_SEPARATOR, self._sentence_separator, start, end, size)
+            self._group_size += size + self._sentence_separator
+        else:
+            if self._group is not None:
+                self._pack(self._group)
+            self._group = _SpanGroup.single(start, end, size)
+            self._group_size = size
+
+    def end_long_paragraph(self):
+        if self._group is not None:
+            self._pack(self._group)
+        self.in_long_paragraph = False
+        self._group, self._group_size = None, 0
+
+    def finish(self):
+        if self.in_long_paragraph:
+            self.end_long_paragraph()
+        if self._parts is not None:
+            self._pack(self._parts)
+            self._parts = None
+        if self._tail is not None:
+            self._merge(self._tail)
+            self._tail = None
+        if self._merged is not None:
+            self._emit(self._merged.spans)
+            self._merged = None
+
+    # --- Packing and merging ---
+
+    def _pack(self, group: _SpanGroup):
+        # The previous packed chunk is final once another one follows it
+        if self._tail is not None:
+            self._merge(self._tail)
+        self._tail = group
+        self._packed_any = True
+
+    def _merge(self, group: _SpanGroup):
+        tokens = self._tokens(group.size)
+        if self._merged is not None:
+            if self._merged_tokens < self.lower and self._merged_tokens + tokens <= self.upper:
+                self._merged.append(group, PARAGRAPH_SEPARATOR, self._paragraph_separator)
+                self._merged_tokens += tokens
+                return
+            self._emit(self._merged.spans)
+        self._merged, self._merged_tokens = group, tokens
+
+
+def _strip_bounds(text: str, start: int, end: int) -> tuple[int, int]:
+    """Offsets of text[start:end].strip() without copying it."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _join_spans(text: str, spans: list, base: int = 0) -> str:
+    return "".join(separator + text[start - base:end - base] for separator, start, end in spans)
+
+
+def iter_chunks(
+    text: str,
+    chunk_size_upper_tokens: int,
+    chunk_size_lower_tokens: int,
+    token_counter: TokenCounter | None = None,
+) -> Iterator[TextChunk]:
+    """
+    Single pass over `text` producing the same chunks as chunk_text(), each with its exact
+    source offsets. Runs in time linear in the length of the text. Tokens are counted with
+    `token_counter` (default: the embedding model's encoding, see app/tokenizer.py).
+    """
+    finished: list[list] = []
+    sizer = ChunkSizer(token_counter)
+    chunker = SpanChunker(chunk_size_upper_tokens, chunk_size_lower_tokens, finished.append, sizer)
+
+    def add_span(start: int, end: int):
+        start, end = _strip_bounds(text, start, end)
+        if start == end:
+            return
+        size = sizer.size(text, start, end)
+        if not chunker.is_oversized(size):
+            chunker.add_paragraph(start, end, size)
+            return
+        chunker.start_long_paragraph()
+        # Breaks are maximal whitespace runs inside a stripped paragraph, so the sentences
+        # between them are already stripped and non-empty
+        sentence_start = start
+        for match in SENTENCE_BREAK.finditer(text, start, end):
+            chunker.add_sentence(sentence_start, match.start(), sizer.size(text, sentence_start, match.start()))
+            sentence_start = match.end()
+        chunker.add_sentence(sentence_start, end, sizer.size(text, sentence_start, end))
+        chunker.end_long_paragraph()
+
+    paragraph_start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        add_span(paragraph_start, match.start())
+        paragraph_start = match.end()
+        while finished:
+            spans = finished.pop(0)
+            yield TextChunk(_join_spans(text, spans), spans[0][1], spans[-1][2])
+    add_span(paragraph_start, len(text))
+    chunker.finish()
+    for spans in finished:
+        yield TextChunk(_join_spans(text, spans), spans[0][1], spans[-1][2])
+
+
+class IncrementalChunker:
+    """
+    Page-streaming front end to SpanChunker: pages are fed one at a time and finished chunks
+    come out as soon as no later text can change them, so a whole document never has to be
+    held in memory. Produces the same chunks as chunk_text() on the pages joined with newlines
+    (paragraphs may continue across a page break); offsets refer to that joined text and each
+    chunk also records the (1-based) pages it spans.
+
+    Only text still referenced by an unfinished chunk or paragraph is buffered.
+    """
+
+    def __init__(self, chunk_size_upper_tokens: int, chunk_size_lower_tokens: int, token_counter: TokenCounter | None = None):
+        self._finished: list[list] = []
+        self._sizer = ChunkSizer(token_counter)
+        self._chunker = SpanChunker(chunk_size_upper_tokens, chunk_size_lower_tokens, self._finished.append, self._sizer)
+        self._buffer = ""
+        self._base = 0          # Source offset of self._buffer[0]
+        self._position = 0      # Source offset where the unfinished paragraph (or sentence) starts
+        self._pages: list[tuple[int, int]] = [] # (source offset, page number), ascending
+        self._started = False
+
+    # --- Input ---
+
+    def feed(self, text: str, page_number: int) -> list[TextChunk]:
+        """Adds one page of text. Returns the chunks completed by it (possibly none)."""
+        if self._started:
+            self._buffer += "\n"
+        self._started = True
+        self._pages.append((self._base + len(self._buffer), page_number))
+        self._buffer += text or ""
+
+        # Everything before the last paragraph break is made of complete paragraphs
+        last_break = None
+        for last_break in PARAGRAPH_BREAK.finditer(self._buffer, self._position - self._base):
+            pass
+        if last_break is not None:
+            self._consume_paragraphs(self._base + last_break.end())
+
+        # The paragraph in progress: once it is over the upper limit it will be sentence-split
+        # whatever follows, so complete sentences can be grouped right away
+        end = self._base + len(self._buffer)
+        if not self._chunker.in_long_paragraph:
+            start, stripped_end = self._strip(self._position, end)
+            if start < stripped_end and self._chunker.is_oversized(self._size(start, stripped_end)):
+                self._chunker.start_long_paragraph()
+        if self._chunker.in_long_paragraph:
+            last_break = None
+            for match in SENTENCE_BREAK.finditer(self._buffer, self._position - self._base):
+                # Whitespace at the very end may still grow into a paragraph break with the next page
+                if match.end() < len(self._buffer):
+                    last_break = match
+            if last_break is not None:
+                self._add_sentences(self._position, self._base + last_break.start())
+                self._position = self._base + last_break.end()
+        return self._collect()
+
+    def finish(self) -> list[TextChunk]:
+        """Flushes the remaining text once the last page has been fed."""
+        if self._started:
+            self._consume_paragraphs(self._base + len(self._buffer))
+        self._chunker.finish()
+        return self._collect()
+
+    # --- Helpers ---
+
+    def _strip(self, start: int, end: int) -> tuple[int, int]:
+        start, end = _strip_bounds(self._buffer, start - self._base, end - self._base)
+        return start + self._base, end + self._base
+
+    def _size(self, start: int, end: int) -> int:
+        return self._sizer.size(self._buffer, start - self._base, end - self._base)
+
+    def _page_at(self, offset: int) -> int:
+        page = self._pages[0][1]
+        for start, page_number in self._pages:
+            if start > offset:
+                break
+            page = page_number
+        return page
+
+    def _consume_paragraphs(self, end: int):
+        paragraph_start = self._position
+        breaks = list(PARAGRAPH_BREAK.finditer(self._buffer, self._position - self._base, end - self._base))
+        for match in breaks + [None]:
+            paragraph_end = self._base + match.start() if match else end
+            if self._chunker.in_long_paragraph:
+                # The first span finishes the oversized paragraph that is already being sentence-split
+                self._add_sentences(paragraph_start, paragraph_end)
+                self._chunker.end_long_paragraph()
+            else:
+                start, stripped_end = self._strip(paragraph_start, paragraph_end)
+                if start < stripped_end:
+                    size = self._size(start, stripped_end)
+                    if self._chunker.is_oversized(size):
+                        self._chunker.start_long_paragraph()
+                        self._add_sentences(start, stripped_end)
+                        self._chunker.end_long_paragraph()
+                    else:
+                        self._chunker.add_paragraph(start, stripped_end, size)
+            if match:
+                paragraph_start = self._base + match.end()
+        self._position = end
+
+    def _add_sentences(self, start: int, end: int):
+        sentence_start = start
+        for match in SENTENCE_BREAK.finditer(self._buffer, start - self._base, end - self._base):
+            sentence = self._strip(sentence_start, self._base + match.start())
+            if sentence[0] < sentence[1]:
+                self._chunker.add_sentence(*sentence, self._size(*sentence))
+            sentence_start = self._base + match.end()
+        sentence = self._strip(sentence_start, end)
+        if sentence[0] < sentence[1]:
+            self._chunker.add_sentence(*sentence, self._size(*sentence))
+
+    def _collect(self) -> list[TextChunk]:
+        chunks = [
+            TextChunk(
+                _join_spans(self._buffer, spans, self._base),
+                spans[0][1], spans[-1][2],
+                self._page_at(spans[0][1]), self._page_at(spans[-1][2] - 1)
+            )
+            for spans in self._finished
+        ]
+        self._finished.clear()
+        # Drop text that no unfinished chunk refers to any more
+        pending = self._chunker.pending_start()
+        keep_from = min(self._position, pending) if pending is not None else self._position
+        if keep_from - self._base > len(self._buffer) // 2:
+            self._buffer = self._buffer[keep_from - self._base:]
+            self._base = keep_from
+            first_page = self._page_at(keep_from)
+            self._pages = [(keep_from, first_page)] + [(offset, page) for offset, page in self._pages if offset > keep_from]
+        return chunks
@@ -0,0 +1,276 @@
+"""
+Tests for scripts/site_sync.py against a local fixture web server.
+
+The server serves a sitemap index, two sitemaps and a few pages from an in-memory dict that the
+tests edit between runs. Embeddings, contextualization and vector store writes are replaced with
+fakes that record what would be upserted and deleted.
+
+Run with:
+    python -m pytest tests/test_site_sync.py
+"""
+import asyncio
+import http.server
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# Settings are read when app.config is imported: keep manifests and caches out of data/
+_tmp = tempfile.mkdtemp(prefix="site_sync_test_")
+os.environ.update(
+    VECTOR_STORE_BACKEND="local",
+    LOCAL_VECTOR_STORE_DIR=os.path.join(_tmp, "vector_store"),
+    INGESTION_MANIFEST_DIR=os.path.join(_tmp, "manifests"),
+    HTTP_CACHE_PATH=os.path.join(_tmp, "http_cache.sqlite3"),
+    EMBEDDING_CACHE_ENABLED="false",
+    CHUNK_STORE_ENABLED="false",
+    LEXICAL_INDEX_ENABLED="false",
+)
+
+# Add project root to sys.path to allow imports from 'app' and 'scripts'
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import scripts.chunker_pipeline as chunker_pipeline
+from app.services.http_cache import HttpCache
+from app.services.scraping_service import ScrapingService
+from scripts.site_sync import SyncState, sync_site
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = self.server.pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class FixtureSite:
+    """A local web site whose pages (path -> HTML/XML) can be changed between sync runs."""
+
+    def __init__(self):
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        self.server.pages = {}
+        self.server.requests = []
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def pages(self):
+        return self.server.pages
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def url(self, path: str) -> str:
+        return self.base + path
+
+    def urlset(self, items) -> str:
+        urls = "".join(
+            f"<url><loc>{self.url(path)}</loc>" + (f"<lastmod>{lastmod}</lastmod>" if lastmod else "") + "</url>"
+            for path, lastmod in items
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def page(title: str, text: str) -> str:
+    return (
+        f'<html><head><title>{title}</title></head><body><nav>menu</nav>'
+        f'<div class="field--name-body"><p>{text}</p><p>Second paragraph of {title}.</p></div></body></html>'
+    )
+
+
+@pytest.fixture
+def site():
+    site = FixtureSite()
+    # A sitemap index with one absolute and one relative sitemap reference
+    site.pages["/sitemap.xml"] = (
+        '<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<sitemap><loc>{site.url("/s1.xml")}</loc></sitemap><sitemap><loc>/s2.xml</loc></sitemap></sitemapindex>'
+    )
+    site.pages["/s1.xml"] = site.urlset([("/a", "2025-01-01"), ("/b", "2025-01-01")])
+    site.pages["/s2.xml"] = site.urlset([("/c", None), ("/d", "2025-01-01")])
+    site.pages["/a"] = page("A", "Alpha text about visas.")
+    site.pages["/b"] = page("B", "Beta text.")
+    site.pages["/c"] = page("C", "Gamma.")
+    site.pages["/d"] = "<html><body>No main body.</body></html>"
+    yield site
+    site.close()
+
+
+class FakeIndex:
+    """Stands in for embedding, contextualization and the vector store; records writes."""
+
+    def __init__(self):
+        self.upserted = []  # Chunk texts, per upsert call
+        self.deleted = 0
+        self.fail_texts = set()
+
+    async def embed_texts(self, texts):
+        return [[1.0] * 8 for _ in texts]
+
+    async def contextualize(self, chunk, document_context, *args, **kwargs):
+        return "summary"
+
+    async def upsert_vectors(self, vectors):
+        texts = [metadata["original_text"] for _, _, metadata in vectors]
+        if any(fail in text for fail in self.fail_texts for text in texts):
+            return None
+        self.upserted.append(texts)
+        return [len(vectors)]
+
+    async def delete_vectors(self, ids=None):
+        self.deleted += len(ids)
+        return True
+
+    def reset(self):
+        self.upserted.clear()
+        self.deleted = 0
+
+
+@pytest.fixture
+def index(monkeypatch):
+    fake = FakeIndex()
+    monkeypatch.setattr(chunker_pipeline, "embed_texts", fake.embed_texts)
+    monkeypatch.setattr(chunker_pipeline, "contextualize_chunk_with_gpt", fake.contextualize)
+    monkeypatch.setattr(chunker_pipeline, "upsert_vectors", fake.upsert_vectors)
+    monkeypatch.setattr(chunker_pipeline, "delete_vectors", fake.delete_vectors)
+    monkeypatch.setattr(chunker_pipeline, "_prepare_vector_store", lambda: True)
+    return fake
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "site_sync_state.json")
+
+
+def run_sync(site: FixtureSite, index: FakeIndex, state_path: str, http_cache_path: str, **kwargs) -> dict:
+    index.reset()
+    site.requests.clear()
+
+    async def run():
+        service = ScrapingService(per_host_interval=0, respect_robots=False, http_cache=HttpCache(http_cache_path))
+        try:
+            return await sync_site([site.url("/sitemap.xml")], state_path=state_path, service=service, **kwargs)
+        finally:
+            await service.aclose()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def sync(site, index, state_path, tmp_path):
+    http_cache_path = str(tmp_path / "http_cache.sqlite3")
+    return lambda **kwargs: run_sync(site, index, state_path, http_cache_path, **kwargs)
+
+
+def synced_urls(state_path: str) -> set:
+    return set(SyncState.load(state_path).pages)
+
+
+def test_dry_run_fetches_no_pages(site, index, sync, state_path):
+    stats = sync(dry_run=True)
+
+    assert stats["listed"] == 4 and stats["to_sync"] == 4 and stats["ingested"] == 0
+    assert index.upserted == []
+    assert set(site.requests) == {"/sitemap.xml", "/s1.xml", "/s2.xml"}
+    assert synced_urls(state_path) == set()
+
+
+def test_first_sync_then_nothing_changed(site, index, sync, state_path):
+    stats = sync()
+
+    # /d has no .field--name-body text, so there is nothing to ingest for it
+    assert stats == {"listed": 4, "to_sync": 4, "ingested": 3, "unchanged": 0, "empty": 1, "failed": 0, "removed": 0}
+    upserted = " ".join(text for texts in index.upserted for text in texts)
+    assert "Alpha text about visas." in upserted and "menu" not in upserted
+    assert synced_urls(state_path) == {site.url(path) for path in ("/a", "/b", "/c", "/d")}
+
+    stats = sync()
+
+    # Only /c (no lastmod) is fetched again, and its unchanged text is not re-ingested
+    assert stats["to_sync"] == 1 and stats["unchanged"] == 1 and stats["ingested"] == 0
+    assert index.upserted == [] and index.deleted == 0
+    assert [path for path in site.requests if not path.endswith(".xml")] == ["/c"]
+
+
+def test_changed_and_removed_urls(site, index, sync, state_path):
+    sync()
+    site.pages["/s1.xml"] = site.urlset([("/b", "2025-02-01")])
+    site.pages["/b"] = page("B", "Beta text revised.")
+
+    stats = sync()
+
+    assert stats["listed"] == 3 and stats["ingested"] == 1 and stats["removed"] == 1
+    assert any("Beta text revised." in text for texts in index.upserted for text in texts)
+    assert index.deleted > 0  # The chunks of /a, via its ingestion manifest
+    assert site.url("/a") not in synced_urls(state_path)
+
+
+def test_failed_upsert_is_retried_on_the_next_run(site, index, sync, state_path):
+    sync()
+    site.pages["/c"] = page("C", "Gamma changed.")
+    index.fail_texts.add("Gamma changed")
+
+    stats = sync()
+
+    assert stats["failed"] == 1 and stats["ingested"] == 0
+
+    index.fail_texts.clear()
+    stats = sync()
+
+    assert stats["to_sync"] == 1 and stats["ingested"] == 1
+    assert any("Gamma changed." in text for texts in index.upserted for text in texts)
+
+
+def test_unreadable_sitemap_keeps_unlisted_urls(site, index, sync, state_path):
+    sync()
+    del site.pages["/s2.xml"]
+
+    stats = sync()
+
+    # /c and /d are no longer listed, but the sitemap that listed them could not be read
+    assert stats["listed"] == 2 and stats["removed"] == 0
+    assert index.deleted == 0
+    assert synced_urls(state_path) == {site.url(path) for path in ("/a", "/b", "/c", "/d")}
+
+
+def test_match_keeps_pages_outside_the_pattern(site, index, sync, state_path):
+    sync()
+
+    stats = sync(url_pattern="/[ab]$", force_full=True)
+
+    assert stats["listed"] == 2 and stats["removed"] == 0
+    assert index.deleted == 0
+    assert synced_urls(state_path) == {site.url(path) for path in ("/a", "/b", "/c", "/d")}
+
+    stats = sync(url_pattern="/[ab]$", prune_unmatched=True)
+
+    assert stats["removed"] == 2
+    assert synced_urls(state_path) == {site.url("/a"), site.url("/b")}